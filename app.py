@@ -4,7 +4,7 @@ Main application entry point.
 from flask import Flask, jsonify
 from flask_cors import CORS
 from config import DEBUG, CLOUDINARY_CLOUD_NAME, CLOUDINARY_API_KEY, CLOUDINARY_API_SECRET
-from db import init_db
+from db import init_db, DeadlineExceeded
 from signup import signup_bp
 from login import login_bp
 from otp import otp_bp
@@ -14,18 +14,32 @@ from pesticide_listing import pesticide_listing
 from reminder_views import reminder_bp
 from chat import chat_bp
 from machinery_rentals_display import machinery_display
+from storage import uploads_bp
+from search import search_bp
 import cloudinary
 import cloudinary.uploader
-from daily_reminder_job import send_daily_reminders
+from reminder_jobs import enqueue_job, get_job, start_worker, REMINDER_IN_PROCESS, REMINDER_SCHEDULE_AT
+from logging_config import setup_logging, init_request_logging
+from metrics import init_metrics
+from compression import init_compression
+from query_log import init_query_log
+import logging
+
+logger = logging.getLogger(__name__)
 
 def create_app():
+    setup_logging()
     app = Flask(__name__)
+    init_request_logging(app)
+    init_metrics(app)
+    init_query_log(app)
+    init_compression(app)
 
     CORS(app, resources={r"/*": {
         "origins": "*",
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
         "allow_headers": ["Content-Type", "Authorization"],
-        "expose_headers": ["Content-Type", "Authorization"],
+        "expose_headers": ["Content-Type", "Authorization", "X-Next-Cursor", "X-Request-ID"],
         "supports_credentials": True
     }})
 
@@ -49,10 +63,31 @@ def create_app():
     app.register_blueprint(reminder_bp, url_prefix="/reminder")
     app.register_blueprint(chat_bp, url_prefix='/chat')
     app.register_blueprint(machinery_display, url_prefix='')
+    app.register_blueprint(uploads_bp, url_prefix='')
+    app.register_blueprint(search_bp, url_prefix='')
+    # Cron hits this; the job itself runs in the reminder worker (reminder_jobs.py)
     @app.route('/reminder/daily_job')
     def daily_reminder_route():
-        send_daily_reminders()
-        return "Daily reminders sent successfully!", 200
+        job, created = enqueue_job()
+        if REMINDER_IN_PROCESS:
+            start_worker()
+        return jsonify({'job_id': job['id'], 'status': job['status'], 'created': created}), 202
+
+    @app.route('/reminder/daily_job/<int:job_id>')
+    def daily_reminder_status(job_id):
+        job = get_job(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job), 200
+
+    if REMINDER_IN_PROCESS and REMINDER_SCHEDULE_AT:
+        start_worker()
+
+    # A request deadline ran out outside a handler's own error handling
+    @app.errorhandler(DeadlineExceeded)
+    def deadline_exceeded(e):
+        logger.warning("Request deadline exceeded: %s", e)
+        return jsonify({'error': 'Request timed out'}), 504
 
     @app.route('/')
     def home():
@@ -62,9 +97,10 @@ def create_app():
 if __name__ == '__main__':
     import os
     port = int(os.getenv('PORT', 5000))  # Railway $PORT use karega
+    setup_logging()
     if init_db():
         app = create_app()
-        print("Starting server...")
+        logger.info("Starting server on port %s", port)
         app.run(host="0.0.0.0", port=port, debug=DEBUG)
     else:
-        print("Database connection failed!")
\ No newline at end of file
+        logger.error("Database connection failed!")
\ No newline at end of file
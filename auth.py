@@ -1,55 +1,144 @@
 """
 JWT authentication utilities for the application.
 Provides token verification for protected routes.
+
+Verified tokens are cached in a bounded LRU keyed by the token's SHA-256
+digest until the token's `exp`, so repeated requests (chat polling) skip
+the HMAC check. Use the token_required decorator on protected routes; it
+puts the caller's id on flask.g.user_id.
 """
-from flask import request, jsonify
+from collections import OrderedDict
+from functools import wraps
+from flask import request, jsonify, g
 from config import SECRET_KEY
+import hashlib
+import os
+import threading
+import time
 import jwt
+import logging
+
+logger = logging.getLogger(__name__)
+
+AUTH_CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', 10000))  # 0 disables the cache
+
+
+class AuthError(Exception):
+    """Missing, invalid or expired token; message is sent back with a 401."""
+
+
+class TokenCache:
+    """Thread-safe LRU of digest -> (payload, expires_at)."""
+
+    def __init__(self, maxsize=AUTH_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            payload, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return payload
+
+    def put(self, digest, payload):
+        if self.maxsize <= 0:
+            return
+        expires_at = payload.get('exp')
+        with self._lock:
+            self._entries[digest] = (payload, expires_at)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = TokenCache()
+
+
+def decode_token(token):
+    """
+    Verified payload for a token, from the cache when possible.
+
+    Raises jwt.ExpiredSignatureError / jwt.InvalidTokenError like jwt.decode.
+    """
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(digest)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+        token_cache.put(digest, payload)
+    return payload
+
+
+def authenticate():
+    """
+    Verify the Bearer token of the current request.
+
+    Returns the user id (also stored on g.user_id); raises AuthError.
+    """
+    auth_header = request.headers.get('Authorization')
+    if not auth_header:
+        raise AuthError('Missing or invalid token')
+
+    # Expected format: "Bearer <token>"
+    parts = auth_header.split()
+    if len(parts) != 2 or parts[0].lower() != 'bearer':
+        raise AuthError('Missing or invalid token')
+
+    try:
+        payload = decode_token(parts[1])
+    except jwt.ExpiredSignatureError:
+        raise AuthError('Token expired')
+    except jwt.InvalidTokenError:
+        raise AuthError('Invalid token')
+
+    user_id = payload.get('user_id')
+    if not user_id:
+        raise AuthError('Invalid token payload')
+
+    g.user_id = user_id
+    return user_id
 
 
 def verify_token():
     """
     Verify JWT token from Authorization header.
-    
+
     Returns:
         int: User ID if token is valid, None otherwise
     """
     try:
-        # Get token from Authorization header
-        auth_header = request.headers.get('Authorization')
-        
-        if not auth_header:
-            print("[AUTH] No Authorization header found")
-            return None
-        
-        # Expected format: "Bearer <token>"
-        parts = auth_header.split()
-        
-        if len(parts) != 2 or parts[0].lower() != 'bearer':
-            print("[AUTH] Invalid Authorization header format")
-            return None
-        
-        token = parts[1]
-        
-        # Decode and verify token
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            user_id = payload.get('user_id')
-            
-            if not user_id:
-                print("[AUTH] No user_id in token payload")
-                return None
-            
-            print(f"[AUTH] Token verified for user_id: {user_id}")
-            return user_id
-            
-        except jwt.ExpiredSignatureError:
-            print("[AUTH] Token has expired")
-            return None
-        except jwt.InvalidTokenError as e:
-            print(f"[AUTH] Invalid token: {str(e)}")
-            return None
-            
-    except Exception as e:
-        print(f"[AUTH ERROR] verify_token: {str(e)}")
+        return authenticate()
+    except AuthError as e:
+        logger.debug("verify_token: %s", e)
         return None
+
+
+def token_required(f):
+    """Reject the request with 401 unless it has a valid token; sets g.user_id."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        try:
+            authenticate()
+        except AuthError as e:
+            logger.info("401 %s: %s", request.path, e)
+            return jsonify({'error': str(e)}), 401
+        return f(*args, **kwargs)
+    return decorated
@@ -0,0 +1,67 @@
+"""
+Requests per second for authenticated requests, with and without the
+verified-token cache in auth.py.
+
+- GET /_bench/whoami: a bare @token_required route, so auth is the whole cost
+- GET /chat/unread-count: the chat polling endpoint (one small query)
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost:5432/agrox_bench \
+        python benchmarks/bench_auth_cache.py
+"""
+import time
+
+import common  # noqa: F401  (sets DATABASE_URL before db is imported)
+from common import reset_schema, make_token
+from db import get_db_connection
+import auth
+
+DURATION = 2.0  # seconds per measurement
+
+
+def seed_user():
+    reset_schema()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO users (full_name) VALUES ('Poller') RETURNING id")
+    user_id = cursor.fetchone()['id']
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return user_id
+
+
+def requests_per_second(client, path, headers):
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < DURATION:
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    from flask import g, jsonify
+    from app import create_app
+
+    user_id = seed_user()
+    app = create_app()
+
+    @app.route('/_bench/whoami')
+    @auth.token_required
+    def whoami():
+        return jsonify({'user_id': g.user_id})
+
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {make_token(user_id)}'}
+
+    for path in ('/_bench/whoami', '/chat/unread-count'):
+        print(f"\n--- GET {path} ---")
+        for label, size in (("no cache", 0), ("token cache", 10000)):
+            auth.token_cache = auth.TokenCache(size)
+            rps = requests_per_second(client, path, headers)
+            print(f"{label:<20} {rps:9.0f} req/s   (cache hits {auth.token_cache.hits})")
+
+
+if __name__ == '__main__':
+    main()
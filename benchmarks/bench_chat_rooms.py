@@ -0,0 +1,138 @@
+"""
+Inbox latency benchmark for GET /chat/rooms.
+
+Seeds one user with 10 / 100 / 1000 rooms (20 messages each, mixed listing
+types) and compares the old path - correlated subqueries plus one listing
+SELECT per room on a second connection - with the current query, and times
+the endpoint end to end. On a local socket a round trip costs well under a
+millisecond; against the Supabase pooler each of the legacy per-room
+SELECTs pays the full network RTT, so the real gap is much wider.
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost:5432/agrox_bench \
+        python benchmarks/bench_chat_rooms.py
+"""
+import common  # noqa: F401  (sets DATABASE_URL before db is imported)
+from common import reset_schema, make_token, measure, print_row
+from db import get_db_connection
+from chat import USER_ROOMS_QUERY
+from psycopg2.extras import execute_values
+
+ROOM_COUNTS = (10, 100, 1000)
+MESSAGES_PER_ROOM = 20
+LISTING_TYPES = ('wheat', 'pesticide', 'machinery')
+
+LEGACY_ROOMS_QUERY = """
+    SELECT
+        cr.id as room_id, cr.listing_id, cr.listing_type, cr.created_at,
+        COALESCE(cr.updated_at, cr.created_at) as updated_at,
+        CASE WHEN cr.buyer_id = %s THEN cr.seller_id ELSE cr.buyer_id END as other_user_id,
+        u.full_name as other_user_name,
+        (SELECT message FROM chat_messages WHERE room_id = cr.id
+         ORDER BY created_at DESC LIMIT 1) as last_message,
+        (SELECT created_at FROM chat_messages WHERE room_id = cr.id
+         ORDER BY created_at DESC LIMIT 1) as last_message_time,
+        (SELECT COUNT(*) FROM chat_messages WHERE room_id = cr.id
+         AND sender_id != %s AND is_read = FALSE) as unread_count
+    FROM chat_rooms cr
+    JOIN users u ON u.id = CASE WHEN cr.buyer_id = %s THEN cr.seller_id ELSE cr.buyer_id END
+    WHERE cr.buyer_id = %s OR cr.seller_id = %s
+    ORDER BY COALESCE(cr.updated_at, cr.created_at) DESC
+    LIMIT 100
+"""
+
+LEGACY_TABLE_MAP = {
+    'wheat': ('wheat_listings', 'title as name, price_per_kg as price'),
+    'pesticide': ('pesticides', 'name, price'),
+    'machinery': ('machinery_rentals', 'name, daily_rate as price, image_path'),
+}
+
+
+def legacy_inbox(user_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(LEGACY_ROOMS_QUERY, (user_id,) * 5)
+    rooms = cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    for room in rooms:
+        table_name, fields = LEGACY_TABLE_MAP[room['listing_type']]
+        cursor.execute(f"SELECT {fields} FROM {table_name} WHERE id = %s LIMIT 1", (room['listing_id'],))
+        cursor.fetchone()
+    cursor.close()
+    conn.close()
+
+
+def current_inbox(user_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(USER_ROOMS_QUERY, {'user_id': user_id})
+    cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+
+def seed(room_count):
+    reset_schema()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("INSERT INTO users (full_name) VALUES ('Buyer') RETURNING id")
+    buyer_id = cursor.fetchone()['id']
+    execute_values(cursor, "INSERT INTO users (full_name) VALUES %s",
+                   [(f"Seller {i}",) for i in range(room_count)])
+    cursor.execute("SELECT id FROM users WHERE id != %s ORDER BY id", (buyer_id,))
+    seller_ids = [row['id'] for row in cursor.fetchall()]
+
+    execute_values(cursor, "INSERT INTO wheat_listings (user_id, title, price_per_kg) VALUES %s",
+                   [(s, f"Wheat {s}", 50) for s in seller_ids])
+    execute_values(cursor, "INSERT INTO pesticides (user_id, name, price) VALUES %s",
+                   [(s, f"Pesticide {s}", 900) for s in seller_ids])
+    execute_values(cursor, "INSERT INTO machinery_rentals (user_id, name, daily_rate, image_path) VALUES %s",
+                   [(s, f"Tractor {s}", 4000, 'tractor.jpg') for s in seller_ids])
+
+    rooms = [(buyer_id, s, i + 1, LISTING_TYPES[i % 3]) for i, s in enumerate(seller_ids)]
+    execute_values(cursor, """
+        INSERT INTO chat_rooms (buyer_id, seller_id, listing_id, listing_type,
+                                updated_at)
+        VALUES %s
+    """, rooms, template="(%s, %s, %s, %s, NOW() - random() * INTERVAL '30 days')")
+
+    cursor.execute("""
+        INSERT INTO chat_messages (room_id, sender_id, message, is_read, created_at)
+        SELECT cr.id,
+               CASE WHEN n %% 2 = 0 THEN cr.buyer_id ELSE cr.seller_id END,
+               'message ' || n,
+               n < %s - 3,
+               NOW() - (n || ' minutes')::interval
+        FROM chat_rooms cr, generate_series(1, %s) n
+    """, (MESSAGES_PER_ROOM, MESSAGES_PER_ROOM))
+    cursor.execute("ANALYZE")
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return buyer_id
+
+
+def main():
+    from app import create_app
+    client = create_app().test_client()
+
+    for room_count in ROOM_COUNTS:
+        user_id = seed(room_count)
+        headers = {'Authorization': f'Bearer {make_token(user_id)}'}
+
+        def current():
+            response = client.get('/chat/rooms', headers=headers)
+            assert response.status_code == 200, response.get_data(as_text=True)
+
+        print(f"\n--- {room_count} rooms per user ---")
+        print_row("legacy SQL (1 + up to 100 round trips)", measure(lambda: legacy_inbox(user_id)))
+        print_row("USER_ROOMS_QUERY (1 round trip)", measure(lambda: current_inbox(user_id)))
+        print_row("GET /chat/rooms end to end", measure(current))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Full download vs If-None-Match revalidation (304) for a feed and a detail page.
+
+Response cache off, so every request reaches conditional_get.py: a full
+request runs the feed query and serializes it, a 304 only reads the version.
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost:5432/agrox_bench \
+        python benchmarks/bench_conditional_get.py --listings 5000
+"""
+import argparse
+
+import common  # noqa: F401  (sets DATABASE_URL before db is imported)
+from common import reset_schema, measure, summarize
+from db import get_db_connection
+from psycopg2.extras import execute_values
+import response_cache
+
+
+def seed(listings):
+    reset_schema()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO users (full_name, email) VALUES ('Seller', 's@example.com') RETURNING id")
+    seller_id = cursor.fetchone()['id']
+    execute_values(cursor, "INSERT INTO wheat_listings (user_id, title, price_per_kg, quantity_kg, description) VALUES %s",
+                   [(seller_id, f"Wheat {i}", 50 + i % 20, 1000, "Clean, dry wheat " * 10) for i in range(listings)])
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--listings', type=int, default=5000)
+    args = parser.parse_args()
+
+    from app import create_app
+    seed(args.listings)
+    response_cache.set_backend(None)
+    client = create_app().test_client()
+
+    print(f"\n--- {args.listings} listings ---")
+    print(f"{'':<46} {'status':>6} {'bytes':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for path in ('/wheat_listing/wheat-listings?limit=200', '/wheat_listing/wheat-listings/1'):
+        etag = client.get(path).headers['ETag']
+        for label, headers in (("full", {}), ("If-None-Match", {'If-None-Match': etag})):
+            response = client.get(path, headers=headers)
+            stats = summarize(measure(lambda: client.get(path, headers=headers), repeat=100))
+            print(f"{path.split('?')[0] + ' ' + label:<46} {response.status_code:>6} "
+                  f"{len(response.get_data()):>8} {stats['p50']:>8.2f} {stats['p95']:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Daily-reminder email throughput against the fake Resend server.
+
+- sequential: the old loop - one requests.post per email, no session reuse
+- dispatcher: email_dispatch.EmailDispatcher (pooled session, /emails/batch,
+  EMAIL_CONCURRENCY batches in flight)
+- dispatcher under a 2 req/s rate limit (Resend's default), to show the
+  Retry-After backoff delivering everything without duplicates
+
+No database needed:
+
+    python benchmarks/bench_email_dispatch.py --emails 5000
+"""
+import argparse
+import time
+
+import requests
+
+import common  # noqa: F401  (puts the repo root on sys.path)
+from email_dispatch import EmailDispatcher
+from fake_resend_server import start_server
+
+LATENCY = 0.02  # per request, roughly a same-region API call
+
+
+def make_messages(count):
+    return [{
+        'from': 'reminders@resend.dev',
+        'to': [f'farmer{i}@example.com'],
+        'subject': 'AgroX Reminder',
+        'html': f'<p>Farmer {i}: pending kaam</p>',
+    } for i in range(count)]
+
+
+def run_sequential(url, messages):
+    headers = {'Authorization': 'Bearer test', 'Content-Type': 'application/json'}
+    sent = 0
+    for payload in messages:
+        response = requests.post(f'{url}/emails', json=payload, headers=headers)
+        sent += response.status_code == 200
+    return sent
+
+
+def run_dispatcher(url, messages, **options):
+    with EmailDispatcher('test', base_url=url, **options) as dispatcher:
+        return dispatcher.dispatch(messages).sent
+
+
+def report(label, server, started, sent, total):
+    elapsed = time.perf_counter() - started
+    stats = server.recorder.stats()
+    print(f"{label:<28} {sent:>6}/{total} sent  {elapsed:7.2f}s  {sent / elapsed:8.0f} emails/s"
+          f"  requests={stats['requests']} 429s={stats['rate_limited']} duplicates={stats['duplicates']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--emails', type=int, default=5000)
+    parser.add_argument('--sequential-emails', type=int, default=500,
+                        help='the old loop is slow; measure it on fewer emails')
+    args = parser.parse_args()
+
+    server, url = start_server(latency=LATENCY)
+
+    messages = make_messages(args.sequential_emails)
+    started = time.perf_counter()
+    sent = run_sequential(url, messages)
+    report("sequential requests.post", server, started, sent, len(messages))
+
+    messages = make_messages(args.emails)
+    for concurrency in (1, 4):
+        server.recorder.reset()
+        started = time.perf_counter()
+        sent = run_dispatcher(url, messages, concurrency=concurrency)
+        report(f"dispatcher concurrency={concurrency}", server, started, sent, len(messages))
+
+    server.recorder.reset()
+    server.recorder.rate_limit = 2
+    started = time.perf_counter()
+    sent = run_dispatcher(url, messages, concurrency=4)
+    report("dispatcher, 2 req/s limit", server, started, sent, len(messages))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
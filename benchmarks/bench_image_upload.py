@@ -0,0 +1,84 @@
+"""
+Listing-creation latency vs image size.
+
+Uses the LocalStorage backend with a simulated network upload
+(UPLOAD_RTT seconds + UPLOAD_SECONDS_PER_MB) and compares:
+- inline: upload before responding (what the handlers used to do)
+- POST /wheat_listing/wheat-listings: insert as pending, upload in background,
+  with the image as base64 JSON and as a streamed multipart file
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost:5432/agrox_bench \
+        python benchmarks/bench_image_upload.py
+"""
+import base64
+import io
+import os
+import tempfile
+
+import common  # noqa: F401  (sets DATABASE_URL before db is imported)
+from common import reset_schema, make_token, measure, print_row
+from db import get_db_connection
+import image_uploads
+import storage
+
+IMAGE_SIZES_KB = (50, 1024, 4096)
+UPLOAD_RTT = 0.15
+UPLOAD_SECONDS_PER_MB = 0.5
+
+
+def seed_user():
+    reset_schema()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO users (full_name) VALUES ('Seller') RETURNING id")
+    user_id = cursor.fetchone()['id']
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return user_id
+
+
+def main():
+    from app import create_app
+
+    backend = storage.set_storage(storage.LocalStorage(
+        root=tempfile.mkdtemp(prefix='agrox-bench-'),
+        delay=UPLOAD_RTT,
+        seconds_per_mb=UPLOAD_SECONDS_PER_MB
+    ))
+    user_id = seed_user()
+    client = create_app().test_client()
+    headers = {'Authorization': f'Bearer {make_token(user_id)}'}
+
+    for size_kb in IMAGE_SIZES_KB:
+        # JPEG header + random bytes: the sniff falls back cheaply, the size is what matters
+        image_bytes = b'\xff\xd8\xff\xe0' + os.urandom(size_kb * 1024 - 4)
+        payload = {
+            'title': 'Bench wheat', 'price_per_kg': 50, 'quantity_kg': 100,
+            'description': 'benchmark', 'image': base64.b64encode(image_bytes).decode()
+        }
+
+        def inline():
+            backend.put(image_bytes, 'agrox/wheat', image_uploads.make_public_id('wheat', user_id))
+
+        def background():
+            response = client.post('/wheat_listing/wheat-listings', json=payload, headers=headers)
+            assert response.status_code == 201, response.get_data(as_text=True)
+
+        def multipart():
+            form = {k: str(v) for k, v in payload.items() if k != 'image'}
+            form['image'] = (io.BytesIO(image_bytes), 'wheat.jpg')
+            response = client.post('/wheat_listing/wheat-listings', data=form, headers=headers,
+                                   content_type='multipart/form-data')
+            assert response.status_code == 201, response.get_data(as_text=True)
+
+        print(f"\n--- {size_kb} KB image ---")
+        print_row("inline upload (old handlers)", measure(inline, repeat=5, warmup=1))
+        print_row("POST, upload in background", measure(background, repeat=5, warmup=1))
+        print_row("POST multipart, upload in background", measure(multipart, repeat=5, warmup=1))
+
+    image_uploads.get_executor().shutdown(wait=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+JSON serialization + compression on a 10k-row feed, old path vs new.
+
+Seeds --rows wheat listings for one seller and fetches them all through
+GET /wheat_listing/wheat-listings/user/<id> (no page limit):
+
+- serialization alone: Flask's stdlib DefaultJSONProvider vs FastJSONProvider
+  (orjson) on the same list of dict(row)s
+- end to end: old (stdlib json, no compression) vs new (orjson + gzip/br)
+- payload size: identity vs gzip vs br (when Brotli is installed)
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost:5432/agrox_bench \
+        python benchmarks/bench_json_compression.py --rows 10000
+"""
+import argparse
+import random
+import time
+
+import common  # noqa: F401  (sets DATABASE_URL before db is imported)
+from common import reset_schema, measure, summarize
+from db import get_db_connection
+from flask.json.provider import DefaultJSONProvider
+from psycopg2.extras import execute_values
+import compression
+import json_provider
+
+DESCRIPTIONS = (
+    "Clean, dry wheat, no broken grains.",
+    "Fresh crop from canal-irrigated land, machine threshed.",
+    "Bold grain, good for flour mills. Price negotiable on full lot.",
+    "Organic, no urea used this season. Sample available.",
+)
+
+
+def seed(rows):
+    random.seed(42)
+    reset_schema()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO users (full_name, email) VALUES ('Seller', 's@example.com') RETURNING id")
+    seller_id = cursor.fetchone()['id']
+    execute_values(cursor, """
+        INSERT INTO wheat_listings (user_id, title, price_per_kg, quantity_kg, description,
+                                    wheat_variety, grade_quality, protein_content, moisture_level)
+        VALUES %s
+    """, [(seller_id, f"Wheat lot {i}", round(random.uniform(45, 80), 2), random.randint(100, 50000),
+           f"{random.choice(DESCRIPTIONS)} Harvested {random.randint(1, 28)}/{random.randint(3, 5)}, "
+           f"stored in {random.choice(('godown', 'bags', 'silo'))}, {random.randint(1, 40)} km from the mandi.",
+           random.choice(('Galaxy-2013', 'Akbar-2019', 'Faisalabad-2008')), random.choice('ABC'),
+           round(random.uniform(10, 14), 2), round(random.uniform(8, 13), 2)) for i in range(rows)])
+    conn.commit()
+    cursor.execute("SELECT * FROM wheat_listings WHERE user_id = %s", (seller_id,))
+    listings = [dict(row) for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    return seller_id, listings
+
+
+def row(label, samples, size=None):
+    stats = summarize(samples)
+    size = f"{size / 1024:9.0f} KiB" if size is not None else ""
+    print(f"{label:<40} p50 {stats['p50']:8.2f} ms  p95 {stats['p95']:8.2f} ms  {size}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    from app import create_app
+    import response_cache
+    seller_id, listings = seed(args.rows)
+    response_cache.set_backend(None)
+    app = create_app()
+
+    print(f"\n--- {args.rows} rows, orjson {'on' if json_provider.orjson else 'MISSING'}, "
+          f"encodings {compression.ENCODINGS} ---")
+    old_json, new_json = DefaultJSONProvider(app), json_provider.FastJSONProvider(app)
+    with app.app_context():
+        row("serialize: stdlib json (old)", measure(lambda: old_json.response(listings), repeat=args.repeat))
+        row("serialize: orjson (new)", measure(lambda: new_json.response(listings), repeat=args.repeat))
+        body = new_json.response(listings).get_data()
+    for encoding in compression.ENCODINGS:
+        started = time.perf_counter()
+        size = len(compression.compress(body, encoding))
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"compress {encoding:<31} {elapsed:8.2f} ms  {len(body) / 1024:.0f} KiB -> {size / 1024:.0f} KiB "
+              f"({100 - size * 100 / len(body):.0f}% smaller)")
+
+    client = app.test_client()
+    path = f'/wheat_listing/wheat-listings/user/{seller_id}'
+    fast = app.json
+    app.json = DefaultJSONProvider(app)
+    size = len(client.get(path).get_data())
+    row("GET old: stdlib json, identity", measure(lambda: client.get(path), repeat=args.repeat), size)
+    app.json = fast
+    for encoding in (None,) + compression.ENCODINGS:
+        headers = {'Accept-Encoding': encoding} if encoding else {}
+        size = len(client.get(path, headers=headers).get_data())
+        row(f"GET new: orjson, {encoding or 'identity'}",
+            measure(lambda: client.get(path, headers=headers), repeat=args.repeat), size)
+
+
+if __name__ == '__main__':
+    main()
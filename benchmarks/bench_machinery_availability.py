@@ -0,0 +1,151 @@
+"""
+Date-window availability on /machinery/available: old filters vs the
+available_during GiST index.
+
+Seeds --rows machinery listings whose rental windows (1-60 days, min_days
+1-7) start anywhere from ~3 years ago to 100 days ahead - old listings pile
+up, so only about a tenth can still be booked - then for random
+"I need it for N days between from and to" requests compares:
+
+- old: the start_date/end_date filters (available_from / available_to) -
+  no index covers them, so Postgres walks the daily_rate index or scans the
+  table and filters every row
+- new: availability_conditions() on available_during (GiST), which also
+  drops windows that have already ended
+
+Both through the same feed query (build_feed_query, sort=rate_asc), then the
+new one end to end through the test client (response cache off).
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost:5432/agrox_bench \
+        python benchmarks/bench_machinery_availability.py --rows 500000
+"""
+import argparse
+import random
+from datetime import date, timedelta
+
+import common  # noqa: F401  (sets DATABASE_URL before db is imported)
+from common import reset_schema, measure, print_row
+from db import get_db_connection
+from listing_query import build_feed_query
+import machinery_rentals_display
+import response_cache
+
+
+def seed(rows):
+    reset_schema()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO users (full_name, email) VALUES ('Owner', 'o@example.com') RETURNING id")
+    owner_id = cursor.fetchone()['id']
+    cursor.execute("SELECT setseed(0.42)")
+    cursor.execute("""
+        INSERT INTO machinery_rentals (user_id, machinery_type_id, name, description, daily_rate, min_days,
+                                       start_date, end_date)
+        SELECT %(owner)s, 1 + mod(g, 8), 'Tractor ' || g, 'Massey 385, with driver', 2000 + (random() * 8000)::int,
+               1 + mod(g, 7), s, s + (random() * 59)::int
+        FROM (SELECT g, CURRENT_DATE - 1000 + (random() * 1100)::int AS s FROM generate_series(1, %(rows)s) g) w
+    """, {'owner': owner_id, 'rows': rows})
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    conn = get_db_connection()
+    conn.set_session(autocommit=True)
+    cursor = conn.cursor()
+    cursor.execute("VACUUM ANALYZE machinery_rentals")
+    cursor.close()
+    conn.close()
+
+
+def window_requests(count):
+    """
+    {kind: [(from, to, days)]}: windows in the next 90 days (many listings
+    match) and 120-150 days ahead (few listings reach that far), needed for
+    all of the window or for a few days of it.
+    """
+    rng = random.Random(5)
+    today = date.today()
+    kinds = {'near (0-90 days)': (0, 90), 'far (120-150 days)': (120, 150)}
+    out = {}
+    for kind, (low, high) in kinds.items():
+        out[kind] = []
+        for _ in range(count):
+            start = today + timedelta(days=rng.randint(low, high))
+            span = rng.choice((3, 7, 14, 30))
+            out[kind].append((start, start + timedelta(days=span - 1), rng.choice((span, min(span, 3)))))
+    return out
+
+
+def old_args(start, end):
+    # The old filters could only ask "window covers from..to"
+    return {'available_from': start.isoformat(), 'available_to': end.isoformat(), 'sort': 'rate_asc'}
+
+
+def new_args(start, end, days):
+    return {'from': start.isoformat(), 'to': end.isoformat(), 'days': str(days), 'sort': 'rate_asc'}
+
+
+def timed_sql(cursor, args, conditions):
+    sql, params, _, _ = build_feed_query(machinery_rentals_display.AVAILABLE_FEED, args, conditions)
+
+    def run():
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    return sql, params, run
+
+
+def plan(cursor, sql, params):
+    cursor.execute("EXPLAIN (ANALYZE, COSTS OFF) " + sql, params)
+    lines = [row[0] for row in cursor.fetchall()]
+    print("     " + "\n     ".join(line for line in lines if 'Scan' in line or 'Execution' in line))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--requests', type=int, default=40)
+    parser.add_argument('--skip-seed', action='store_true', help="reuse the rows of a previous run")
+    args = parser.parse_args()
+
+    if not args.skip_seed:
+        seed(args.rows)
+    today = date.today()
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    print(f"\n--- {args.rows} listings, {args.requests} date-window requests per kind ---")
+    for kind, windows in window_requests(args.requests).items():
+        old_samples, new_samples = [], []
+        for start, end, days in windows:
+            _, _, old = timed_sql(cursor, old_args(start, end), ())
+            conditions = machinery_rentals_display.availability_conditions(new_args(start, end, days), today)
+            _, _, new = timed_sql(cursor, new_args(start, end, days), conditions)
+            old_samples.extend(measure(old, repeat=3, warmup=1))
+            new_samples.extend(measure(new, repeat=3, warmup=1))
+        print(kind)
+        print_row("  SQL old: start_date/end_date filters", old_samples)
+        print_row("  SQL new: available_during (GiST)", new_samples)
+
+        start, end, days = windows[0]
+        print(f"  plan old, {start}..{end}:")
+        plan(cursor, *timed_sql(cursor, old_args(start, end), ())[:2])
+        conditions = machinery_rentals_display.availability_conditions(new_args(start, end, days), today)
+        print(f"  plan new, {days} days in {start}..{end}:")
+        plan(cursor, *timed_sql(cursor, new_args(start, end, days), conditions)[:2])
+    conn.rollback()
+    cursor.close()
+    conn.close()
+
+    from app import create_app
+    response_cache.set_backend(None)
+    client = create_app().test_client()
+    samples = []
+    for windows in window_requests(args.requests).values():
+        for start, end, days in windows:
+            path = f"/machinery/available?from={start}&to={end}&days={days}"
+            samples.extend(measure(lambda: client.get(path), repeat=3, warmup=1))
+    print()
+    print_row("GET /machinery/available?from&to&days", samples)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Bulk reminder endpoints vs one request per item.
+
+For N = 1, 10, 100 items: N x POST /reminder/add vs one POST /reminder/add-bulk,
+and N x POST /reminder/mark-task-done vs one POST /reminder/mark-tasks-done.
+The bulk endpoints run a fixed number of statements, so their latency should
+barely move with N.
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost:5432/agrox_bench \
+        python benchmarks/bench_reminder_bulk.py
+"""
+import time
+
+import common  # noqa: F401  (sets DATABASE_URL before db is imported)
+from common import reset_schema, make_token
+from db import get_db_connection
+
+REPEAT = 20
+
+
+def seed_user():
+    reset_schema()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO users (full_name, email) VALUES ('Farmer', 'f@example.com') RETURNING id")
+    user_id = cursor.fetchone()['id']
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return user_id
+
+
+def timed(fn):
+    samples = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main():
+    from app import create_app
+
+    user_id = seed_user()
+    client = create_app().test_client()
+    headers = {'Authorization': f'Bearer {make_token(user_id)}'}
+    crop = {'crop_name': 'Wheat', 'planting_date': '2026-11-01', 'field_name': 'Field'}
+
+    def post(path, body, status):
+        response = client.post(path, json=body, headers=headers)
+        assert response.status_code == status, response.get_data(as_text=True)
+        return response.get_json()
+
+    ids = post('/reminder/add-bulk', {'reminders': [crop] * 100}, 201)['ids']
+    tasks = [{'reminder_id': reminder_id, 'task_type': 'seed_sowing'} for reminder_id in ids]
+
+    print(f"{'items':>6} {'N x /add':>12} {'/add-bulk':>12} {'N x /mark-task-done':>20} {'/mark-tasks-done':>18}   (median ms)")
+    for n in (1, 10, 100):
+        singles_add = timed(lambda: [post('/reminder/add', crop, 201) for _ in range(n)])
+        bulk_add = timed(lambda: post('/reminder/add-bulk', {'reminders': [crop] * n}, 201))
+        singles_mark = timed(lambda: [post('/reminder/mark-task-done', task, 200) for task in tasks[:n]])
+        bulk_mark = timed(lambda: post('/reminder/mark-tasks-done', {'tasks': tasks[:n]}, 200))
+        print(f"{n:>6} {singles_add:>12.2f} {bulk_add:>12.2f} {singles_mark:>20.2f} {bulk_mark:>18.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Daily reminder scan: fetchall() + in-memory dict (old) vs the streaming
+named cursor in daily_reminder_job.pending_reminders (new).
+
+Seeds --users farmers with 2 crops each; ~--due-percent of the crops have a
+task due today, the rest are done. Reports scan time, peak Python memory
+(tracemalloc) and the plan of the pending-task scan, with and without the
+partial index idx_crop_tasks_due (crop_tasks.due_date WHERE NOT done).
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost:5432/agrox_bench \
+        python benchmarks/bench_reminder_scan.py --users 100000
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import date
+
+import common  # noqa: F401  (sets DATABASE_URL before db is imported)
+from common import reset_schema
+from db import get_db_connection
+from migrations import backfill_crop_tasks
+import daily_reminder_job
+
+DUE_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_crop_tasks_due ON crop_tasks (due_date) WHERE NOT done"
+
+
+def seed(users, due_percent):
+    reset_schema()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO users (full_name, email)
+        SELECT 'Farmer ' || g, 'farmer' || g || '@example.com' FROM generate_series(1, %s) g
+    """, (users,))
+    # Past seasons: everything done. due_percent of crops: land preparation due.
+    cursor.execute("""
+        INSERT INTO crop_reminders (
+            user_id, crop_name, field_name, planting_date,
+            land_preparation_date, seed_sowing_date, first_irrigation_date,
+            second_irrigation_date, urea_dose_date,
+            land_preparation_done, seed_sowing_done, first_irrigation_done,
+            second_irrigation_done, urea_dose_done)
+        SELECT user_id, 'Wheat', 'Field ' || f, d, d, d + 14, d + 20, d + 28, d + 35,
+               NOT pending, FALSE, FALSE, FALSE, FALSE
+        FROM (
+            SELECT u.id AS user_id, f, random() * 100 < %s AS pending
+            FROM users u, generate_series(1, 2) f
+        ) crops,
+        LATERAL (SELECT CASE WHEN pending THEN CURRENT_DATE - 1 ELSE CURRENT_DATE - 400 END AS d) x
+    """, (due_percent,))
+    # Done seasons have every task done
+    cursor.execute("""
+        UPDATE crop_reminders SET seed_sowing_done = TRUE, first_irrigation_done = TRUE,
+            second_irrigation_done = TRUE, urea_dose_done = TRUE
+        WHERE land_preparation_done
+    """)
+    backfill_crop_tasks(cursor)
+    conn.commit()
+    cursor.close()
+    conn.close()
+    analyze()
+
+
+def analyze():
+    conn = get_db_connection()
+    conn.set_session(autocommit=True)
+    cursor = conn.cursor()
+    cursor.execute("VACUUM ANALYZE crop_reminders")
+    cursor.execute("VACUUM ANALYZE crop_tasks")
+    cursor.execute("VACUUM ANALYZE users")
+    cursor.close()
+    conn.close()
+
+
+def old_scan(today):
+    """The pre-streaming job: fetchall() then a dict of every user's tasks."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(daily_reminder_job.PENDING_SCAN_SQL, {'today': today})
+    rows = cursor.fetchall()
+    users = {}
+    for row in rows:
+        data = users.setdefault(row['email'], {'name': row['full_name'], 'tasks': []})
+        data['tasks'].append(daily_reminder_job.task_line(row, today))
+    messages = [daily_reminder_job.reminder_email(email, d['name'], d['tasks'])
+                for email, d in users.items() if d['tasks']]
+    cursor.close()
+    conn.close()
+    return len(messages)
+
+
+def new_scan(today):
+    conn = get_db_connection()
+    cursor = conn.cursor(name='bench_scan')
+    cursor.itersize = daily_reminder_job.REMINDER_SCAN_ITERSIZE
+    count = sum(1 for _ in daily_reminder_job.pending_reminders(cursor, today))
+    cursor.close()
+    conn.rollback()
+    conn.close()
+    return count
+
+
+def run(label, fn, today):
+    started = time.perf_counter()
+    count = fn(today)
+    elapsed = time.perf_counter() - started
+    # separate pass: tracemalloc slows allocation-heavy code down a lot
+    tracemalloc.start()
+    fn(today)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"{label:<34} {count:>8} emails  {elapsed * 1000:9.1f} ms  peak {peak / 2**10:9.0f} KiB")
+
+
+def plan(today):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("EXPLAIN (ANALYZE, COSTS OFF) " + daily_reminder_job.PENDING_SCAN_SQL, {'today': today})
+    lines = [row[0] for row in cursor.fetchall()]
+    conn.rollback()
+    cursor.close()
+    conn.close()
+    scans = [line.strip() for line in lines if 'Scan' in line and 'crop_tasks' in line]
+    print("   " + "\n   ".join(scans))
+    print("   " + lines[-1].strip())
+
+
+def set_due_index(enabled):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(DUE_INDEX_SQL if enabled else "DROP INDEX IF EXISTS idx_crop_tasks_due")
+    conn.commit()
+    cursor.close()
+    conn.close()
+    analyze()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--due-percent', type=float, default=5.0)
+    args = parser.parse_args()
+
+    seed(args.users, args.due_percent)
+    today = date.today()
+
+    print(f"\n--- {args.users} users, {args.users * 2} crops, ~{args.due_percent}% due ---")
+    run("fetchall + dict (old)", old_scan, today)
+    run("named cursor + groupby (new)", new_scan, today)
+
+    for enabled in (False, True):
+        set_due_index(enabled)
+        print(f"\nPlan {'with' if enabled else 'without'} idx_crop_tasks_due:")
+        plan(today)
+
+
+if __name__ == '__main__':
+    main()
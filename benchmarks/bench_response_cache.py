@@ -0,0 +1,99 @@
+"""
+Listing feeds with and without the response cache.
+
+Seeds --listings wheat listings, then for GET /wheat_listing/wheat-listings:
+- throughput of a single client with caching off vs warm cache (HIT)
+- --threads concurrent requests on a cold key: how many of them ran the
+  feed query (single flight should make it 1)
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost:5432/agrox_bench \
+        python benchmarks/bench_response_cache.py --listings 5000
+"""
+import argparse
+import threading
+import time
+from collections import Counter
+
+import common  # noqa: F401  (sets DATABASE_URL before db is imported)
+from common import reset_schema
+from db import get_db_connection
+from metrics import DB_QUERIES
+from psycopg2.extras import execute_values
+import response_cache
+
+FEED = '/wheat_listing/wheat-listings?limit=200'
+
+
+def seed(listings):
+    reset_schema()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO users (full_name, email) VALUES ('Seller', 's@example.com') RETURNING id")
+    seller_id = cursor.fetchone()['id']
+    execute_values(cursor, "INSERT INTO wheat_listings (user_id, title, price_per_kg, quantity_kg) VALUES %s",
+                   [(seller_id, f"Wheat {i}", 50 + i % 20, 1000) for i in range(listings)])
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def queries():
+    return DB_QUERIES._values.get((), 0)
+
+
+def throughput(client, seconds):
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        assert client.get(FEED).status_code == 200
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--listings', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=50)
+    parser.add_argument('--seconds', type=float, default=3.0)
+    args = parser.parse_args()
+
+    from app import create_app
+    seed(args.listings)
+    app = create_app()
+    client = app.test_client()
+
+    response_cache.set_backend(None)
+    uncached = throughput(client, args.seconds)
+    response_cache.set_backend(response_cache.MemoryBackend())
+    client.get(FEED)
+    cached = throughput(client, args.seconds)
+    print(f"\n--- {args.listings} listings, {FEED} ---")
+    print(f"no cache      {uncached:9.0f} req/s")
+    print(f"cache (HIT)   {cached:9.0f} req/s   x{cached / uncached:.1f}")
+
+    original = response_cache._single_flight
+    for label, single_flight in (("no single flight", lambda key, compute: (compute(), True)),
+                                 ("single flight", original)):
+        response_cache._single_flight = single_flight
+        response_cache.set_backend(response_cache.MemoryBackend())
+        barrier = threading.Barrier(args.threads)
+        statuses = []
+
+        def request():
+            local = app.test_client()
+            barrier.wait()
+            statuses.append(local.get(FEED).headers.get('X-Cache'))
+
+        before = queries()
+        threads = [threading.Thread(target=request) for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        response_cache._single_flight = original
+        print(f"{args.threads} concurrent cold requests, {label:<16}: "
+              f"{queries() - before:4} queries  {dict(Counter(statuses))}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+/search latency on a large catalogue.
+
+Seeds --rows listings (half wheat, a quarter each pesticides / machinery)
+whose titles and descriptions mix farm words (English and Roman Urdu) with
+a long tail of generated words, Zipf-like: a few words are in many
+listings, most are rare. Then runs a mix of queries through the test client
+(response cache off) and reports p50/p95 per kind of query against
+--target-ms, plus the plans of a one-word, a two-word and a rare-word query.
+
+    BENCH_DATABASE_URL=postgresql://postgres@localhost:5432/agrox_bench \
+        python benchmarks/bench_search.py --rows 1000000 --target-ms 150
+"""
+import argparse
+import random
+import time
+from urllib.parse import quote
+
+import common  # noqa: F401  (sets DATABASE_URL before db is imported)
+from common import reset_schema, summarize
+from db import get_db_connection
+import response_cache
+import search
+
+FARM_WORDS = [
+    'wheat', 'gandum', 'tractor', 'thresher', 'harvester', 'rotavator', 'cultivator', 'seed', 'beej',
+    'khad', 'urea', 'dap', 'spray', 'dawai', 'keeray', 'sundi', 'fungicide', 'herbicide', 'organic',
+    'galaxy', 'akbar', 'faisalabad', 'punjab', 'sindh', 'multan', 'okara', 'sahiwal', 'massey',
+    'fiat', 'belarus', 'kubota', 'trolley', 'pump', 'tubewell', 'bori', 'maund', 'mandi', 'fresh',
+    'clean', 'dry', 'bold', 'grain', 'delivery', 'rent', 'kiraya', 'daily', 'new', 'used', 'acre',
+]
+SYLLABLES = ['ka', 'ra', 'ma', 'na', 'ta', 'la', 'sa', 'ba', 'da', 'ga', 'ja', 'pa', 'za', 'ha', 'wa',
+             'ki', 'ri', 'mi', 'ni', 'ti', 'ku', 'ru', 'mu', 'nu', 'tu']
+
+
+def vocabulary(size):
+    rng = random.Random(7)
+    words = list(FARM_WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+# power(random(), 2.5): low indexes (the farm words) are picked far more often
+PICK = "words[1 + floor(power(random(), 2.5) * array_length(words, 1))::int]"
+
+
+def seed(rows, vocab):
+    reset_schema()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO users (full_name, email) VALUES ('Seller', 's@example.com') RETURNING id")
+    seller_id = cursor.fetchone()['id']
+
+    def phrase(count):
+        # correlated on g so Postgres draws new words for every row; "+ 0 * i" keeps
+        # string_agg in the subquery (its argument must use the subquery's column)
+        word = PICK.replace('::int]', '::int + 0 * i]')
+        return f"(SELECT string_agg({word}, ' ') FROM generate_series(1, {count} + 0 * g) i)"
+
+    tables = (
+        ('wheat_listings', 'title, wheat_variety, description, price_per_kg', f"{phrase(3)}, {PICK}, {phrase(12)}, 50 + mod(g, 30)", rows // 2),
+        ('pesticides', 'name, description, price', f"{phrase(2)}, {phrase(10)}, 500 + mod(g, 900)", rows // 4),
+        ('machinery_rentals', 'name, description, daily_rate', f"{phrase(2)}, {phrase(10)}, 2000 + mod(g, 5000)", rows - rows // 2 - rows // 4),
+    )
+    for table, columns, values, count in tables:
+        started = time.perf_counter()
+        for offset in range(0, count, 100000):
+            cursor.execute(f"""
+                INSERT INTO {table} (user_id, {columns})
+                SELECT %(seller)s, {values}
+                FROM (SELECT %(words)s::text[] AS words) v, generate_series(%(start)s, %(stop)s) g
+            """, {'seller': seller_id, 'words': vocab, 'start': offset + 1, 'stop': min(offset + 100000, count)})
+            conn.commit()
+        print(f"seeded {count:>8} {table} in {time.perf_counter() - started:.0f} s")
+    cursor.close()
+    conn.close()
+
+    conn = get_db_connection()
+    conn.set_session(autocommit=True)
+    cursor = conn.cursor()
+    for table, *_ in tables:
+        cursor.execute(f"VACUUM ANALYZE {table}")
+    cursor.execute("VACUUM ANALYZE search_terms")  # filled by the listing triggers
+    cursor.close()
+    conn.close()
+
+
+def query_mix(vocab):
+    rng = random.Random(11)
+    common_words = vocab[:len(FARM_WORDS)]
+    tail = vocab[len(FARM_WORDS):]
+    return {
+        'common word': [rng.choice(common_words) for _ in range(40)],
+        'two words': [f"{rng.choice(common_words)} {rng.choice(common_words)}" for _ in range(40)],
+        'prefix (3 chars)': [rng.choice(common_words)[:3] for _ in range(40)],
+        'rare word': [rng.choice(tail) for _ in range(40)],
+        'word + page 2': [rng.choice(common_words) for _ in range(40)],
+    }
+
+
+def plan(q):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    q, words, types, limit, _ = search.parse_search_args({'q': q})
+    sql, params = search.prepare_search(cursor, 'fulltext', q, words, types, limit, None)
+    cursor.execute("EXPLAIN (ANALYZE, COSTS OFF) " + sql, params)
+    lines = [row[0] for row in cursor.fetchall()]
+    conn.rollback()
+    cursor.close()
+    conn.close()
+    print("   " + "\n   ".join(line for line in lines if 'Scan' in line or 'Execution' in line))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--vocabulary', type=int, default=20000)
+    parser.add_argument('--target-ms', type=float, default=150.0)
+    parser.add_argument('--skip-seed', action='store_true', help="reuse the rows of a previous run")
+    args = parser.parse_args()
+
+    vocab = vocabulary(args.vocabulary)
+    if not args.skip_seed:
+        seed(args.rows, vocab)
+
+    from app import create_app
+    response_cache.set_backend(None)
+    client = create_app().test_client()
+
+    print(f"\n--- {args.rows} listings, target p95 {args.target_ms:.0f} ms ---")
+    everything = []
+    for kind, queries in query_mix(vocab).items():
+        samples = []
+        for q in queries:
+            path = f"/search?q={quote(q)}&limit=20"
+            if kind == 'word + page 2':
+                next_cursor = client.get(path).get_json()['next_cursor']
+                if not next_cursor:
+                    continue
+                path += f"&cursor={next_cursor}"
+            started = time.perf_counter()
+            response = client.get(path)
+            samples.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.get_data(as_text=True)
+        everything.extend(samples)
+        stats = summarize(samples)
+        print(f"{kind:<18} p50 {stats['p50']:8.1f} ms  p95 {stats['p95']:8.1f} ms")
+    stats = summarize(everything)
+    verdict = 'OK' if stats['p95'] <= args.target_ms else 'OVER TARGET'
+    print(f"{'all':<18} p50 {stats['p50']:8.1f} ms  p95 {stats['p95']:8.1f} ms  {verdict}")
+    for q in (FARM_WORDS[0], f"{FARM_WORDS[0]} {FARM_WORDS[1]}", vocab[-1]):
+        print(f"\nPlan for q={q}:")
+        plan(q)
+
+
+if __name__ == '__main__':
+    main()
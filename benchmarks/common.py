@@ -0,0 +1,82 @@
+"""
+Shared helpers for the benchmarks.
+
+The benchmarks need a throwaway local Postgres database whose name contains
+"bench" (everything in it is dropped and recreated):
+
+    createdb agrox_bench
+    BENCH_DATABASE_URL=postgresql://postgres@localhost:5432/agrox_bench \
+        python benchmarks/bench_chat_rooms.py
+"""
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+BENCH_DATABASE_URL = os.getenv('BENCH_DATABASE_URL', 'postgresql://postgres@localhost:5432/agrox_bench')
+
+# db.py reads these at import time, so set them before anything imports it
+os.environ['DATABASE_URL'] = BENCH_DATABASE_URL
+os.environ.setdefault('DB_SSLMODE', 'disable')
+
+
+def reset_schema():
+    """Recreate the bench schema from schema.sql and apply migrations.py."""
+    import psycopg2
+    from urllib.parse import urlparse
+
+    db_name = urlparse(BENCH_DATABASE_URL).path.lstrip('/')
+    if 'bench' not in db_name:
+        raise SystemExit(f"Refusing to reset '{db_name}': bench database name must contain 'bench'")
+
+    conn = psycopg2.connect(BENCH_DATABASE_URL, sslmode=os.environ['DB_SSLMODE'])
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute("DROP SCHEMA public CASCADE")
+        cursor.execute("CREATE SCHEMA public")
+        with open(os.path.join(os.path.dirname(__file__), 'schema.sql')) as f:
+            cursor.execute(f.read())
+    conn.close()
+
+    from migrations import run_migrations
+    run_migrations(verbose=False)
+
+
+def make_token(user_id):
+    import datetime
+    import jwt
+    from config import SECRET_KEY
+    return jwt.encode({
+        'user_id': user_id,
+        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+    }, SECRET_KEY, algorithm='HS256')
+
+
+def measure(fn, repeat=50, warmup=3):
+    """Run fn repeatedly and return latency samples in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        'mean': statistics.mean(ordered),
+        'p50': ordered[len(ordered) // 2],
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+    }
+
+
+def print_row(label, samples):
+    s = summarize(samples)
+    print(f"{label:<40} mean {s['mean']:8.2f} ms   p50 {s['p50']:8.2f} ms   p95 {s['p95']:8.2f} ms")
@@ -0,0 +1,187 @@
+"""
+Local stand-in for the Resend API, for load tests of email_dispatch.py.
+
+Accepts POST /emails and POST /emails/batch, sleeps --latency per request,
+answers 429 (with Retry-After) above --rate-limit requests/second, and
+records requests, emails and throughput (GET /stats returns them as JSON).
+Like Resend, a repeated Idempotency-Key is answered but not delivered again.
+
+Tests script failures with recorder.script(): the next requests get the
+given statuses, e.g. script(503, 503) or script(429, retry_after=0.2);
+after_record=True delivers first and then fails (a reply lost on the way
+back, so the retry must be deduplicated).
+
+    python benchmarks/fake_resend_server.py --port 8025 --latency 0.05 --rate-limit 10
+    RESEND_API_URL=http://127.0.0.1:8025 RESEND_API_KEY=test python -c \
+        "from daily_reminder_job import send_daily_reminders; send_daily_reminders()"
+
+Benchmarks start it in-process with start_server().
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import deque
+import argparse
+import json
+import math
+import threading
+import time
+import uuid
+
+
+class Recorder:
+    def __init__(self, latency=0.0, rate_limit=None):
+        self.latency = latency
+        self.rate_limit = rate_limit  # requests per second, None = unlimited
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.emails = 0
+            self.rate_limited = 0
+            self.batch_sizes = []
+            self.idempotency_keys = set()
+            self.duplicates = 0
+            self.first_at = None
+            self.last_at = None
+            self._window_start = time.monotonic()
+            self._window_count = 0
+            self.attempt_keys = []  # Idempotency-Key of every POST, in order
+            self._script = deque()
+
+    def script(self, *statuses, retry_after=None, after_record=False):
+        """Answer the next len(statuses) requests with these statuses."""
+        with self.lock:
+            for status in statuses:
+                self._script.append((status, retry_after, after_record))
+
+    def next_scripted(self, idempotency_key):
+        with self.lock:
+            self.attempt_keys.append(idempotency_key)
+            return self._script.popleft() if self._script else None
+
+    def admit(self):
+        """Fixed one-second window rate limit; returns Retry-After seconds or None."""
+        if not self.rate_limit:
+            return None
+        with self.lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start = now
+                self._window_count = 0
+            if self._window_count >= self.rate_limit:
+                self.rate_limited += 1
+                return max(1, math.ceil(self._window_start + 1.0 - now))
+            self._window_count += 1
+            return None
+
+    def record(self, count, idempotency_key):
+        with self.lock:
+            now = time.monotonic()
+            if idempotency_key in self.idempotency_keys:
+                self.duplicates += 1
+                return False
+            if idempotency_key:
+                self.idempotency_keys.add(idempotency_key)
+            self.requests += 1
+            self.emails += count
+            self.batch_sizes.append(count)
+            self.first_at = self.first_at or now
+            self.last_at = now
+            return True
+
+    def stats(self):
+        with self.lock:
+            elapsed = (self.last_at - self.first_at) if self.first_at else 0.0
+            return {
+                'requests': self.requests,
+                'emails': self.emails,
+                'rate_limited': self.rate_limited,
+                'duplicates': self.duplicates,
+                'max_batch': max(self.batch_sizes, default=0),
+                'emails_per_second': round(self.emails / elapsed, 1) if elapsed else None,
+            }
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            return self._reply(200, self.server.recorder.stats())
+        self._reply(404, {'message': 'Not found'})
+
+    def do_POST(self):
+        recorder = self.server.recorder
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            return self._reply(401, {'message': 'Missing API key'})
+        if self.path not in ('/emails', '/emails/batch'):
+            return self._reply(404, {'message': 'Not found'})
+
+        idempotency_key = self.headers.get('Idempotency-Key')
+        scripted = recorder.next_scripted(idempotency_key)
+        if scripted is not None and not scripted[2]:
+            status, retry_after, _ = scripted
+            headers = {'Retry-After': str(retry_after)} if retry_after is not None else None
+            return self._reply(status, {'message': 'Scripted failure'}, headers)
+
+        retry_after = recorder.admit()
+        if retry_after is not None:
+            return self._reply(429, {'message': 'Too many requests'}, {'Retry-After': str(retry_after)})
+
+        payload = json.loads(body)
+        emails = payload if self.path == '/emails/batch' else [payload]
+        if self.path == '/emails/batch' and len(emails) > 100:
+            return self._reply(422, {'message': 'Batch larger than 100 emails'})
+        if recorder.latency:
+            time.sleep(recorder.latency)
+        recorder.record(len(emails), idempotency_key)
+        if scripted is not None:  # after_record: delivered, but the client sees a failure
+            return self._reply(scripted[0], {'message': 'Scripted failure'})
+        if self.path == '/emails':
+            return self._reply(200, {'id': uuid.uuid4().hex})
+        self._reply(200, {'data': [{'id': uuid.uuid4().hex} for _ in emails]})
+
+
+def start_server(port=0, latency=0.0, rate_limit=None):
+    """Run the fake server in a daemon thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.daemon_threads = True
+    server.recorder = Recorder(latency, rate_limit)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--port', type=int, default=8025)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per request')
+    parser.add_argument('--rate-limit', type=float, default=None, help='requests per second')
+    args = parser.parse_args()
+
+    server, url = start_server(args.port, args.latency, args.rate_limit)
+    print(f"Fake Resend on {url} (latency {args.latency}s, rate limit {args.rate_limit or 'none'})")
+    try:
+        while True:
+            time.sleep(5)
+            print(json.dumps(server.recorder.stats()))
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
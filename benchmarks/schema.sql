@@ -0,0 +1,99 @@
+-- Minimal Postgres schema used by the benchmarks (mirrors the Supabase tables
+-- the blueprints read and write). Load it into a scratch database only.
+
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    full_name VARCHAR(255),
+    phone VARCHAR(20),
+    email VARCHAR(255),
+    password_hash VARCHAR(255),
+    email_otp VARCHAR(10),
+    otp_attempts INT DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS wheat_listings (
+    id SERIAL PRIMARY KEY,
+    user_id INT REFERENCES users (id) ON DELETE CASCADE,
+    title VARCHAR(255),
+    price_per_kg NUMERIC(10, 2),
+    quantity_kg NUMERIC(12, 2),
+    description TEXT,
+    wheat_variety VARCHAR(100),
+    grade_quality VARCHAR(100),
+    harvest_season VARCHAR(100),
+    protein_content NUMERIC(5, 2),
+    moisture_level NUMERIC(5, 2),
+    organic_certified BOOLEAN DEFAULT FALSE,
+    pesticides_used BOOLEAN DEFAULT FALSE,
+    local_delivery_available BOOLEAN DEFAULT FALSE,
+    image_path TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS pesticides (
+    id SERIAL PRIMARY KEY,
+    user_id INT REFERENCES users (id) ON DELETE CASCADE,
+    name VARCHAR(255),
+    price NUMERIC(10, 2),
+    quantity INT,
+    description TEXT,
+    organic_certified BOOLEAN DEFAULT FALSE,
+    restricted_use BOOLEAN DEFAULT FALSE,
+    local_delivery_available BOOLEAN DEFAULT FALSE,
+    image_url TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS machinery_rentals (
+    id SERIAL PRIMARY KEY,
+    user_id INT REFERENCES users (id) ON DELETE CASCADE,
+    machinery_type_id INT,
+    name VARCHAR(255),
+    description TEXT,
+    daily_rate NUMERIC(10, 2),
+    min_days INT,
+    start_date DATE,
+    end_date DATE,
+    image_path TEXT,
+    image_url TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS chat_rooms (
+    id SERIAL PRIMARY KEY,
+    buyer_id INT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    seller_id INT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    listing_id INT NOT NULL,
+    listing_type VARCHAR(20) NOT NULL DEFAULT 'wheat',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id SERIAL PRIMARY KEY,
+    room_id INT NOT NULL REFERENCES chat_rooms (id) ON DELETE CASCADE,
+    sender_id INT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    message TEXT NOT NULL,
+    is_read BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS crop_reminders (
+    id SERIAL PRIMARY KEY,
+    user_id INT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    crop_name VARCHAR(100) NOT NULL,
+    field_name VARCHAR(100) NOT NULL,
+    planting_date DATE NOT NULL,
+    land_preparation_date DATE,
+    seed_sowing_date DATE,
+    first_irrigation_date DATE,
+    second_irrigation_date DATE,
+    urea_dose_date DATE,
+    land_preparation_done BOOLEAN DEFAULT FALSE,
+    seed_sowing_done BOOLEAN DEFAULT FALSE,
+    first_irrigation_done BOOLEAN DEFAULT FALSE,
+    second_irrigation_done BOOLEAN DEFAULT FALSE,
+    urea_dose_done BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,137 @@
+"""
+Load script for the chat push channel (GET /chat/stream).
+
+In-process mode (default) uses the InProcessBroker stand-in, parks one
+reader thread per subscriber exactly like the SSE generator does, and
+measures publish -> delivery latency while thousands of streams sit idle:
+
+    python benchmarks/sse_idle_subscribers.py --subscribers 5000
+
+HTTP mode opens real idle SSE connections against a running server (use a
+threaded/async worker, e.g. gunicorn -k gthread --threads 1000 "app:create_app()"),
+holds them for --duration seconds and reports how many stayed open:
+
+    python benchmarks/sse_idle_subscribers.py --url http://127.0.0.1:5000 --subscribers 2000
+"""
+import argparse
+import random
+import resource
+import selectors
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+import common
+from common import make_token, summarize
+from chat_events import InProcessBroker, CLOSED
+
+
+def run_in_process(subscriber_count, messages):
+    broker = InProcessBroker()
+    latencies = []
+    latencies_lock = threading.Lock()
+    received = threading.Semaphore(0)
+
+    def reader(subscription):
+        while True:
+            event = subscription.get(timeout=25)
+            if event is CLOSED:
+                return
+            if event is None:
+                continue
+            elapsed = (time.perf_counter() - event['sent_at']) * 1000
+            with latencies_lock:
+                latencies.append(elapsed)
+            received.release()
+
+    started = time.perf_counter()
+    threads = []
+    for user_id in range(1, subscriber_count + 1):
+        subscription = broker.subscribe(user_id)
+        thread = threading.Thread(target=reader, args=(subscription,), daemon=True)
+        thread.start()
+        threads.append(thread)
+    print(f"{subscriber_count} idle subscribers ready in {time.perf_counter() - started:.2f}s, "
+          f"max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+    cpu_before = time.process_time()
+    time.sleep(2)
+    print(f"CPU used by {subscriber_count} idle subscribers over 2s: "
+          f"{(time.process_time() - cpu_before) * 1000:.1f} ms")
+
+    for _ in range(messages):
+        user_id = random.randint(1, subscriber_count)
+        broker.publish(user_id, {'type': 'message', 'room_id': 1, 'sent_at': time.perf_counter()})
+        received.acquire(timeout=5)
+
+    s = summarize(latencies)
+    print(f"publish -> deliver over {len(latencies)} messages: "
+          f"p50 {s['p50']:.3f} ms  p95 {s['p95']:.3f} ms")
+    broker.close()
+
+
+def run_http(url, subscriber_count, duration, first_user_id):
+    parsed = urlparse(url)
+    host, port = parsed.hostname, parsed.port or 80
+    selector = selectors.DefaultSelector()
+    stats = {'connected': 0, 'ready': 0, 'keepalives': 0, 'closed': 0, 'errors': 0}
+
+    started = time.perf_counter()
+    for offset in range(subscriber_count):
+        token = make_token(first_user_id + offset)
+        try:
+            sock = socket.create_connection((host, port), timeout=10)
+        except OSError:
+            stats['errors'] += 1
+            continue
+        sock.sendall((
+            f"GET /chat/stream HTTP/1.1\r\nHost: {host}\r\n"
+            f"Authorization: Bearer {token}\r\nAccept: text/event-stream\r\n\r\n"
+        ).encode())
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ)
+        stats['connected'] += 1
+    print(f"Opened {stats['connected']} streams in {time.perf_counter() - started:.2f}s "
+          f"({stats['errors']} connect errors)")
+
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline and selector.get_map():
+        for key, _ in selector.select(timeout=1):
+            sock = key.fileobj
+            try:
+                chunk = sock.recv(65536)
+            except OSError:
+                chunk = b''
+            if not chunk:
+                stats['closed'] += 1
+                selector.unregister(sock)
+                sock.close()
+                continue
+            stats['ready'] += chunk.count(b'event: ready')
+            stats['keepalives'] += chunk.count(b': keep-alive')
+
+    print(f"After {duration}s: {len(selector.get_map())} streams still open, "
+          f"{stats['ready']} ready events, {stats['keepalives']} keep-alives, "
+          f"{stats['closed']} closed by server")
+    for key in list(selector.get_map().values()):
+        key.fileobj.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subscribers', type=int, default=2000)
+    parser.add_argument('--messages', type=int, default=1000)
+    parser.add_argument('--url', help='run against a live server instead of the in-process broker')
+    parser.add_argument('--duration', type=int, default=60)
+    parser.add_argument('--first-user-id', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.url:
+        run_http(args.url, args.subscribers, args.duration, args.first_user_id)
+    else:
+        run_in_process(args.subscribers, args.messages)
+
+
+if __name__ == '__main__':
+    main()
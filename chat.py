@@ -3,40 +3,41 @@ API routes for chat functionality with JWT authentication.
 Handles chat rooms and messages between buyers and sellers.
 Optimized for production with connection pooling and timeout handling.
 """
-from flask import Blueprint, request, jsonify
-from db import get_db_connection
-from auth import verify_token
+from flask import Blueprint, Response, request, jsonify, g
+from db import get_db_connection, request_deadline, DeadlineExceeded
+from auth import token_required
+from chat_events import get_broker, publish_to_users, CLOSED
+from chat_unread import increment_unread, decrement_unread, TOTAL_SQL as UNREAD_TOTAL_SQL
+import json
 from datetime import datetime
 from functools import wraps
-import signal
+import logging
 
 # Create a Blueprint for chat routes
 chat_bp = Blueprint('chat', __name__)
-
-def timeout_handler(signum, frame):
-    raise TimeoutError("Request exceeded time limit")
+logger = logging.getLogger(__name__)
 
 def request_timeout(seconds=8):
-    """Decorator to add timeout to request handlers"""
+    """
+    Give the handler a `seconds` budget. Pool waits and every statement
+    (Postgres statement_timeout / lock_timeout) are capped by what is left,
+    so a slow query is cancelled server-side; the client then gets a 504.
+    Works under threaded and gevent workers - no signals involved.
+    """
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            # Set signal alarm (Unix only - Flask handles this on other platforms)
-            try:
-                signal.signal(signal.SIGALRM, timeout_handler)
-                signal.alarm(seconds)
-            except:
-                pass
-            
-            try:
-                result = func(*args, **kwargs)
-            finally:
+            with request_deadline(seconds) as deadline:
+                g.deadline = deadline
                 try:
-                    signal.alarm(0)  # Disable the alarm
-                except:
-                    pass
-            
-            return result
+                    result = func(*args, **kwargs)
+                except DeadlineExceeded:
+                    deadline.exceeded = True
+                # Handlers swallow DB errors into 500s; the deadline flag says why
+                if deadline.exceeded:
+                    logger.warning("%s %s exceeded its %ss deadline", request.method, request.path, seconds)
+                    return jsonify({'error': 'Request timed out'}), 504
+                return result
         return wrapper
     return decorator
 
@@ -91,19 +92,18 @@ def safe_db_operation(query, params=None, fetch_one=False, fetch_all=False):
 
 # ==================== CREATE OR GET CHAT ROOM ====================
 @chat_bp.route('/rooms', methods=['POST'])
+@token_required
 @request_timeout(8)
 def create_or_get_room():
     """Create new chat room or get existing one"""
     try:
-        user_id = verify_token()
-        if not user_id:
-            return jsonify({'error': 'Unauthorized'}), 401
+        user_id = g.user_id
        
         data = request.get_json()
         listing_id = data.get('listing_id')
         listing_type = data.get('listing_type', 'wheat')
        
-        print(f"[CHAT] User {user_id} requesting chat for {listing_type} listing {listing_id}")
+        logger.debug("User %s requesting chat for %s listing %s", user_id, listing_type, listing_id)
        
         if not listing_id:
             return jsonify({'error': 'listing_id is required'}), 400
@@ -128,7 +128,7 @@ def create_or_get_room():
         listing, error = safe_db_operation(query, (listing_id,), fetch_one=True)
         
         if error:
-            print(f"[CHAT ERROR] Database error fetching listing: {error}")
+            logger.error("Database error fetching listing: %s", error)
             return jsonify({'error': 'Database error'}), 500
         
         if not listing:
@@ -140,7 +140,7 @@ def create_or_get_room():
         if buyer_id == seller_id:
             return jsonify({'error': 'Cannot chat with yourself'}), 400
        
-        print(f"[CHAT] Buyer: {buyer_id}, Seller: {seller_id}")
+        logger.debug("Buyer: %s, Seller: %s", buyer_id, seller_id)
        
         query = """
             SELECT id FROM chat_rooms
@@ -157,12 +157,12 @@ def create_or_get_room():
         )
         
         if error:
-            print(f"[CHAT ERROR] Database error checking room: {error}")
+            logger.error("Database error checking room: %s", error)
             return jsonify({'error': 'Database error'}), 500
        
         if existing_room:
             room_id = existing_room['id']
-            print(f"[CHAT] Existing room found: {room_id}")
+            logger.debug("Existing room found: %s", room_id)
             return jsonify({'room_id': room_id, 'other_user_id': seller_id}), 200
        
         conn = None
@@ -181,7 +181,7 @@ def create_or_get_room():
             room_id = room_result['id']
             
             conn.commit()
-            print(f"[CHAT] New room created: {room_id}")
+            logger.info("New room created: %s", room_id)
             
             return jsonify({'room_id': room_id, 'other_user_id': seller_id}), 201
         
@@ -191,7 +191,7 @@ def create_or_get_room():
                     conn.rollback()
                 except:
                     pass
-            print(f"[CHAT ERROR] Failed to create room: {str(e)}")
+            logger.error("Failed to create room: %s", e)
             return jsonify({'error': 'Failed to create room'}), 500
         
         finally:
@@ -209,131 +209,154 @@ def create_or_get_room():
     except TimeoutError:
         return jsonify({'error': 'Request timeout'}), 504
     except Exception as e:
-        print(f"[CHAT ERROR] create_or_get_room: {str(e)}")
+        logger.exception("create_or_get_room: %s", e)
         return jsonify({'error': 'Server error'}), 500
 
 # ==================== GET USER'S CHAT ROOMS ====================
+# listing_data keys returned in the inbox for each listing type
+ROOM_LISTING_FIELDS = {
+    'wheat': ('name', 'price'),
+    'pesticide': ('name', 'price'),
+    'machinery': ('name', 'price', 'image_path'),
+}
+
+# One round trip: the page of rooms is picked first, then the last
+# message comes from one index probe per room (LATERAL), unread counts
+# from the materialized counters and listing details from joins instead
+# of a SELECT per room.
+USER_ROOMS_QUERY = """
+    WITH page AS (
+        SELECT
+            id,
+            listing_id,
+            listing_type,
+            created_at,
+            COALESCE(updated_at, created_at) as updated_at,
+            CASE
+                WHEN buyer_id = %(user_id)s THEN seller_id
+                ELSE buyer_id
+            END as other_user_id
+        FROM chat_rooms
+        WHERE buyer_id = %(user_id)s OR seller_id = %(user_id)s
+        ORDER BY COALESCE(updated_at, created_at) DESC
+        LIMIT 100
+    )
+    SELECT
+        p.id as room_id,
+        p.listing_id,
+        p.listing_type,
+        p.created_at,
+        p.updated_at,
+        p.other_user_id,
+        u.full_name as other_user_name,
+        'placeholder.jpg' as other_user_image,
+        lm.message as last_message,
+        lm.created_at as last_message_time,
+        COALESCE(uc.unread_count, 0) as unread_count,
+        COALESCE(w.id, pe.id, m.id) as listing_found,
+        COALESCE(w.title, pe.name, m.name) as listing_name,
+        COALESCE(w.price_per_kg, pe.price, m.daily_rate) as listing_price,
+        m.image_path as listing_image_path
+    FROM page p
+    JOIN users u ON u.id = p.other_user_id
+    LEFT JOIN LATERAL (
+        SELECT message, created_at FROM chat_messages
+        WHERE room_id = p.id
+        ORDER BY created_at DESC, id DESC LIMIT 1
+    ) lm ON TRUE
+    LEFT JOIN chat_unread_counters uc
+        ON uc.user_id = %(user_id)s AND uc.room_id = p.id
+    LEFT JOIN wheat_listings w
+        ON p.listing_type = 'wheat' AND w.id = p.listing_id
+    LEFT JOIN pesticides pe
+        ON p.listing_type = 'pesticide' AND pe.id = p.listing_id
+    LEFT JOIN machinery_rentals m
+        ON p.listing_type = 'machinery' AND m.id = p.listing_id
+    ORDER BY p.updated_at DESC
+"""
+
 @chat_bp.route('/rooms', methods=['GET'])
+@token_required
 @request_timeout(8)
 def get_user_rooms():
     """Get all chat rooms for current user"""
     try:
-        user_id = verify_token()
-        if not user_id:
-            return jsonify({'error': 'Unauthorized'}), 401
-       
-        query = """
-            SELECT
-                cr.id as room_id,
-                cr.listing_id,
-                cr.listing_type,
-                cr.created_at,
-                COALESCE(cr.updated_at, cr.created_at) as updated_at,
-                CASE
-                    WHEN cr.buyer_id = %s THEN cr.seller_id
-                    ELSE cr.buyer_id
-                END as other_user_id,
-                u.full_name as other_user_name,
-                'placeholder.jpg' as other_user_image,
-                (SELECT message FROM chat_messages
-                 WHERE room_id = cr.id
-                 ORDER BY created_at DESC LIMIT 1) as last_message,
-                (SELECT created_at FROM chat_messages
-                 WHERE room_id = cr.id
-                 ORDER BY created_at DESC LIMIT 1) as last_message_time,
-                (SELECT COUNT(*) FROM chat_messages
-                 WHERE room_id = cr.id
-                 AND sender_id != %s
-                 AND is_read = FALSE) as unread_count
-            FROM chat_rooms cr
-            JOIN users u ON u.id = CASE
-                WHEN cr.buyer_id = %s THEN cr.seller_id
-                ELSE cr.buyer_id
-            END
-            WHERE cr.buyer_id = %s OR cr.seller_id = %s
-            ORDER BY COALESCE(cr.updated_at, cr.created_at) DESC
-            LIMIT 100
-        """
+        user_id = g.user_id
         
-        rooms, error = safe_db_operation(
-            query,
-            (user_id, user_id, user_id, user_id, user_id),
-            fetch_all=True
-        )
+        rooms, error = safe_db_operation(USER_ROOMS_QUERY, {'user_id': user_id}, fetch_all=True)
         
         if error:
-            print(f"[CHAT ERROR] Database error fetching rooms: {error}")
+            logger.error("Database error fetching rooms: %s", error)
             return jsonify({'error': 'Database error'}), 500
         
         if not rooms:
             return jsonify({'rooms': []}), 200
         
         formatted_rooms = []
-        conn = None
-        cursor = None
-        
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            table_map = {
-                'wheat': ('wheat_listings', 'title as name, price_per_kg as price'),
-                'pesticide': ('pesticides', 'name, price'),
-                'machinery': ('machinery_rentals', 'name, daily_rate as price, image_path')
+        for room in rooms:
+            room_dict = dict(room)
+            listing_found = room_dict.pop('listing_found')
+            listing_values = {
+                'name': room_dict.pop('listing_name'),
+                'price': room_dict.pop('listing_price'),
+                'image_path': room_dict.pop('listing_image_path'),
             }
             
-            for room in rooms:
-                room_dict = dict(room)
-                listing_type = room_dict['listing_type']
-                listing_id = room_dict['listing_id']
-                
-                listing_data = {}
-                if listing_type in table_map:
-                    table_name, fields = table_map[listing_type]
-                    try:
-                        cursor.execute(f"SELECT {fields} FROM {table_name} WHERE id = %s LIMIT 1", (listing_id,))
-                        listing_result = cursor.fetchone()
-                        if listing_result:
-                            listing_data = dict(listing_result)
-                    except Exception as e:
-                        print(f"[CHAT WARNING] Could not fetch listing data: {e}")
-                
-                room_dict['listing_data'] = listing_data
-                formatted_rooms.append(room_dict)
+            listing_data = {}
+            fields = ROOM_LISTING_FIELDS.get(room_dict['listing_type'])
+            if fields and listing_found is not None:
+                listing_data = {field: listing_values[field] for field in fields}
             
-            return jsonify({'rooms': formatted_rooms}), 200
-        
-        except Exception as e:
-            print(f"[CHAT ERROR] Error fetching listing data: {str(e)}")
-            return jsonify({'rooms': formatted_rooms}), 200
+            room_dict['listing_data'] = listing_data
+            formatted_rooms.append(room_dict)
         
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except:
-                    pass
-            if conn:
-                try:
-                    conn.close()
-                except:
-                    pass
+        return jsonify({'rooms': formatted_rooms}), 200
        
     except TimeoutError:
         return jsonify({'error': 'Request timeout'}), 504
     except Exception as e:
-        print(f"[CHAT ERROR] get_user_rooms: {str(e)}")
+        logger.exception("get_user_rooms: %s", e)
         return jsonify({'error': 'Server error'}), 500
 
 # ==================== GET CHAT MESSAGES ====================
+DEFAULT_MESSAGE_PAGE_SIZE = 50
+MAX_MESSAGE_PAGE_SIZE = 200
+
+def optional_int_arg(name):
+    """Read an optional integer query param; raises ValueError if malformed."""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    return int(value)
+
 @chat_bp.route('/rooms/<int:room_id>/messages', methods=['GET'])
+@token_required
 @request_timeout(8)
 def get_messages(room_id):
-    """Get all messages in a chat room"""
+    """
+    Get messages in a chat room, one keyset page at a time.
+
+    Query params:
+    - after_id: only messages newer than this id (polling for new messages)
+    - before_id: only messages older than this id (scrolling back in history)
+    - limit: page size (default 50, max 200)
+
+    Without a cursor the newest page is returned. Messages are always in
+    ascending id order.
+    """
     try:
-        user_id = verify_token()
-        if not user_id:
-            return jsonify({'error': 'Unauthorized'}), 401
+        user_id = g.user_id
+        
+        try:
+            before_id = optional_int_arg('before_id')
+            after_id = optional_int_arg('after_id')
+            limit = optional_int_arg('limit') or DEFAULT_MESSAGE_PAGE_SIZE
+        except ValueError:
+            return jsonify({'error': 'Invalid pagination parameters'}), 400
+        
+        if limit < 1:
+            return jsonify({'error': 'limit must be positive'}), 400
+        limit = min(limit, MAX_MESSAGE_PAGE_SIZE)
         
         query = """
             SELECT buyer_id, seller_id FROM chat_rooms WHERE id = %s LIMIT 1
@@ -341,7 +364,7 @@ def get_messages(room_id):
         room, error = safe_db_operation(query, (room_id,), fetch_one=True)
         
         if error:
-            print(f"[CHAT ERROR] Database error verifying room: {error}")
+            logger.error("Database error verifying room: %s", error)
             return jsonify({'error': 'Database error'}), 500
        
         if not room:
@@ -350,7 +373,21 @@ def get_messages(room_id):
         if user_id not in [room['buyer_id'], room['seller_id']]:
             return jsonify({'error': 'Access denied'}), 403
        
-        query = """
+        # Keyset pagination on (room_id, id): polling walks forward from
+        # after_id, history walks backward from before_id. One extra row is
+        # fetched to know whether another page exists.
+        conditions = ["cm.room_id = %s"]
+        params = [room_id]
+        if after_id is not None:
+            conditions.append("cm.id > %s")
+            params.append(after_id)
+        if before_id is not None:
+            conditions.append("cm.id < %s")
+            params.append(before_id)
+        order = "ASC" if after_id is not None else "DESC"
+        params.append(limit + 1)
+        
+        query = f"""
             SELECT
                 cm.id,
                 cm.sender_id,
@@ -361,73 +398,92 @@ def get_messages(room_id):
                 'placeholder.jpg' as sender_image
             FROM chat_messages cm
             JOIN users u ON u.id = cm.sender_id
-            WHERE cm.room_id = %s
-            ORDER BY cm.created_at ASC
-            LIMIT 1000
+            WHERE {' AND '.join(conditions)}
+            ORDER BY cm.id {order}
+            LIMIT %s
         """
         
-        messages, error = safe_db_operation(query, (room_id,), fetch_all=True)
+        messages, error = safe_db_operation(query, tuple(params), fetch_all=True)
         
         if error:
-            print(f"[CHAT ERROR] Database error fetching messages: {error}")
+            logger.error("Database error fetching messages: %s", error)
             return jsonify({'error': 'Database error'}), 500
         
         messages_list = [dict(msg) for msg in messages] if messages else []
-        print(f"[CHAT] Retrieved {len(messages_list)} messages for room {room_id}")
-       
-        conn = None
-        cursor = None
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                UPDATE chat_messages
-                SET is_read = TRUE
-                WHERE room_id = %s AND sender_id != %s AND is_read = FALSE
-            """, (room_id, user_id))
-            
-            cursor.execute("""
-                UPDATE chat_rooms SET updated_at = CURRENT_TIMESTAMP WHERE id = %s
-            """, (room_id,))
-            
-            conn.commit()
-        except Exception as e:
-            print(f"[CHAT WARNING] Could not update read status: {e}")
-            if conn:
-                try:
-                    conn.rollback()
-                except:
-                    pass
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except:
-                    pass
-            if conn:
-                try:
-                    conn.close()
-                except:
-                    pass
+        has_more = len(messages_list) > limit
+        messages_list = messages_list[:limit]
+        if order == "DESC":
+            messages_list.reverse()
+        logger.debug("Retrieved %s messages for room %s", len(messages_list), room_id)
+       
+        # Only the messages actually delivered in this page are marked read
+        unread_ids = [
+            msg['id'] for msg in messages_list
+            if msg['sender_id'] != user_id and not msg['is_read']
+        ]
+        
+        if unread_ids:
+            conn = None
+            cursor = None
+            try:
+                conn = get_db_connection()
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    UPDATE chat_messages
+                    SET is_read = TRUE
+                    WHERE room_id = %s AND id = ANY(%s) AND is_read = FALSE
+                """, (room_id, unread_ids))
+                
+                # rowcount, not len(unread_ids): a concurrent reader may have
+                # marked some of them already
+                decrement_unread(cursor, user_id, room_id, cursor.rowcount)
+                
+                cursor.execute("""
+                    UPDATE chat_rooms SET updated_at = CURRENT_TIMESTAMP WHERE id = %s
+                """, (room_id,))
+                
+                conn.commit()
+            except Exception as e:
+                logger.warning("Could not update read status: %s", e)
+                if conn:
+                    try:
+                        conn.rollback()
+                    except:
+                        pass
+            finally:
+                if cursor:
+                    try:
+                        cursor.close()
+                    except:
+                        pass
+                if conn:
+                    try:
+                        conn.close()
+                    except:
+                        pass
        
-        return jsonify({'messages': messages_list}), 200
+        return jsonify({
+            'messages': messages_list,
+            'has_more': has_more,
+            'first_id': messages_list[0]['id'] if messages_list else None,
+            'last_id': messages_list[-1]['id'] if messages_list else after_id
+        }), 200
        
     except TimeoutError:
         return jsonify({'error': 'Request timeout'}), 504
     except Exception as e:
-        print(f"[CHAT ERROR] get_messages: {str(e)}")
+        logger.exception("get_messages: %s", e)
         return jsonify({'error': 'Server error'}), 500
 
 # ==================== SEND MESSAGE ====================
 @chat_bp.route('/rooms/<int:room_id>/messages', methods=['POST'])
+@token_required
 @request_timeout(8)
 def send_message(room_id):
     """Send a message in chat room"""
     try:
-        user_id = verify_token()
-        if not user_id:
-            return jsonify({'error': 'Unauthorized'}), 401
+        user_id = g.user_id
        
         data = request.get_json()
         message = data.get('message', '').strip()
@@ -439,7 +495,7 @@ def send_message(room_id):
         room, error = safe_db_operation(query, (room_id,), fetch_one=True)
         
         if error:
-            print(f"[CHAT ERROR] Database error verifying room: {error}")
+            logger.error("Database error verifying room: %s", error)
             return jsonify({'error': 'Database error'}), 500
        
         if not room:
@@ -462,6 +518,9 @@ def send_message(room_id):
             
             message_result = cursor.fetchone()
             
+            recipient_id = room['seller_id'] if user_id == room['buyer_id'] else room['buyer_id']
+            increment_unread(cursor, recipient_id, room_id)
+            
             cursor.execute("""
                 UPDATE chat_rooms SET updated_at = CURRENT_TIMESTAMP WHERE id = %s
             """, (room_id,))
@@ -478,7 +537,14 @@ def send_message(room_id):
                 'sender_image': 'placeholder.jpg'
             }
             
-            print(f"[CHAT] Message sent successfully to room {room_id}")
+            logger.debug("Message sent successfully to room %s", room_id)
+            
+            # Push to the other participant's open stream (if any)
+            publish_to_users([recipient_id], {
+                'type': 'message',
+                'room_id': room_id,
+                'message': new_message
+            })
             
             return jsonify({'message': new_message}), 201
         
@@ -488,7 +554,7 @@ def send_message(room_id):
                     conn.rollback()
                 except:
                     pass
-            print(f"[CHAT ERROR] Failed to send message: {str(e)}")
+            logger.error("Failed to send message: %s", e)
             return jsonify({'error': 'Failed to send message'}), 500
         
         finally:
@@ -506,24 +572,23 @@ def send_message(room_id):
     except TimeoutError:
         return jsonify({'error': 'Request timeout'}), 504
     except Exception as e:
-        print(f"[CHAT ERROR] send_message: {str(e)}")
+        logger.exception("send_message: %s", e)
         return jsonify({'error': 'Server error'}), 500
 
 # ==================== DELETE CHAT ROOM ====================
 @chat_bp.route('/rooms/<int:room_id>', methods=['DELETE'])
+@token_required
 @request_timeout(8)
 def delete_room(room_id):
     """Delete a chat room"""
     try:
-        user_id = verify_token()
-        if not user_id:
-            return jsonify({'error': 'Unauthorized'}), 401
+        user_id = g.user_id
        
         query = "SELECT buyer_id, seller_id FROM chat_rooms WHERE id = %s LIMIT 1"
         room, error = safe_db_operation(query, (room_id,), fetch_one=True)
         
         if error:
-            print(f"[CHAT ERROR] Database error verifying room: {error}")
+            logger.error("Database error verifying room: %s", error)
             return jsonify({'error': 'Database error'}), 500
        
         if not room:
@@ -549,7 +614,7 @@ def delete_room(room_id):
                     conn.rollback()
                 except:
                     pass
-            print(f"[CHAT ERROR] Failed to delete room: {str(e)}")
+            logger.error("Failed to delete room: %s", e)
             return jsonify({'error': 'Failed to delete room'}), 500
         
         finally:
@@ -567,32 +632,24 @@ def delete_room(room_id):
     except TimeoutError:
         return jsonify({'error': 'Request timeout'}), 504
     except Exception as e:
-        print(f"[CHAT ERROR] delete_room: {str(e)}")
+        logger.exception("delete_room: %s", e)
         return jsonify({'error': 'Server error'}), 500
 
 # ==================== GET UNREAD COUNT ====================
 @chat_bp.route('/unread-count', methods=['GET'])
+@token_required
 @request_timeout(8)
 def get_unread_count():
     """Get total unread message count for the authenticated user"""
     try:
-        user_id = verify_token()
-        if not user_id:
-            return jsonify({'error': 'Unauthorized'}), 401
+        user_id = g.user_id
        
-        query = """
-            SELECT COUNT(*) as unread_count
-            FROM chat_messages cm
-            JOIN chat_rooms cr ON cm.room_id = cr.id
-            WHERE (cr.buyer_id = %s OR cr.seller_id = %s)
-            AND cm.sender_id != %s
-            AND cm.is_read = FALSE
-        """
-        
-        result, error = safe_db_operation(query, (user_id, user_id, user_id), fetch_one=True)
+        # Materialized counters: a primary-key range read instead of a COUNT(*)
+        # over every unread message in the user's rooms
+        result, error = safe_db_operation(UNREAD_TOTAL_SQL, (user_id,), fetch_one=True)
         
         if error:
-            print(f"[CHAT ERROR] Database error fetching unread count: {error}")
+            logger.error("Database error fetching unread count: %s", error)
             return jsonify({'unread_count': 0}), 200
         
         unread_count = result['unread_count'] if result else 0
@@ -602,5 +659,53 @@ def get_unread_count():
     except TimeoutError:
         return jsonify({'error': 'Request timeout'}), 504
     except Exception as e:
-        print(f"[CHAT ERROR] get_unread_count: {str(e)}")
+        logger.exception("get_unread_count: %s", e)
         return jsonify({'unread_count': 0}), 200
+
+# ==================== EVENT STREAM (SSE) ====================
+SSE_HEARTBEAT_SECONDS = 25
+
+def format_sse(event, event_type=None):
+    data = json.dumps(event, default=str)
+    if event_type:
+        return f"event: {event_type}\ndata: {data}\n\n"
+    return f"data: {data}\n\n"
+
+@chat_bp.route('/stream', methods=['GET'])
+@token_required
+def stream_events():
+    """
+    Server-Sent Events stream with new chat messages for the authenticated user.
+
+    One stream per user: opening a new one closes the previous stream. After
+    a reconnect the client catches up with GET /rooms/<id>/messages?after_id=...
+    Run under a threaded/async worker (gthread, gevent) - each open stream
+    holds its worker thread.
+    """
+    user_id = g.user_id
+    
+    broker = get_broker()
+    subscription = broker.subscribe(user_id)
+    logger.info("Stream opened for user %s", user_id)
+    
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            yield format_sse({'user_id': user_id}, 'ready')
+            while True:
+                event = subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                if event is CLOSED:
+                    break
+                if event is None:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event, event.get('type'))
+        finally:
+            broker.unsubscribe(subscription)
+            logger.info("Stream closed for user %s", user_id)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
@@ -0,0 +1,240 @@
+"""
+Pub/sub used to push chat events to connected clients (GET /chat/stream).
+
+- InProcessBroker: fans events out to subscribers held by this process.
+  Good for a single worker and as the stand-in broker for local testing.
+- PostgresBroker: publishes with NOTIFY and LISTENs on a dedicated
+  connection, so an event published by one gunicorn worker reaches a
+  subscriber connected to any other worker.
+
+Pick one with CHAT_BROKER=memory|postgres (default: memory).
+"""
+import json
+import os
+import queue
+import select
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHAT_BROKER = os.getenv('CHAT_BROKER', 'memory')
+CHAT_NOTIFY_CHANNEL = 'chat_events'
+SUBSCRIPTION_QUEUE_SIZE = 100
+
+# NOTIFY payloads must stay below 8000 bytes
+MAX_NOTIFY_PAYLOAD = 7500
+
+# Sentinel pushed to a subscription that should stop streaming
+CLOSED = object()
+
+
+class Subscription:
+    """One open stream. The SSE generator blocks on get() between events."""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.closed = False
+        self._queue = queue.Queue(maxsize=SUBSCRIPTION_QUEUE_SIZE)
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Client is not reading; drop it; it will reconnect and catch up
+            # through GET /rooms/<id>/messages?after_id=...
+            self.close()
+
+    def get(self, timeout=None):
+        """Next event, None on timeout, CLOSED when the stream should end."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._queue.put_nowait(CLOSED)
+        except queue.Full:
+            # Make room for the sentinel so the reader wakes up
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            self._queue.put_nowait(CLOSED)
+
+
+class InProcessBroker:
+    """Keeps at most one subscription per user and delivers events in-process."""
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+
+    def subscribe(self, user_id):
+        subscription = Subscription(user_id)
+        with self._lock:
+            previous = self._subscriptions.get(user_id)
+            self._subscriptions[user_id] = subscription
+        if previous:
+            previous.close()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            if self._subscriptions.get(subscription.user_id) is subscription:
+                del self._subscriptions[subscription.user_id]
+        subscription.close()
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscriptions)
+
+    def deliver(self, user_id, event):
+        """Hand an event to this process's subscriber for user_id, if any."""
+        with self._lock:
+            subscription = self._subscriptions.get(user_id)
+        if subscription and not subscription.closed:
+            subscription.put(event)
+            self.delivered += 1
+            return True
+        return False
+
+    def publish(self, user_id, event):
+        self.published += 1
+        return self.deliver(user_id, event)
+
+    def close(self):
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+            self._subscriptions.clear()
+        for subscription in subscriptions:
+            subscription.close()
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    LISTEN/NOTIFY fan-out across workers.
+
+    publish() sends NOTIFY on a pooled connection; a background thread in
+    every worker LISTENs on its own connection and delivers to local
+    subscribers.
+    """
+
+    def __init__(self, dsn, channel=CHAT_NOTIFY_CHANNEL, **connect_kwargs):
+        super().__init__()
+        self.dsn = dsn
+        self.channel = channel
+        self.connect_kwargs = connect_kwargs
+        self._stop = threading.Event()
+        self._listener = threading.Thread(target=self._listen_forever, name='chat-listener', daemon=True)
+        self._listener.start()
+
+    def publish(self, user_id, event):
+        from db import get_db_connection
+
+        self.published += 1
+        payload = json.dumps({'user_id': user_id, 'event': event}, default=str)
+        if len(payload.encode('utf-8')) > MAX_NOTIFY_PAYLOAD:
+            # Too big for NOTIFY: send a pointer, the client fetches the row
+            slim = {key: event[key] for key in ('type', 'room_id') if key in event}
+            if isinstance(event.get('message'), dict):
+                slim['message_id'] = event['message'].get('id')
+            payload = json.dumps({'user_id': user_id, 'event': slim}, default=str)
+
+        conn = get_db_connection()
+        if conn is None:
+            return False
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            logger.error("NOTIFY failed: %s", e)
+            return False
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _listen_forever(self):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn, **self.connect_kwargs)
+                conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel}")
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            data = json.loads(notify.payload)
+                            self.deliver(data['user_id'], data['event'])
+                        except (ValueError, KeyError) as e:
+                            logger.warning("Bad notification payload: %s", e)
+            except Exception as e:
+                logger.warning("Listener error, reconnecting: %s", e)
+                time.sleep(1)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def close(self):
+        self._stop.set()
+        super().close()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the process-wide broker, creating it on first use."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                if CHAT_BROKER == 'postgres':
+                    from db import DATABASE_URL, DB_SSLMODE, DB_CONNECT_TIMEOUT
+                    _broker = PostgresBroker(DATABASE_URL, sslmode=DB_SSLMODE,
+                                             connect_timeout=DB_CONNECT_TIMEOUT)
+                else:
+                    _broker = InProcessBroker()
+    return _broker
+
+
+def set_broker(broker):
+    """Swap the broker (tests / load scripts use an InProcessBroker stand-in)."""
+    global _broker
+    with _broker_lock:
+        previous, _broker = _broker, broker
+    if previous is not None and previous is not broker:
+        previous.close()
+    return broker
+
+
+def publish_to_users(user_ids, event):
+    """Publish one event to several users; never raises into the caller."""
+    broker = get_broker()
+    for user_id in user_ids:
+        try:
+            broker.publish(user_id, event)
+        except Exception as e:
+            logger.error("publish to user %s failed: %s", user_id, e)
@@ -0,0 +1,113 @@
+"""
+Materialized unread counters for chat, one row per (user, room).
+
+send_message increments the recipient's counter in the same transaction
+as the INSERT, get_messages decrements it by the rows it marks read, and
+GET /chat/unread-count just sums the user's rows (primary-key lookup).
+
+If counters ever drift from chat_messages, rebuild them:
+
+    python chat_unread.py              # all users
+    python chat_unread.py --user 42    # one user
+"""
+from db import get_db_connection
+import logging
+
+logger = logging.getLogger(__name__)
+
+INCREMENT_SQL = """
+    INSERT INTO chat_unread_counters (user_id, room_id, unread_count)
+    VALUES (%s, %s, 1)
+    ON CONFLICT (user_id, room_id)
+    DO UPDATE SET unread_count = chat_unread_counters.unread_count + 1
+"""
+
+DECREMENT_SQL = """
+    UPDATE chat_unread_counters
+    SET unread_count = GREATEST(unread_count - %s, 0)
+    WHERE user_id = %s AND room_id = %s
+"""
+
+TOTAL_SQL = """
+    SELECT COALESCE(SUM(unread_count), 0) as unread_count
+    FROM chat_unread_counters
+    WHERE user_id = %s
+"""
+
+# Unread for a user = messages in their rooms sent by the other participant
+# and not yet read
+REBUILD_SQL = """
+    INSERT INTO chat_unread_counters (user_id, room_id, unread_count)
+    SELECT recipient_id, room_id, COUNT(*)
+    FROM (
+        SELECT
+            CASE WHEN cm.sender_id = cr.buyer_id THEN cr.seller_id ELSE cr.buyer_id END as recipient_id,
+            cm.room_id
+        FROM chat_messages cm
+        JOIN chat_rooms cr ON cr.id = cm.room_id
+        WHERE cm.is_read = FALSE
+        {room_filter}
+    ) unread
+    {recipient_filter}
+    GROUP BY recipient_id, room_id
+"""
+
+
+def increment_unread(cursor, recipient_id, room_id):
+    """Count one new message for recipient_id. Runs in the caller's transaction."""
+    cursor.execute(INCREMENT_SQL, (recipient_id, room_id))
+
+
+def decrement_unread(cursor, user_id, room_id, count):
+    """Subtract messages user_id just read. Runs in the caller's transaction."""
+    if count:
+        cursor.execute(DECREMENT_SQL, (count, user_id, room_id))
+
+
+def rebuild_counters(cursor, user_id=None):
+    """
+    Recompute counters from chat_messages inside the caller's transaction.
+
+    The table lock makes concurrent send_message/get_messages wait until the
+    rebuild commits, so no increment is lost or counted twice.
+    """
+    cursor.execute("LOCK TABLE chat_unread_counters IN EXCLUSIVE MODE")
+    if user_id is None:
+        cursor.execute("DELETE FROM chat_unread_counters")
+        cursor.execute(REBUILD_SQL.format(room_filter="", recipient_filter=""))
+    else:
+        cursor.execute("DELETE FROM chat_unread_counters WHERE user_id = %s", (user_id,))
+        cursor.execute(REBUILD_SQL.format(
+            room_filter="AND (cr.buyer_id = %(user_id)s OR cr.seller_id = %(user_id)s)",
+            recipient_filter="WHERE recipient_id = %(user_id)s"
+        ), {'user_id': user_id})
+    return cursor.rowcount
+
+
+def reconcile(user_id=None):
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("Database connection failed")
+    cursor = conn.cursor()
+    try:
+        rows = rebuild_counters(cursor, user_id)
+        conn.commit()
+        logger.info("Rebuilt %s counter row(s)%s", rows, f" for user {user_id}" if user_id else "")
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    from logging_config import setup_logging
+    setup_logging()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild chat unread counters from chat_messages")
+    parser.add_argument('--user', type=int, help="only rebuild this user's counters")
+    args = parser.parse_args()
+    reconcile(args.user)
@@ -0,0 +1,82 @@
+"""
+gzip / brotli response compression, negotiated from Accept-Encoding.
+
+init_compression(app) (called from create_app) adds an after_request hook
+that compresses JSON/text responses of at least COMPRESS_MIN_SIZE bytes.
+Brotli is used when the client accepts it and the Brotli package is
+installed, otherwise gzip. Streams (SSE), files and already encoded
+responses are left alone.
+
+A compressed body is a different representation: Vary: Accept-Encoding is
+set and a strong ETag becomes weak (W/"..."). If-None-Match is compared
+weakly, so the client's W/ tag still gets a 304.
+
+response_cache.py stores compressed variants with each entry
+(compressed_variants), so cache hits are sent without compressing again.
+"""
+import gzip
+import os
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))  # bytes; below this, headers cost more than they save
+COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/html', 'text/plain', 'text/csv')
+
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    # mtime=0: the same body always compresses to the same bytes
+    return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def negotiate():
+    """Best encoding the client accepts (q-values respected), or None."""
+    return request.accept_encodings.best_match(ENCODINGS)
+
+
+def is_compressible(mimetype, size):
+    return size >= COMPRESS_MIN_SIZE and mimetype in COMPRESSIBLE_TYPES
+
+
+def compressed_variants(data):
+    """{encoding: bytes} for every supported encoding (response cache entries)."""
+    return {encoding: compress(data, encoding) for encoding in ENCODINGS}
+
+
+def mark_encoded(response, encoding):
+    """Headers of a response whose body is now `encoding`-compressed."""
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def init_compression(app):
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers):
+            return response
+        data = response.get_data()
+        if not is_compressible(response.mimetype, len(data)):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate()
+        if encoding is None:
+            return response
+        response.set_data(compress(data, encoding))
+        mark_encoded(response, encoding)
+        return response
@@ -0,0 +1,137 @@
+"""
+Conditional GET for the listing feeds and detail endpoints.
+
+    @etag_feed('wheat_listings')              # feed: table version
+    @etag_row('wheat_listings', 'listing_id')  # detail: the row's xmin
+
+Before the view runs, one small query reads a version:
+- feeds: table_versions, a counter per table bumped by a statement trigger
+  on every INSERT/UPDATE/DELETE (migration 0010), plus its updated_at
+- details: the row's xmin, which changes whenever the row is updated
+
+The ETag is a hash of that version, the path and the normalized query string.
+If-None-Match / If-Modified-Since that still match get a 304 without the rows
+being fetched or serialized. 200 responses carry ETag, Cache-Control and
+(feeds) Last-Modified.
+
+The version is read before the view's own query, so a write in between can
+only make the ETag older than the body (one extra download), never newer.
+
+ETAG_SALT is part of every ETag: change it on a deploy that changes a
+response's shape so clients don't keep their old copies.
+"""
+from datetime import date
+from functools import wraps
+from flask import Response, current_app, request
+import hashlib
+import logging
+import os
+
+from db import get_db_connection
+from response_cache import normalized_query
+
+logger = logging.getLogger(__name__)
+
+ETAG_SALT = os.getenv('ETAG_SALT', '')
+# Feeds change often: short freshness, then revalidate (a 304 is a few bytes)
+FEED_CACHE_CONTROL = os.getenv('FEED_CACHE_CONTROL', 'public, max-age=15, stale-while-revalidate=60')
+DETAIL_CACHE_CONTROL = os.getenv('DETAIL_CACHE_CONTROL', 'public, max-age=60, stale-while-revalidate=300')
+# Per-seller lists: always revalidate, the seller expects to see their own edits
+USER_LIST_CACHE_CONTROL = os.getenv('USER_LIST_CACHE_CONTROL', 'public, no-cache')
+
+
+def _fetch_one(query, params):
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def table_version(tables):
+    """(version key, last modified) of the given tables, or (None, None)."""
+    try:
+        row = _fetch_one("""
+            SELECT string_agg(table_name || '.' || version, ',' ORDER BY table_name) AS version,
+                   MAX(updated_at) AS updated_at
+            FROM table_versions WHERE table_name = ANY(%s)
+        """, (list(tables),))
+    except Exception as e:
+        logger.warning("table_versions lookup failed: %s", e)
+        return None, None
+    if row is None or row['version'] is None:
+        return None, None
+    return row['version'], row['updated_at']
+
+
+def row_version(table, row_id):
+    """The row's xmin (changes on every UPDATE), or None if it doesn't exist."""
+    try:
+        row = _fetch_one(f"SELECT xmin::text AS version FROM {table} WHERE id = %s", (row_id,))
+    except Exception as e:
+        logger.warning("xmin lookup on %s failed: %s", table, e)
+        return None
+    return row['version'] if row else None
+
+
+def make_etag(version):
+    raw = f"{ETAG_SALT}|{request.path}?{normalized_query()}|{version}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:24]
+
+
+def _validated(view, args, kwargs, etag, last_modified, cache_control):
+    """304 if the client's copy is current, else the view's response plus validators."""
+    probe = Response(status=200)
+    probe.set_etag(etag)
+    if last_modified is not None:
+        probe.last_modified = last_modified
+    probe.headers['Cache-Control'] = cache_control
+    if probe.make_conditional(request).status_code == 304:
+        return probe
+
+    response = current_app.make_response(view(*args, **kwargs))
+    if response.status_code == 200:
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def etag_feed(*tables, cache_control=FEED_CACHE_CONTROL, per_day=False):
+    """
+    Conditional GET for a view whose output depends only on `tables`.
+    per_day: it also depends on today's date (e.g. drops past date windows),
+    so the ETag changes at midnight even when no row did.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            version, updated_at = table_version(tables)
+            if version is None:
+                return view(*args, **kwargs)
+            if per_day:
+                version = f"{version}|{date.today().isoformat()}"
+                updated_at = None  # a new day changes the body but not updated_at
+            # Last-Modified is only second-granular; If-None-Match wins when both are sent
+            return _validated(view, args, kwargs, make_etag(version), updated_at, cache_control)
+        return wrapper
+    return decorator
+
+
+def etag_row(table, id_arg, cache_control=DETAIL_CACHE_CONTROL):
+    """Conditional GET for a view showing one row of `table` (id from the URL arg id_arg)."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            version = row_version(table, kwargs[id_arg])
+            if version is None:
+                return view(*args, **kwargs)  # missing row: the view's own 404
+            return _validated(view, args, kwargs, make_etag(version), None, cache_control)
+        return wrapper
+    return decorator
@@ -0,0 +1,44 @@
+"""
+Crop schedule templates: the tasks of each crop and how many days after
+planting each one is due.
+
+Adding a crop (or a task) is an entry here - crop_tasks stores one row per
+task, so no schema change is needed. Crops without their own template use
+DEFAULT_CROP's schedule, like every crop did before templates existed.
+"""
+from collections import namedtuple
+from datetime import timedelta
+
+TaskTemplate = namedtuple('TaskTemplate', ['key', 'label', 'offset_days'])
+
+DEFAULT_CROP = 'wheat'
+
+CROP_SCHEDULES = {
+    'wheat': (
+        TaskTemplate('land_preparation', 'Land Preparation', 0),
+        TaskTemplate('seed_sowing', 'Seed Sowing', 14),
+        TaskTemplate('first_irrigation', 'Pehli Irrigation', 20),
+        TaskTemplate('second_irrigation', 'Doosri Irrigation', 28),
+        TaskTemplate('urea_dose', 'Urea Dalna', 35),
+    ),
+}
+
+# The five task columns crop_reminders had before crop_tasks (backfill source)
+LEGACY_TASKS = ('land_preparation', 'seed_sowing', 'first_irrigation', 'second_irrigation', 'urea_dose')
+
+TASK_LABELS = {task.key: task.label for tasks in CROP_SCHEDULES.values() for task in tasks}
+
+
+def schedule_for(crop_name):
+    key = (crop_name or '').strip().lower()
+    return CROP_SCHEDULES.get(key, CROP_SCHEDULES[DEFAULT_CROP])
+
+
+def build_tasks(crop_name, planting_date):
+    """[(position, task key, due date)] for a crop planted on planting_date."""
+    return [(position, task.key, planting_date + timedelta(days=task.offset_days))
+            for position, task in enumerate(schedule_for(crop_name))]
+
+
+def task_label(key):
+    return TASK_LABELS.get(key, key.replace('_', ' ').title())
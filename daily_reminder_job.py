@@ -1,131 +1,175 @@
 # daily_reminder_job.py - FULL UPDATED VERSION (Land Preparation + Seed Sowing included + Resend API)
 
 from db import get_db_connection
+from email_dispatch import EmailDispatcher
+from crop_schedules import task_label
+from psycopg2.extras import execute_values
 from datetime import date
+from itertools import groupby, islice
+from operator import itemgetter
 import os
-import requests
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Resend API key (Railway mein add ki hui hogi signup ke liye)
 RESEND_API_KEY = os.getenv("RESEND_API_KEY")
 FROM_EMAIL = "reminders@resend.dev"  # <-- RESEND_ hata de, sirf FROM_EMAIL rakh
-def send_daily_reminders():
-    today = date.today()
-    print(f"[{today}] Daily Reminder Job Start — Resend se emails bhej raha hai")
+REMINDER_CHUNK_SIZE = int(os.getenv('REMINDER_CHUNK_SIZE', 500))  # users per chunk / checkpoint
+REMINDER_SCAN_ITERSIZE = int(os.getenv('REMINDER_SCAN_ITERSIZE', 2000))  # rows per server-side fetch
+
+# Every not-done task due by today: one range scan on idx_crop_tasks_due
+# (crop_tasks.due_date WHERE NOT done), ordered by user for grouping.
+PENDING_SCAN_SQL = """
+    SELECT
+        r.user_id,
+        u.email,
+        COALESCE(u.full_name, 'Farmer') as full_name,
+        r.crop_name,
+        r.field_name,
+        t.task,
+        t.due_date
+    FROM crop_tasks t
+    JOIN crop_reminders r ON r.id = t.reminder_id
+    JOIN users u ON u.id = r.user_id
+    WHERE NOT t.done
+      AND t.due_date <= %(today)s
+      AND u.email IS NOT NULL AND u.email != ''
+      AND NOT EXISTS (
+        SELECT 1 FROM reminder_deliveries d
+        WHERE d.run_date = %(today)s AND d.user_id = r.user_id AND d.status = 'sent'
+      )
+    ORDER BY r.user_id, r.id, t.position
+"""
+
+
+def reminder_email(email, name, tasks):
+    """Resend payload for one farmer's pending tasks."""
+    task_list = "<br>".join(tasks)
+    return {
+        "from": FROM_EMAIL,
+        "to": [email],
+        "subject": "AgroX Reminder — Aaj Ke Zaroori Kaam!",
+        "html": f"""
+        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: auto; padding: 20px; border: 1px solid #e0e0e0; border-radius: 10px;">
+            <h2 style="color: #1e5d5e;">As-salāmu ʿalaikum {name} bhai!</h2>
+            <p>Pending kaam:</p>
+            <div style="background: #f5f5f5; padding: 15px; border-radius: 8px;">
+                {task_list}
+            </div>
+            <br>
+            <p><strong>AgroX app kholo aur "Done" mark kar do!</strong></p>
+            <p>— AgroX Team</p>
+        </div>
+        """
+    }
+
+
+def task_line(row, today):
+    """'• Wheat (Field 1) — Seed Sowing (Kal)' for one due crop_tasks row."""
+    days = (today - row['due_date']).days
+    if days == 0:
+        status = "Aaj"
+    elif days == 1:
+        status = "Kal"
+    else:
+        status = f"{days} din pehle"
+    return f"• {row['crop_name']} ({row['field_name']}) — {task_label(row['task'])} ({status})"
+
+
+def pending_reminders(cursor, today):
+    """
+    Stream (user_id, email payload) from the scan, one user at a time.
+    Rows arrive ordered by user, so groupby only ever holds one user's rows.
+    """
+    # A named cursor is planned for a fast first row (cursor_tuple_fraction 0.1);
+    # the job reads every row, so plan for the whole result instead
+    with cursor.connection.cursor() as setup:
+        setup.execute("SET LOCAL cursor_tuple_fraction = 1.0")
+    cursor.execute(PENDING_SCAN_SQL, {'today': today})
+    for user_id, rows in groupby(cursor, key=itemgetter('user_id')):
+        first = next(rows)
+        tasks = [task_line(first, today)] + [task_line(row, today) for row in rows]
+        yield user_id, reminder_email(first['email'], first['full_name'], tasks)
+
+
+def send_daily_reminders(run_date=None, job_id=None, on_chunk=None, chunk_size=REMINDER_CHUNK_SIZE):
+    """
+    Email every farmer their due tasks for run_date (default today).
+
+    The scan is a named (server-side) cursor, fetched REMINDER_SCAN_ITERSIZE
+    rows at a time and grouped per user, so memory stays constant however
+    many farmers there are. Every chunk_size users are sent as one dispatch,
+    then checkpointed to reminder_deliveries on a second connection - a
+    rerun for the same day only sends what is left.
+    on_chunk(sent, failed) is called after each chunk (job heartbeat).
+    Normally run through reminder_jobs.py, not directly.
+    """
+    today = run_date or date.today()
+    logger.info("[%s] Daily Reminder Job Start — Resend se emails bhej raha hai", today)
 
     if not RESEND_API_KEY:
-        print("Error: RESEND_API_KEY nahi mili — Railway variables mein check karo")
-        return
+        raise RuntimeError("RESEND_API_KEY nahi mili — Railway variables mein check karo")
 
     conn = get_db_connection()
-    cursor = conn.cursor()
+    if conn is None:
+        raise RuntimeError("Database connection failed")
+    total_sent = total_failed = 0
+    try:
+        # Named cursor = server-side: rows stream in batches, not one fetchall()
+        cursor = conn.cursor(name='daily_reminder_scan')
+        cursor.itersize = REMINDER_SCAN_ITERSIZE
+        reminders = pending_reminders(cursor, today)
+
+        # Batches of 100 per Resend call, a few in parallel, retries on 429/5xx
+        with EmailDispatcher(RESEND_API_KEY) as dispatcher:
+            while True:
+                chunk = list(islice(reminders, chunk_size))
+                if not chunk:
+                    break
+                result = dispatcher.dispatch(message for _, message in chunk)
+                failed_emails = set(result.failed_recipients)
+                statuses = {user_id: ('failed' if message['to'][0] in failed_emails else 'sent')
+                            for user_id, message in chunk}
+                checkpoint(today, job_id, statuses)
+
+                total_sent += result.sent
+                total_failed += result.failed
+                if on_chunk:
+                    on_chunk(result.sent, result.failed)
+        cursor.close()
+    finally:
+        conn.rollback()  # read-only scan; ends the cursor's transaction
+        conn.close()
+
+    if total_sent == total_failed == 0:
+        logger.info("Aaj koi pending task nahi — email nahi bheji")
+    logger.info("Total emails bheji gayi: %s (failed: %s)", total_sent, total_failed)
+    return total_sent, total_failed
 
+
+def checkpoint(today, job_id, statuses):
+    """Commit a chunk's results on its own connection (the scan's transaction stays open)."""
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("Database connection failed")
+    cursor = conn.cursor()
     try:
-        # Sab 5 tasks check kar raha hai ab (Land Preparation + Seed Sowing bhi include)
-        cursor.execute("""
-            SELECT 
-                u.email,
-                COALESCE(u.full_name, 'Farmer') as full_name,
-                c.crop_name,
-                c.field_name,
-                c.land_preparation_date,
-                c.seed_sowing_date,
-                c.first_irrigation_date,
-                c.second_irrigation_date,
-                c.urea_dose_date,
-                c.land_preparation_done,
-                c.seed_sowing_done,
-                c.first_irrigation_done,
-                c.second_irrigation_done,
-                c.urea_dose_done
-            FROM crop_reminders c
-            JOIN users u ON c.user_id = u.id
-            WHERE u.email IS NOT NULL AND u.email != ''
-              AND (
-                (c.land_preparation_date <= %s AND c.land_preparation_done = FALSE) OR
-                (c.seed_sowing_date <= %s AND c.seed_sowing_done = FALSE) OR
-                (c.first_irrigation_date <= %s AND c.first_irrigation_done = FALSE) OR
-                (c.second_irrigation_date <= %s AND c.second_irrigation_done = FALSE) OR
-                (c.urea_dose_date <= %s AND c.urea_dose_done = FALSE)
-              )
-        """, (today, today, today, today, today))
-
-        rows = cursor.fetchall()
-
-        if not rows:
-            print("Aaj koi pending task nahi — email nahi bheji")
-            return
-
-        users = {}
-        for row in rows:
-            email = row["email"]
-            if email not in users:
-                users[email] = {
-                    "name": row["full_name"],
-                    "tasks": []
-                }
-
-            def add_task(name, date_col, done_col):
-                if row[date_col] and row[date_col] <= today and not row[done_col]:
-                    days = (today - row[date_col]).days
-                    if days == 0:
-                        status = "Aaj"
-                    elif days == 1:
-                        status = "Kal"
-                    else:
-                        status = f"{days} din pehle"
-                    users[email]["tasks"].append(f"• {row['crop_name']} ({row['field_name']}) — {name} ({status})")
-
-            # Sab 5 tasks add kar diye
-            add_task("Land Preparation", "land_preparation_date", "land_preparation_done")
-            add_task("Seed Sowing", "seed_sowing_date", "seed_sowing_done")
-            add_task("Pehli Irrigation", "first_irrigation_date", "first_irrigation_done")
-            add_task("Doosri Irrigation", "second_irrigation_date", "second_irrigation_done")
-            add_task("Urea Dalna", "urea_dose_date", "urea_dose_done")
-
-        sent_count = 0
-        for email, data in users.items():
-            if not data["tasks"]:
-                continue
-
-            task_list = "<br>".join(data["tasks"])
-
-            payload = {
-                "from": FROM_EMAIL,
-                "to": [email],
-                "subject": "AgroX Reminder — Aaj Ke Zaroori Kaam!",
-                "html": f"""
-                <div style="font-family: Arial, sans-serif; max-width: 600px; margin: auto; padding: 20px; border: 1px solid #e0e0e0; border-radius: 10px;">
-                    <h2 style="color: #1e5d5e;">As-salāmu ʿalaikum {data['name']} bhai!</h2>
-                    <p>Pending kaam:</p>
-                    <div style="background: #f5f5f5; padding: 15px; border-radius: 8px;">
-                        {task_list}
-                    </div>
-                    <br>
-                    <p><strong>AgroX app kholo aur "Done" mark kar do!</strong></p>
-                    <p>— AgroX Team</p>
-                </div>
-                """
-            }
-
-            headers = {
-                "Authorization": f"Bearer {RESEND_API_KEY}",
-                "Content-Type": "application/json"
-            }
-
-            try:
-                response = requests.post("https://api.resend.com/emails", json=payload, headers=headers)
-                if response.status_code == 200:
-                    print(f"Email successfully bheji → {email}")
-                    sent_count += 1
-                else:
-                    print(f"Resend error → {email} | {response.text}")
-            except Exception as e:
-                print(f"Email send fail → {email} | {e}")
-
-        print(f"Total emails bheji gayi: {sent_count}")
-
-    except Exception as e:
-        print(f"Database error: {e}")
+        record_deliveries(cursor, today, job_id, statuses)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
     finally:
         cursor.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+
+def record_deliveries(cursor, today, job_id, statuses):
+    """statuses: {user_id: 'sent' | 'failed'}; a later 'sent' overwrites 'failed'."""
+    execute_values(cursor, """
+        INSERT INTO reminder_deliveries (run_date, user_id, status, job_id)
+        VALUES %s
+        ON CONFLICT (run_date, user_id)
+        DO UPDATE SET status = EXCLUDED.status, job_id = EXCLUDED.job_id, sent_at = NOW()
+    """, [(today, user_id, status, job_id) for user_id, status in statuses.items()])
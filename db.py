@@ -1,33 +1,538 @@
 """
 Database connection using Supabase Pooler (IPv4 compatible for Railway)
+
+Connections come from a process-wide pool instead of a fresh
+psycopg2.connect() (TCP + TLS handshake) on every request. Callers keep
+using get_db_connection() / conn.close() exactly as before - close() just
+hands the connection back to the pool.
+
+Request deadlines: inside `with request_deadline(seconds):` every checkout
+sets the session's statement_timeout and lock_timeout to the time left, so
+Postgres cancels a slow query server-side and the worker is freed. This
+works in any thread or greenlet (no signals). A cancelled statement raises
+DeadlineExceeded (a TimeoutError).
 """
 import psycopg2
+from psycopg2 import errors, extensions
 from psycopg2.extras import DictCursor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import deque
 import os
+import threading
+import time
+import weakref
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Railway se environment variable se load
 DATABASE_URL = os.getenv('DATABASE_URL')
+DB_SSLMODE = os.getenv('DB_SSLMODE', 'require')
+
+# Pool settings (Railway variables se override ho sakti hain)
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))                 # seconds to wait for a free connection
+DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', 1800))    # recycle connections older than this
+DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', 300))             # close extra connections idle this long
+DB_POOL_CHECK_AFTER = float(os.getenv('DB_POOL_CHECK_AFTER', 30))        # ping connections idle longer than this
+DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', 5))             # libpq connect_timeout (seconds)
+
+
+# Instrumentation hooks (metrics.py registers these):
+#   QUERY_HOOKS:    fn(duration_seconds, query, params) after every execute
+#   CHECKOUT_HOOKS: fn(wait_seconds) after every pool checkout
+QUERY_HOOKS = []
+CHECKOUT_HOOKS = []
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became free within the pool timeout."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """The current request deadline ran out (pool wait or statement cancelled)."""
+
+
+class Deadline:
+    __slots__ = ('expires_at', 'exceeded')
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+        self.exceeded = False
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+
+# ContextVar, not a thread-local: each gevent greenlet gets its own value too
+_deadline = ContextVar('db_deadline', default=None)
+
+
+@contextmanager
+def request_deadline(seconds):
+    """
+    with request_deadline(8) as deadline:
+        ...  # checkouts and statements are bounded by what is left of 8s
+    deadline.exceeded is True afterwards if anything ran out of time.
+    """
+    deadline = Deadline(seconds)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline():
+    return _deadline.get()
+
+
+def _deadline_error(exc):
+    """QueryCanceled / LockNotAvailable under a deadline -> DeadlineExceeded."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return exc
+    deadline.exceeded = True
+    error = DeadlineExceeded("Statement cancelled: request deadline exceeded")
+    error.__cause__ = exc
+    return error
+
+
+_TIMEOUT_ERRORS = (extensions.QueryCanceledError, errors.LockNotAvailable)
+
+
+class InstrumentedCursor(DictCursor):
+    """DictCursor that times execute/executemany and reports to QUERY_HOOKS."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        except _TIMEOUT_ERRORS as e:
+            raise _deadline_error(e)
+        finally:
+            if QUERY_HOOKS:
+                _run_hooks(QUERY_HOOKS, time.perf_counter() - started, query, vars)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        except _TIMEOUT_ERRORS as e:
+            raise _deadline_error(e)
+        finally:
+            if QUERY_HOOKS:
+                _run_hooks(QUERY_HOOKS, time.perf_counter() - started, query, None)
+
+
+def _run_hooks(hooks, *args):
+    for hook in hooks:
+        try:
+            hook(*args)
+        except Exception as e:
+            logger.warning("Instrumentation hook %r failed: %s", hook, e)
+
+
+class PooledConnection:
+    """
+    Thin proxy around a psycopg2 connection checked out from a pool.
+
+    Everything is delegated to the real connection except close(), which
+    returns the connection to the pool instead of closing the socket.
+
+    A proxy garbage-collected without close() (e.g. dropped on an exception
+    path) has its connection closed and its pool slot freed by a finalizer,
+    so a leak costs one reconnect instead of a slot for the worker's life.
+    """
+
+    def __init__(self, pool, conn, created_at, session_timeout=False):
+        self._pool = pool
+        self._conn = conn
+        self._created_at = created_at
+        self._session_timeout = session_timeout
+        self._returned = False
+        # Must not reference self, or the proxy would never be collected
+        self._finalizer = weakref.finalize(self, pool._reclaim, conn)
+
+    def close(self):
+        if self._returned:
+            return
+        self._returned = True
+        self._finalizer.detach()
+        self._pool.putconn(self._conn, self._created_at, self._session_timeout)
+
+    @property
+    def closed(self):
+        return self._returned or self._conn.closed
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Same semantics as psycopg2's connection context manager (commit on
+        # success, rollback on error) plus returning the connection to the pool.
+        try:
+            if not self._conn.closed:
+                if exc_type is None:
+                    self._conn.commit()
+                else:
+                    self._conn.rollback()
+        finally:
+            self.close()
+        return False
+
+
+class ConnectionPool:
+    """
+    Thread-safe psycopg2 connection pool.
+
+    - min_size connections are kept open, at most max_size are ever open
+    - getconn() waits up to `timeout` seconds for a free connection
+    - connections idle for more than `check_after` seconds are pinged on checkout
+    - connections older than `max_lifetime` seconds are recycled
+    - under a request_deadline(), the wait and the session's statement_timeout /
+      lock_timeout are capped by the time left
+    """
+
+    def __init__(self, dsn, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE,
+                 timeout=DB_POOL_TIMEOUT, max_lifetime=DB_POOL_MAX_LIFETIME,
+                 max_idle=DB_POOL_MAX_IDLE, check_after=DB_POOL_CHECK_AFTER,
+                 name='default', **connect_kwargs):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Invalid pool size: min_size=%s max_size=%s" % (min_size, max_size))
+        self.name = name
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self.connect_kwargs = connect_kwargs
+
+        self._idle = deque()          # (conn, created_at, last_used, session_timeout)
+        self._size = 0                # open connections, idle + checked out
+        self._cond = threading.Condition()
+        self._pid = os.getpid()
+        self._metrics = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'timeouts': 0,
+            'connections_opened': 0,
+            'connect_errors': 0,
+            'connections_closed': 0,
+            'recycled': 0,
+            'health_check_failures': 0,
+            'leaked': 0,
+        }
+
+    # ---------- internals ----------
+
+    def _connect(self):
+        try:
+            conn = psycopg2.connect(self.dsn, **self.connect_kwargs)
+        except Exception:
+            with self._cond:
+                self._metrics['connect_errors'] += 1
+            raise
+        with self._cond:
+            self._metrics['connections_opened'] += 1
+        return conn
+
+    def _discard(self, conn):
+        """Close a connection and free its slot. Call without holding the lock."""
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._metrics['connections_closed'] += 1
+            self._cond.notify()
+
+    def _reclaim(self, conn):
+        """Finalizer of a PooledConnection that was never closed."""
+        if os.getpid() != self._pid:
+            return
+        with self._cond:
+            self._metrics['leaked'] += 1
+        logger.warning("Connection from pool '%s' was never closed; discarding it", self.name)
+        self._discard(conn)
+
+    def _check_fork(self):
+        # Gunicorn --preload: a forked worker must not reuse the parent's sockets.
+        if self._pid != os.getpid():
+            with self._cond:
+                if self._pid != os.getpid():
+                    self._idle.clear()
+                    self._size = 0
+                    self._pid = os.getpid()
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _set_session_timeout(self, conn, timeout_ms, session_timeout):
+        """
+        SET (or RESET) statement_timeout/lock_timeout for this checkout.
+        Returns whether the session now carries a deadline-derived timeout.
+        One round trip, and only when a deadline is active or a previous one
+        has to be cleared - plain checkouts cost nothing extra.
+        """
+        if timeout_ms is None and not session_timeout:
+            return False
+        # autocommit so the SET is not rolled back with the caller's transaction
+        conn.autocommit = True
+        try:
+            with conn.cursor(cursor_factory=extensions.cursor) as cursor:
+                if timeout_ms is None:
+                    cursor.execute("RESET statement_timeout; RESET lock_timeout")
+                else:
+                    cursor.execute("SET statement_timeout = %s; SET lock_timeout = %s",
+                                   (timeout_ms, timeout_ms))
+        finally:
+            conn.autocommit = False
+        return timeout_ms is not None
+
+    # ---------- public API ----------
+
+    def getconn(self, timeout=None):
+        """
+        Check out a connection. Raises PoolTimeout if none frees up in time,
+        DeadlineExceeded if the request deadline runs out first.
+        """
+        self._check_fork()
+        timeout = self.timeout if timeout is None else timeout
+        request_deadline = _deadline.get()
+        if request_deadline is not None:
+            left = request_deadline.remaining()
+            if left <= 0:
+                request_deadline.exceeded = True
+                raise DeadlineExceeded("Request deadline exceeded before checkout")
+            timeout = min(timeout, left)
+        deadline = time.monotonic() + timeout
+        waited = False
+        wait_started = None
+
+        while True:
+            entry = None
+            with self._cond:
+                while True:
+                    if self._idle:
+                        entry = self._idle.pop()  # LIFO keeps hot connections hot
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    if not waited:
+                        waited = True
+                        wait_started = time.monotonic()
+                        self._metrics['waits'] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._metrics['timeouts'] += 1
+                        self._metrics['wait_time_total'] += time.monotonic() - wait_started
+                        if request_deadline is not None and request_deadline.remaining() <= 0:
+                            request_deadline.exceeded = True
+                            raise DeadlineExceeded("Request deadline exceeded waiting for a connection")
+                        raise PoolTimeout(
+                            "No connection available in pool '%s' after %.1fs" % (self.name, timeout))
+                    self._cond.wait(remaining)
+
+            if entry is None:
+                # Reserved a new slot above
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                created_at = time.monotonic()
+                session_timeout = False
+                break
+
+            conn, created_at, last_used, session_timeout = entry
+            now = time.monotonic()
+            if now - created_at > self.max_lifetime:
+                with self._cond:
+                    self._metrics['recycled'] += 1
+                self._discard(conn)
+                continue
+            if now - last_used > self.check_after and not self._is_healthy(conn):
+                with self._cond:
+                    self._metrics['health_check_failures'] += 1
+                self._discard(conn)
+                continue
+            break
+
+        timeout_ms = None
+        if request_deadline is not None:
+            timeout_ms = max(1, int(request_deadline.remaining() * 1000))
+        try:
+            session_timeout = self._set_session_timeout(conn, timeout_ms, session_timeout)
+        except Exception:
+            self._discard(conn)
+            raise
+
+        wait_time = time.monotonic() - wait_started if waited else 0.0
+        with self._cond:
+            self._metrics['checkouts'] += 1
+            self._metrics['wait_time_total'] += wait_time
+        if CHECKOUT_HOOKS:
+            _run_hooks(CHECKOUT_HOOKS, wait_time)
+        return PooledConnection(self, conn, created_at, session_timeout)
+
+    def putconn(self, conn, created_at, session_timeout=False):
+        """
+        Return a connection to the pool, resetting any open transaction.
+        A deadline timeout stays SET; the next checkout overwrites or resets it.
+        """
+        if os.getpid() != self._pid:
+            return
+        if conn.closed:
+            self._discard(conn)
+            return
+        try:
+            if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+        except Exception:
+            self._discard(conn)
+            return
+
+        now = time.monotonic()
+        if now - created_at > self.max_lifetime:
+            with self._cond:
+                self._metrics['recycled'] += 1
+            self._discard(conn)
+            return
+
+        stale = []
+        with self._cond:
+            self._idle.append((conn, created_at, now, session_timeout))
+            # Trim connections that sat idle too long, but never below min_size
+            while (self._idle and self._size - len(stale) > self.min_size
+                   and now - self._idle[0][2] > self.max_idle):
+                stale.append(self._idle.popleft()[0])
+            self._cond.notify()
+        for old in stale:
+            self._discard(old)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        with pool.connection() as conn:
+            ...
+        Commits on success, rolls back on error, always returns the connection.
+        """
+        conn = self.getconn(timeout)
+        with conn:
+            yield conn
+
+    def prefill(self):
+        """Open connections until min_size are available."""
+        conns = []
+        try:
+            while True:
+                with self._cond:
+                    if self._size + len(conns) >= self.min_size:
+                        break
+                conns.append(self.getconn())
+        finally:
+            for conn in conns:
+                conn.close()
+
+    def closeall(self):
+        with self._cond:
+            idle = [entry[0] for entry in self._idle]
+            self._idle.clear()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._metrics)
+            stats.update({
+                'name': self.name,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    DATABASE_URL,
+                    cursor_factory=InstrumentedCursor,
+                    sslmode=DB_SSLMODE,
+                    connect_timeout=DB_CONNECT_TIMEOUT
+                )
+    return _pool
+
+
+def get_pool_stats():
+    return get_pool().stats()
+
 
 def get_db_connection():
+    """
+    A pooled connection, or None if none could be had. DeadlineExceeded is
+    raised instead: the request's time is up, and request_timeout() /
+    the app's error handler turn it into a 504 rather than a 500.
+    """
     try:
-        return psycopg2.connect(
-            DATABASE_URL,
-            cursor_factory=DictCursor,
-            sslmode='require'
-        )
+        return get_pool().getconn()
+    except DeadlineExceeded:
+        raise
     except Exception as e:
-        print(f"Connection error: {e}")
+        logger.error("Connection error: %s", e)
         return None
 
+
+@contextmanager
+def db_connection():
+    """Context-manager flavour of get_db_connection() (raises instead of returning None)."""
+    with get_pool().connection() as conn:
+        yield conn
+
 def init_db():
     try:
+        get_pool().prefill()
         conn = get_db_connection()
         if conn:
             conn.close()
-            print("Supabase database connection successful!")
+            logger.info("Supabase database connection successful!")
             return True
         else:
             return False
     except Exception as e:
-        print(f"Database initialization failed: {e}")
-        return False
\ No newline at end of file
+        logger.error("Database initialization failed: %s", e)
+        return False
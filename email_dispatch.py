@@ -0,0 +1,195 @@
+"""
+Bulk email sending through Resend.
+
+EmailDispatcher sends a stream of messages with
+- one pooled requests.Session (keep-alive, no TLS handshake per email)
+- Resend's batch API: up to EMAIL_BATCH_SIZE (100) emails per POST /emails/batch
+- at most EMAIL_CONCURRENCY batches in flight
+- retries with backoff on 5xx / network errors (EMAIL_MAX_RETRIES)
+- 429s wait out Retry-After - pausing every worker, not only the one that got
+  it - for up to EMAIL_RATE_LIMIT_WAIT seconds per batch; throttling is not
+  counted as a failed attempt
+- an Idempotency-Key per batch, so a retried batch is not delivered twice
+
+Settings (env): RESEND_API_URL (point it at benchmarks/fake_resend_server.py
+for load tests), EMAIL_BATCH_SIZE, EMAIL_CONCURRENCY, EMAIL_MAX_RETRIES,
+EMAIL_RATE_LIMIT_WAIT, EMAIL_TIMEOUT (read timeout, seconds).
+"""
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from requests.adapters import HTTPAdapter
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+import requests
+
+logger = logging.getLogger(__name__)
+
+RESEND_API_URL = os.getenv('RESEND_API_URL', 'https://api.resend.com').rstrip('/')
+EMAIL_BATCH_SIZE = int(os.getenv('EMAIL_BATCH_SIZE', 100))      # Resend batch limit
+EMAIL_CONCURRENCY = int(os.getenv('EMAIL_CONCURRENCY', 4))
+EMAIL_MAX_RETRIES = int(os.getenv('EMAIL_MAX_RETRIES', 5))
+EMAIL_RATE_LIMIT_WAIT = float(os.getenv('EMAIL_RATE_LIMIT_WAIT', 600))
+EMAIL_CONNECT_TIMEOUT = 5
+EMAIL_TIMEOUT = float(os.getenv('EMAIL_TIMEOUT', 30))
+BACKOFF_BASE = 0.5   # seconds; doubles per attempt, with jitter
+BACKOFF_MAX = 30.0
+
+RETRY_STATUSES = {500, 502, 503, 504}
+
+
+class DispatchResult:
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed_recipients = []
+
+    def as_dict(self):
+        return {'sent': self.sent, 'failed': self.failed, 'batches': self.batches,
+                'retries': self.retries}
+
+    def __repr__(self):
+        return f"DispatchResult({self.as_dict()})"
+
+
+def _retry_after(response):
+    """Seconds from a Retry-After header (delta-seconds form), else None."""
+    value = response.headers.get('Retry-After') if response is not None else None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class EmailDispatcher:
+    def __init__(self, api_key, base_url=RESEND_API_URL, batch_size=EMAIL_BATCH_SIZE,
+                 concurrency=EMAIL_CONCURRENCY, max_retries=EMAIL_MAX_RETRIES,
+                 rate_limit_wait=EMAIL_RATE_LIMIT_WAIT, timeout=EMAIL_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.batch_size = max(1, min(batch_size, 100))
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.rate_limit_wait = rate_limit_wait
+        self.timeout = (EMAIL_CONNECT_TIMEOUT, timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {api_key}',
+            'Content-Type': 'application/json',
+        })
+
+        self._pause_until = 0.0  # shared rate-limit pause (monotonic)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    # ---------- sending ----------
+
+    def _wait_for_rate_limit(self):
+        with self._lock:
+            delay = self._pause_until - time.monotonic()
+        if delay > 0:
+            # jitter, so paused workers do not all retry in the same instant
+            time.sleep(delay + random.uniform(0, 0.25))
+
+    def _pause(self, seconds):
+        with self._lock:
+            self._pause_until = max(self._pause_until, time.monotonic() + seconds)
+
+    def _backoff(self, attempt):
+        return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    def _post(self, path, payload):
+        """POST with retries. Returns (response or None, retries used)."""
+        url = self.base_url + path
+        headers = {'Idempotency-Key': uuid.uuid4().hex}
+        failures = 0
+        retries = 0
+        throttled_since = None
+        while True:
+            self._wait_for_rate_limit()
+            try:
+                response = self.session.post(url, json=payload, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                response = None
+                logger.warning("Resend request failed (attempt %s): %s", failures + 1, e)
+            else:
+                if response.status_code == 429:
+                    throttled_since = throttled_since or time.monotonic()
+                    if time.monotonic() - throttled_since > self.rate_limit_wait:
+                        return response, retries
+                    delay = _retry_after(response)
+                    self._pause(delay if delay is not None else self._backoff(0))
+                    retries += 1
+                    continue
+                if response.status_code not in RETRY_STATUSES:
+                    return response, retries
+                logger.warning("Resend %s on %s (attempt %s)", response.status_code, path, failures + 1)
+
+            if failures == self.max_retries:
+                return response, retries
+            time.sleep(self._backoff(failures))
+            failures += 1
+            retries += 1
+
+    def send_batch(self, messages):
+        """Send up to batch_size messages in one call. Returns (ok, retries)."""
+        if len(messages) == 1:
+            response, retries = self._post('/emails', messages[0])
+        else:
+            response, retries = self._post('/emails/batch', messages)
+        if response is not None and response.status_code in (200, 201, 202):
+            return True, retries
+        detail = response.text[:500] if response is not None else 'no response'
+        logger.error("Resend batch of %s failed: %s", len(messages), detail)
+        return False, retries
+
+    def dispatch(self, messages):
+        """
+        Send an iterable of Resend email payloads ({"from", "to", "subject", "html"}).
+        The iterable is consumed lazily, at most 2 * concurrency batches ahead.
+        """
+        result = DispatchResult()
+        iterator = iter(messages)
+        batches = iter(lambda: list(itertools.islice(iterator, self.batch_size)), [])
+
+        def collect(future, batch):
+            ok, retries = future.result()
+            result.batches += 1
+            result.retries += retries
+            if ok:
+                result.sent += len(batch)
+            else:
+                result.failed += len(batch)
+                result.failed_recipients.extend(to for m in batch for to in m.get('to', []))
+
+        with ThreadPoolExecutor(max_workers=self.concurrency,
+                                thread_name_prefix='email-dispatch') as executor:
+            pending = {}
+            for batch in batches:
+                if len(pending) >= 2 * self.concurrency:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(future, pending.pop(future))
+                pending[executor.submit(self.send_batch, batch)] = batch
+            for future in list(pending):
+                collect(future, pending.pop(future))
+
+        logger.info("Email dispatch finished: %s", result.as_dict(), extra=result.as_dict())
+        return result
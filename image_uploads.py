@@ -0,0 +1,213 @@
+"""
+Background image uploads for listings.
+
+Create handlers insert the listing row straight away with
+image_status = 'pending' and hand the image (bytes, or the spooled file
+from upload_stream.py) to a small worker pool.
+The worker uploads (with retries and backoff) the original plus resized
+WebP/JPEG variants, then updates the row with the final URL, the `images`
+object and image_status = 'ready', or marks it 'failed'.
+
+Files go through the storage backend (storage.py): Cloudinary, or the
+local uploads/ tree for self-hosted and test deployments.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import base64
+import logging
+import os
+import threading
+import time
+import uuid
+
+from psycopg2.extras import Json
+
+from db import get_db_connection
+from image_variants import generate_variants
+from metrics import observe_upload
+from response_cache import invalidate
+from storage import get_storage, detect_image_format
+
+logger = logging.getLogger(__name__)
+
+IMAGE_UPLOAD_WORKERS = int(os.getenv('IMAGE_UPLOAD_WORKERS', 4))
+IMAGE_UPLOAD_RETRIES = int(os.getenv('IMAGE_UPLOAD_RETRIES', 3))
+IMAGE_UPLOAD_BACKOFF = float(os.getenv('IMAGE_UPLOAD_BACKOFF', 1.0))  # seconds, doubled per retry
+IMAGE_VARIANTS = os.getenv('IMAGE_VARIANTS', 'true').lower() == 'true'  # thumb/medium/full, see image_variants.py
+
+# Table -> column that stores the final image URL. Only these tables can be
+# updated by the worker (the names are interpolated into SQL).
+IMAGE_COLUMNS = {
+    'wheat_listings': 'image_path',
+    'pesticides': 'image_url',
+    'machinery_rentals': 'image_url',
+}
+
+
+# ---------- request-side helpers ----------
+
+def decode_base64_image(image_file):
+    """Decode a base64 / data-URL image string. Raises ValueError if invalid or empty."""
+    image_data = image_file.strip()
+    if 'data:' in image_data and ',' in image_data:
+        image_data = image_data.split(',', 1)[1]
+
+    missing_padding = len(image_data) % 4
+    if missing_padding:
+        image_data += '=' * (4 - missing_padding)
+
+    image_bytes = base64.b64decode(image_data)
+    if len(image_bytes) == 0:
+        raise ValueError("Empty image data")
+    return image_bytes
+
+
+def make_public_id(prefix, user_id):
+    unique_id = str(uuid.uuid4())[:8]
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    return f"{prefix}_{user_id}_{timestamp}_{unique_id}"
+
+
+_executor = None
+_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=IMAGE_UPLOAD_WORKERS,
+                                               thread_name_prefix='image-upload')
+    return _executor
+
+
+# ---------- worker ----------
+
+def set_image_result(table, row_id, url, status, images=None):
+    column = IMAGE_COLUMNS[table]
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("Database connection failed")
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"""UPDATE {table}
+                SET {column} = COALESCE(%s, {column}), images = COALESCE(%s, images), image_status = %s
+                WHERE id = %s""",
+            (url, Json(images) if images else None, status, row_id)
+        )
+        conn.commit()
+        invalidate(table)  # feeds show image_url / images / image_status
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def upload_with_retries(image, folder, public_id, label, **options):
+    """One uploader call with retries and backoff. Returns the URL or None."""
+    storage = get_storage()
+    backend = type(storage).__name__
+    for attempt in range(1, IMAGE_UPLOAD_RETRIES + 1):
+        started = time.perf_counter()
+        try:
+            if not isinstance(image, bytes):
+                image.seek(0)
+            url = storage.put(image, folder, public_id, **options)
+            observe_upload(time.perf_counter() - started, backend, 'ok')
+            return url
+        except Exception as e:
+            observe_upload(time.perf_counter() - started, backend, 'error')
+            logger.warning("%s attempt %s failed: %s", label, attempt, e)
+            if attempt < IMAGE_UPLOAD_RETRIES:
+                time.sleep(IMAGE_UPLOAD_BACKOFF * 2 ** (attempt - 1))
+    return None
+
+
+def upload_variants(image, folder, public_id, label):
+    """Resize/re-encode (image_variants.py) and upload each variant. Returns the images object or None."""
+    if not isinstance(image, bytes):
+        image.seek(0)
+    images = {}
+    try:
+        for name, fmt, width, height, data in generate_variants(image):
+            url = upload_with_retries(data, folder, f"{public_id}_{name}_{fmt}",
+                                      f"{label} {name}.{fmt}", format=fmt)
+            if url is None:
+                return None
+            variant = images.setdefault(name, {'w': width, 'h': height})
+            variant[fmt] = url
+    except Exception as e:
+        # e.g. HEIC, which Pillow can't decode - the original is still there
+        logger.warning("%s variants skipped: %s", label, e)
+        return None
+    return images
+
+
+def upload_listing_image(table, row_id, image, folder, public_id, sniff_format=False, **options):
+    """
+    Upload the original and its resized variants, then record the result
+    on the listing row. `image` is bytes or a seekable file (closed when
+    done). Returns the original's URL or None.
+    """
+    label = f"{table}#{row_id}"
+    url = images = None
+    try:
+        if sniff_format:
+            options['format'] = detect_image_format(image)
+        url = upload_with_retries(image, folder, public_id, label, **options)
+        if url and IMAGE_VARIANTS:
+            images = upload_variants(image, folder, public_id, label)
+    finally:
+        if not isinstance(image, bytes):
+            image.close()
+
+    status = 'ready' if url else 'failed'
+    try:
+        set_image_result(table, row_id, url, status, images)
+        logger.info("%s %s%s%s", label, status, f" → {url}" if url else "",
+                    f" (+{len(images)} sizes)" if images else "")
+    except Exception as e:
+        logger.error("%s could not save result: %s", label, e)
+    return url
+
+
+def submit_listing_image(table, row_id, image, folder, public_id, sniff_format=False, **options):
+    """Queue the upload for an already-inserted listing row. Returns a Future."""
+    if table not in IMAGE_COLUMNS:
+        raise ValueError(f"Unknown image table: {table}")
+    return get_executor().submit(upload_listing_image, table, row_id, image, folder,
+                                 public_id, sniff_format, **options)
+
+
+# ---------- deletes ----------
+
+def listing_image_urls(table, row):
+    """Every stored file of a listing row: the original plus all variants."""
+    urls = []
+    if row.get(IMAGE_COLUMNS[table]):
+        urls.append(row[IMAGE_COLUMNS[table]])
+    for variant in (row.get('images') or {}).values():
+        urls.extend(url for key, url in variant.items() if key not in ('w', 'h'))
+    return urls
+
+
+def delete_images(urls):
+    """Remove files from storage (batched by the backend). Returns the count."""
+    try:
+        deleted = get_storage().delete(urls)
+        logger.info("Removed %s of %s file(s)", deleted, len(urls))
+        return deleted
+    except Exception as e:
+        logger.error("Delete failed: %s", e)
+        return 0
+
+
+def submit_image_delete(urls):
+    """Queue storage cleanup for a deleted listing. Returns a Future, or None if nothing to delete."""
+    if not urls:
+        return None
+    return get_executor().submit(delete_images, list(urls))
@@ -0,0 +1,213 @@
+"""
+Shared query builder for the public listing feeds (wheat, pesticide, machinery).
+
+Every feed gets the same query-string contract:
+- limit:  page size (default 50, max 200)
+- cursor: opaque keyset cursor returned by the previous page
+- sort:   one of the feed's named sorts (indexed columns only)
+- plus the feed's own filters, e.g. min_price=100&organic_certified=true
+
+Pages are fetched with keyset pagination - WHERE (sort_col, id) < (last
+value, last id) ORDER BY sort_col, id LIMIT n - so page 1000 costs the
+same index range scan as page 1.
+"""
+import base64
+import json
+from datetime import datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class FeedQueryError(ValueError):
+    """Invalid feed parameters; handlers turn this into a 400."""
+
+
+# ---------- value parsers ----------
+
+def parse_number(raw):
+    try:
+        return float(raw)
+    except (TypeError, ValueError):
+        raise FeedQueryError(f"Invalid number: {raw}")
+
+
+def parse_int(raw):
+    try:
+        return int(raw)
+    except (TypeError, ValueError):
+        raise FeedQueryError(f"Invalid integer: {raw}")
+
+
+def parse_bool(raw):
+    value = str(raw).strip().lower()
+    if value in ('1', 'true', 'yes'):
+        return True
+    if value in ('0', 'false', 'no'):
+        return False
+    raise FeedQueryError(f"Invalid boolean: {raw}")
+
+
+def parse_date(raw):
+    try:
+        return datetime.strptime(raw, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise FeedQueryError(f"Invalid date (use YYYY-MM-DD): {raw}")
+
+
+def parse_text(raw):
+    value = str(raw).strip()
+    if not value:
+        raise FeedQueryError("Empty filter value")
+    return value
+
+
+class Filter:
+    """A query-string filter: `condition` is SQL with one %s placeholder."""
+
+    def __init__(self, condition, parse):
+        self.condition = condition
+        self.parse = parse
+
+    def apply(self, raw):
+        return self.condition, self.parse(raw)
+
+
+class Sort:
+    """
+    An indexed sort column; `key` is the column's name in the result rows.
+    nullable: rows where the column is NULL are left out of this sort - a
+    NULL compares as unknown in the keyset (col, id) < (value, id), so it
+    can't be paged past.
+    """
+
+    def __init__(self, column, key, direction, cast, nullable=False):
+        self.column = column
+        self.key = key
+        self.direction = direction
+        self.cast = cast
+        self.nullable = nullable
+
+
+class FeedSpec:
+    """
+    Describes one feed: the SELECT ... FROM ... part (no WHERE), the id
+    column used as keyset tie-breaker, the named sorts and the filters.
+    """
+
+    def __init__(self, select, id_column, sorts, default_sort, filters, conditions=None):
+        self.select = select
+        self.id_column = id_column
+        self.sorts = sorts
+        self.default_sort = default_sort
+        self.filters = filters
+        self.conditions = conditions or []
+
+    def with_select(self, select):
+        """Same filters and sorts over a different column list."""
+        return FeedSpec(select, self.id_column, self.sorts, self.default_sort,
+                        self.filters, self.conditions)
+
+
+# Columns that exist for the database (indexes), not for clients
+HIDDEN_COLUMNS = ('search_vector', 'available_during')
+
+
+def public_row(row):
+    """dict(row) without HIDDEN_COLUMNS - for handlers that SELECT *."""
+    return {key: value for key, value in row.items() if key not in HIDDEN_COLUMNS}
+
+
+# ---------- cursors ----------
+
+def encode_cursor(sort_name, value, row_id):
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    elif value is not None and not isinstance(value, (int, float, str, list)):
+        value = str(value)  # Decimal
+    raw = json.dumps([sort_name, value, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_name, value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return sort_name, value, int(row_id)
+    except Exception:
+        raise FeedQueryError("Invalid cursor")
+
+
+# ---------- query building ----------
+
+def build_feed_query(spec, args, extra_conditions=()):
+    """
+    Turn request args into (sql, params, sort, limit). Raises FeedQueryError
+    on bad input. The query asks for limit + 1 rows so the caller can tell
+    whether there is a next page.
+
+    extra_conditions: (sql, params) pairs the handler computed from several
+    args at once (a Filter only sees its own arg).
+    """
+    sort_name = args.get('sort') or spec.default_sort
+    if sort_name not in spec.sorts:
+        raise FeedQueryError(f"Invalid sort. Use one of: {', '.join(sorted(spec.sorts))}")
+    sort = spec.sorts[sort_name]
+
+    limit = args.get('limit')
+    limit = parse_int(limit) if limit not in (None, '') else DEFAULT_PAGE_SIZE
+    if limit < 1:
+        raise FeedQueryError("limit must be positive")
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    conditions = list(spec.conditions)
+    params = []
+    for condition, values in extra_conditions:
+        conditions.append(condition)
+        params.extend(values)
+    for name, feed_filter in spec.filters.items():
+        raw = args.get(name)
+        if raw in (None, ''):
+            continue
+        condition, value = feed_filter.apply(raw)
+        conditions.append(condition)
+        params.append(value)
+
+    if sort.nullable:
+        conditions.append(f"{sort.column} IS NOT NULL")
+
+    cursor = args.get('cursor')
+    if cursor:
+        cursor_sort, value, last_id = decode_cursor(cursor)
+        if cursor_sort != sort_name:
+            raise FeedQueryError("Cursor does not match sort")
+        if value is None:
+            raise FeedQueryError("Invalid cursor")
+        op = '<' if sort.direction == 'DESC' else '>'
+        conditions.append(f"({sort.column}, {spec.id_column}) {op} (%s::{sort.cast}, %s)")
+        params.extend([value, last_id])
+
+    sql = spec.select
+    if conditions:
+        sql += "\nWHERE " + "\n  AND ".join(conditions)
+    sql += f"\nORDER BY {sort.column} {sort.direction}, {spec.id_column} {sort.direction}\nLIMIT %s"
+    params.append(limit + 1)
+    return sql, params, sort_name, limit
+
+
+def fetch_feed_page(cursor, spec, args, id_key='id', extra_conditions=()):
+    """
+    Run one page of a feed on an open cursor.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    sql, params, sort_name, limit = build_feed_query(spec, args, extra_conditions)
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort_name, last[spec.sorts[sort_name].key], last[id_key])
+    return rows, next_cursor
@@ -0,0 +1,135 @@
+"""
+Application logging.
+
+Modules log through `logging.getLogger(__name__)`. setup_logging() puts a
+QueueHandler on the root logger, so a request thread only appends the record
+to an in-memory queue; a QueueListener thread formats it and writes to stdout.
+
+Settings (env):
+- LOG_LEVEL:  root level, default INFO (production: WARNING)
+- LOG_LEVELS: per-module overrides, e.g. "chat=DEBUG,db=WARNING,werkzeug=ERROR"
+- LOG_FORMAT: json (default) or text
+
+Every record carries the request id: X-Request-ID from the client if sent,
+otherwise a short uuid4 made in before_request. It is also echoed back in the
+X-Request-ID response header.
+"""
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, has_request_context, request
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import uuid
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+_listener = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp record.request_id; runs in the calling thread, where flask.g is available."""
+
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id', '-') if has_request_context() else '-'
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra={...}` fields are included as-is."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        elif record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _QueueHandler(QueueHandler):
+    """
+    Like QueueHandler, but keeps the record's fields for the formatter:
+    only the message and traceback are rendered in the calling thread.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_levels(spec):
+    """'chat=DEBUG,db=WARNING' -> {'chat': 'DEBUG', 'db': 'WARNING'}"""
+    levels = {}
+    for item in spec.split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level=LOG_LEVEL, levels=LOG_LEVELS, fmt=LOG_FORMAT, stream=None):
+    """Install the queue handler on the root logger (once) and apply levels."""
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(level)
+    for name, module_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    if fmt == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(
+            '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'))
+
+    handler = _QueueHandler(queue.SimpleQueue())
+    handler.addFilter(RequestIdFilter())
+    root.handlers = [handler]
+
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def init_request_logging(app):
+    """Assign g.request_id per request and return it in X-Request-ID."""
+
+    @app.before_request
+    def assign_request_id():
+        incoming = request.headers.get(REQUEST_ID_HEADER, '')
+        g.request_id = incoming[:64] if incoming else uuid.uuid4().hex[:8]
+
+    @app.after_request
+    def echo_request_id(response):
+        response.headers[REQUEST_ID_HEADER] = g.get('request_id', '-')
+        return response
@@ -1,16 +1,19 @@
 """
 API routes for user login with JWT token generation and user details retrieval.
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 from werkzeug.security import check_password_hash
 from db import get_db_connection
+from auth import token_required
 from config import SECRET_KEY
 import jwt
 import datetime
+import logging
 from flask import current_app
 
 # Create a Blueprint for the login routes
 login_bp = Blueprint('login', __name__)
+logger = logging.getLogger(__name__)
 
 @login_bp.route('', methods=['POST'])
 def login():
@@ -86,6 +89,7 @@ def login():
         conn.close()
 
 @login_bp.route('/user_details', methods=['GET'])
+@token_required
 def get_user_details():
     """
     Retrieve user details (full_name, phone, email) based on JWT token.
@@ -100,29 +104,7 @@ def get_user_details():
     cursor = None
     
     try:
-        print("[USER DETAILS] Request received")
-        
-        # Check for Authorization header
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            print("[USER DETAILS] Error: Missing or invalid Authorization header")
-            return jsonify({'error': 'Missing or invalid Authorization header'}), 401
-
-        # Extract and verify JWT token
-        token = auth_header.split(' ')[1]
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            user_id = payload.get('user_id')
-            if not user_id:
-                print("[USER DETAILS] Error: Invalid token payload")
-                return jsonify({'error': 'Invalid token payload'}), 401
-            print(f"[USER DETAILS] Token verified for user_id: {user_id}")
-        except jwt.ExpiredSignatureError:
-            print("[USER DETAILS] Error: Token expired")
-            return jsonify({'error': 'Token expired'}), 401
-        except jwt.InvalidTokenError as e:
-            print(f"[USER DETAILS] Error: Invalid token - {str(e)}")
-            return jsonify({'error': 'Invalid token'}), 401
+        user_id = g.user_id
 
         # Connect to database
         conn = get_db_connection()
@@ -133,11 +115,11 @@ def get_user_details():
         user = cursor.fetchone()
         
         if not user:
-            print(f"[USER DETAILS] Error: User not found for user_id: {user_id}")
+            logger.info("User not found for user_id: %s", user_id)
             return jsonify({'error': 'User not found'}), 404
 
         user_name = user['full_name'] or 'User'
-        print(f"[USER DETAILS] Found user: {user_name} (ID: {user_id})")
+        logger.debug("Found user: %s (ID: %s)", user_name, user_id)
 
         return jsonify({
             'full_name': user_name,
@@ -146,14 +128,11 @@ def get_user_details():
         }), 200
 
     except Exception as e:
-        print(f"[USER DETAILS] Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("get_user_details failed: %s", e)
         return jsonify({'error': f'Failed to fetch user details: {str(e)}'}), 500
 
     finally:
         if cursor:
             cursor.close()
         if conn:
-            conn.close()
-        print("[USER DETAILS] Database connection closed")
\ No newline at end of file
+            conn.close()
\ No newline at end of file
@@ -1,48 +1,40 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
+import logging
 from db import get_db_connection
-from config import SECRET_KEY
-import base64
-import jwt
-import uuid
+from auth import token_required
 from datetime import datetime
-import cloudinary.uploader  # Cloudinary upload ke liye
+from image_uploads import make_public_id, submit_listing_image, submit_image_delete, listing_image_urls
+from response_cache import cached_response, invalidate
+from conditional_get import etag_feed, etag_row, USER_LIST_CACHE_CONTROL
+from upload_stream import read_listing_upload, close_upload, UploadError
+from listing_query import (FeedSpec, Sort, Filter, FeedQueryError, fetch_feed_page, public_row,
+                           parse_number, parse_int, parse_date)
 
 machinery_rental = Blueprint('machinery_rental', __name__)
-
-
-def verify_jwt_token(token):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-        return payload
-    except:
-        return None
+logger = logging.getLogger(__name__)
 
 
 @machinery_rental.route('/rent_machinery', methods=['POST'])
+@token_required
 def rent_machinery():
     conn = None
     cursor = None
     image_url = None
+    image = None
     try:
-        request_id = str(uuid.uuid4())[:8]
-        print(f"[MACHINERY] Starting rent_machinery request... Request ID: {request_id}")
-        
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            print("[MACHINERY] Error: Missing or invalid token")
-            return jsonify({'error': 'Missing or invalid token'}), 401
-        
-        token = auth_header.split(' ')[1]
-        payload = verify_jwt_token(token)
-        if not payload:
-            print("[MACHINERY] Error: Invalid or expired token")
-            return jsonify({'error': 'Invalid or expired token'}), 401
+        logger.debug("Starting rent_machinery request")
         
-        user_id = payload.get('user_id')
-        print(f"[MACHINERY] User ID: {user_id}")
+        user_id = g.user_id
+        logger.debug("User ID: %s", user_id)
 
-        data = request.get_json(force=True)
-        print(f"[MACHINERY] Received data keys: {list(data.keys())}")
+        # multipart/form-data or raw image body is streamed to a spooled
+        # temp file; JSON with a base64 `image` still works - see upload_stream.py
+        try:
+            data, image = read_listing_upload()
+        except UploadError as e:
+            logger.info("Invalid image: %s", e)
+            return jsonify({'error': str(e)}), e.status_code
+        logger.debug("Received data keys: %s", list(data.keys()))
 
         machinery_type_id = data.get('machinery_type_id')
         name = data.get('name')
@@ -51,10 +43,9 @@ def rent_machinery():
         min_days = data.get('min_days')
         start_date = data.get('start_date')
         end_date = data.get('end_date')
-        image_file = data.get('image')  # Base64 string from Flutter
 
         if not all([machinery_type_id, name, description, daily_rate, min_days, start_date, end_date]):
-            print("[MACHINERY] Error: Missing required fields")
+            logger.info("Missing required fields")
             return jsonify({'error': 'Missing required fields'}), 400
 
         try:
@@ -63,64 +54,18 @@ def rent_machinery():
             start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
             end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
         except Exception as e:
-            print(f"[MACHINERY] Error: Invalid data format - {str(e)}")
+            logger.info("Invalid data format - %s", e)
             return jsonify({'error': f'Invalid data format: {str(e)}'}), 400
 
         if start_date > end_date:
-            print("[MACHINERY] Error: End date must be after start date")
+            logger.info("End date must be after start date")
             return jsonify({'error': 'End date must be after start date'}), 400
 
-        # <<< Final Safe Cloudinary Upload
-        image_url = None
-        if image_file and isinstance(image_file, str):
-            try:
-                print("[MACHINERY] Processing base64 image for Cloudinary...")
-                
-                image_data = image_file.strip()
-                
-                # Remove data URL prefix if present
-                if 'data:' in image_data and ',' in image_data:
-                    image_data = image_data.split(',', 1)[1]
-                
-                # Fix base64 padding
-                missing_padding = len(image_data) % 4
-                if missing_padding:
-                    image_data += '=' * (4 - missing_padding)
-                
-                # Decode to bytes
-                image_bytes = base64.b64decode(image_data)
-                print(f"[MACHINERY] Decoded image bytes length: {len(image_bytes)}")
-                
-                if len(image_bytes) == 0:
-                    raise ValueError("Empty image data after decoding")
-
-                # Generate unique public_id
-                unique_id = str(uuid.uuid4())[:8]
-                timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-                public_id = f"machinery_{user_id}_{timestamp}_{unique_id}"
-
-                # Upload to Cloudinary directly from bytes
-                upload_result = cloudinary.uploader.upload(
-                    image_bytes,
-                    folder="agrox/machinery",
-                    public_id=public_id,
-                    overwrite=True,
-                    resource_type="image"  # Force as image
-                )
-                
-                image_url = upload_result['secure_url']
-                print(f"[MACHINERY] SUCCESS: Image uploaded to Cloudinary → {image_url}")
-
-            except base64.binascii.Error as e:
-                print(f"[MACHINERY] Base64 decode error: {str(e)}")
-                return jsonify({'error': 'Invalid base64 encoding in image'}), 400
-            except Exception as e:
-                print(f"[MACHINERY] Cloudinary upload failed: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                return jsonify({'error': f'Image upload failed: {str(e)}'}), 400
-        else:
-            print("[MACHINERY] No image provided or invalid type")
+        # Image is uploaded in the background after the row exists - see image_uploads.py
+        if image is None:
+            logger.debug("No image provided")
+
+        image_status = 'pending' if image is not None else None
 
         # Database Insert
         conn = get_db_connection()
@@ -128,83 +73,139 @@ def rent_machinery():
         
         sql = '''
             INSERT INTO machinery_rentals 
-            (user_id, machinery_type_id, name, description, daily_rate, min_days, start_date, end_date, image_url)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            (user_id, machinery_type_id, name, description, daily_rate, min_days, start_date, end_date,
+             image_url, image_status)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id
         '''
-        cursor.execute(sql, (user_id, machinery_type_id, name, description, daily_rate, min_days, start_date, end_date, image_url))
+        cursor.execute(sql, (user_id, machinery_type_id, name, description, daily_rate, min_days, start_date, end_date,
+                             image_url, image_status))
+        listing_id = cursor.fetchone()['id']
         conn.commit()
-        listing_id = cursor.lastrowid
-        print(f"[MACHINERY] Listing created with ID: {listing_id}")
+        invalidate('machinery_rentals')
+        logger.info("Listing created with ID: %s", listing_id)
+
+        if image is not None:
+            submit_listing_image(
+                'machinery_rentals', listing_id, image,
+                folder="agrox/machinery",
+                public_id=make_public_id('machinery', user_id),
+                overwrite=True,
+                resource_type="image"  # Force as image
+            )
+            image = None  # the upload worker closes it now
 
         response_data = {
             'message': 'Machinery listed successfully!',
             'listing_id': listing_id,
-            'image_url': image_url
+            'image_url': image_url,
+            'image_status': image_status
         }
         return jsonify(response_data), 201
             
     except Exception as e:
         if conn:
             conn.rollback()
-        print(f"[MACHINERY] CRITICAL ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("rent_machinery failed: %s", e)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
     finally:
+        close_upload(image)
         if cursor:
             cursor.close()
         if conn:
             conn.close()
 
 
+# Public feed: keyset pagination + filters (see listing_query.py).
+# machinery_rentals_display reuses the same sorts/filters with its own columns.
+MACHINERY_FEED = FeedSpec(
+    select="SELECT * FROM machinery_rentals mr",
+    id_column="mr.id",
+    sorts={
+        'newest': Sort("mr.created_at", 'created_at', 'DESC', 'timestamp'),
+        'oldest': Sort("mr.created_at", 'created_at', 'ASC', 'timestamp'),
+        'rate_asc': Sort("mr.daily_rate", 'daily_rate', 'ASC', 'numeric', nullable=True),
+        'rate_desc': Sort("mr.daily_rate", 'daily_rate', 'DESC', 'numeric', nullable=True),
+    },
+    default_sort='newest',
+    filters={
+        'min_rate': Filter("mr.daily_rate >= %s", parse_number),
+        'max_rate': Filter("mr.daily_rate <= %s", parse_number),
+        'machinery_type_id': Filter("mr.machinery_type_id = %s", parse_int),
+        # Listing window must cover the requested dates
+        'available_from': Filter("mr.start_date <= %s", parse_date),
+        'available_to': Filter("mr.end_date >= %s", parse_date),
+        'max_min_days': Filter("mr.min_days <= %s", parse_int),
+        'user_id': Filter("mr.user_id = %s", parse_int),
+    }
+)
+
+
 @machinery_rental.route('/rent_machinery', methods=['GET'])
+@cached_response('machinery_rentals')
+@etag_feed('machinery_rentals')
 def get_rent_machinery():
+    """
+    One page of machinery listings. Supports limit, cursor, sort and the
+    MACHINERY_FEED filters; the next page's cursor is sent in X-Next-Cursor.
+    """
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM machinery_rentals")
-        listings = cursor.fetchall()
+        try:
+            listings, next_cursor = fetch_feed_page(cursor, MACHINERY_FEED, request.args)
+        finally:
+            cursor.close()
+            conn.close()
         
-        formatted_listings = [dict(listing) for listing in listings]
+        formatted_listings = [public_row(listing) for listing in listings]
         
-        cursor.close()
-        conn.close()
-        return jsonify(formatted_listings), 200
+        response = jsonify(formatted_listings)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response, 200
+    except FeedQueryError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"[MACHINERY GET] Error: {str(e)}")
+        logger.exception("get_rent_machinery failed: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
 @machinery_rental.route('/rent_machinery/<int:listing_id>', methods=['GET'])
+@etag_row('machinery_rentals', 'listing_id')
 def get_rent_machinery_by_id(listing_id):
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM machinery_rentals WHERE id = %s", (listing_id,))
-    listing = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    try:
+        cursor.execute("SELECT * FROM machinery_rentals WHERE id = %s", (listing_id,))
+        listing = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
 
     if not listing:
         return jsonify({'error': 'Machinery rental not found'}), 404
 
-    return jsonify(dict(listing)), 200
+    return jsonify(public_row(listing)), 200
 
 
 @machinery_rental.route('/rent_machinery/user/<int:user_id>', methods=['GET'])
+@etag_feed('machinery_rentals', cache_control=USER_LIST_CACHE_CONTROL)
 def get_rent_machinery_by_user(user_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM machinery_rentals WHERE user_id = %s", (user_id,))
-        listings = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
+        try:
+            cursor.execute("SELECT * FROM machinery_rentals WHERE user_id = %s", (user_id,))
+            listings = cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
 
         if not listings:
             return jsonify({'message': 'No machinery listings found for this user'}), 404
 
-        return jsonify([dict(l) for l in listings]), 200
+        return jsonify([public_row(l) for l in listings]), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -215,17 +216,22 @@ def delete_machinery_rental(listing_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT image_url, images FROM machinery_rentals WHERE id = %s", (listing_id,))
+            listing = cursor.fetchone()
+            if not listing:
+                return jsonify({'error': 'Machinery rental listing not found'}), 404
+
+            cursor.execute("DELETE FROM machinery_rentals WHERE id = %s", (listing_id,))
+            conn.commit()
+        finally:
+            # close() rolls back anything left uncommitted
+            cursor.close()
+            conn.close()
+        invalidate('machinery_rentals')
 
-        cursor.execute("SELECT image_url FROM machinery_rentals WHERE id = %s", (listing_id,))
-        listing = cursor.fetchone()
-        if not listing:
-            return jsonify({'error': 'Machinery rental listing not found'}), 404
-
-        cursor.execute("DELETE FROM machinery_rentals WHERE id = %s", (listing_id,))
-        conn.commit()
-
-        cursor.close()
-        conn.close()
+        # Image + variants are removed from storage in the background
+        submit_image_delete(listing_image_urls('machinery_rentals', listing))
 
         return jsonify({'message': 'Machinery rental listing deleted successfully'}), 200
 
@@ -1,45 +1,117 @@
-from flask import Blueprint, jsonify
+from datetime import date
+from flask import Blueprint, request, jsonify
 from db import get_db_connection
 from config import BASE_URL
+from listing_query import FeedQueryError, fetch_feed_page, parse_date, parse_int
+from machinery_rentals import MACHINERY_FEED
+from response_cache import cached_response
+from conditional_get import etag_feed, etag_row
 
 machinery_display = Blueprint('machinery_display', __name__)
 
+AVAILABLE_FEED = MACHINERY_FEED.with_select("""
+    SELECT 
+        mr.id,
+        mr.user_id,
+        mr.machinery_type_id,
+        mr.name,
+        mr.description,
+        mr.daily_rate,
+        mr.min_days,
+        mr.start_date,
+        mr.end_date,
+        COALESCE(mr.image_url, mr.image_path) AS image_url,
+        mr.images,
+        mr.created_at
+    FROM machinery_rentals mr
+""")
+
+AVAILABILITY_ARGS = ('from', 'to', 'days')
+
+
+def availability_conditions(args, today):
+    """
+    (sql, params) conditions on mr.available_during (daterange, GiST index -
+    migration 0012) for the from / to / days args:
+
+    - from, to: the dates the renter could use the machine (YYYY-MM-DD,
+      inclusive). from defaults to today and can't be in the past; no `to`
+      means open-ended.
+    - days: how many consecutive days they need within that range; defaults
+      to the whole range (1 if open-ended). Must also satisfy the listing's
+      min_days.
+
+    Without any of them only listings whose window has already ended are
+    dropped. Raises FeedQueryError.
+    """
+    raw = {name: args.get(name) for name in AVAILABILITY_ARGS if args.get(name) not in (None, '')}
+    start = parse_date(raw['from']) if 'from' in raw else today
+    end = parse_date(raw['to']) if 'to' in raw else None
+    if start < today:
+        raise FeedQueryError("from can't be in the past")
+    if end is not None and end < start:
+        raise FeedQueryError("to must be on or after from")
+    window = "daterange(%s, %s, '[]')"
+    if not raw:
+        return [(f"mr.available_during && {window}", [today, None])]
+
+    span = (end - start).days + 1 if end is not None else None
+    days = parse_int(raw['days']) if 'days' in raw else (span or 1)
+    if days < 1:
+        raise FeedQueryError("days must be positive")
+    if span is not None and days > span:
+        raise FeedQueryError(f"days can't be more than the {span} days from `from` to `to`")
+
+    conditions = [("COALESCE(mr.min_days, 1) <= %s", [days])]
+    if days == span:
+        # The whole range: the listing's window must contain it
+        conditions.append((f"mr.available_during @> {window}", [start, end]))
+    else:
+        # Somewhere in the range: the overlap must be at least `days` long
+        # (canonical daterange is [lower, upper), so upper - lower = days)
+        conditions.append((f"mr.available_during && {window}", [start, end]))
+        conditions.append((f"upper(mr.available_during * {window}) - lower(mr.available_during * {window}) >= %s",
+                           [start, end, start, end, days]))
+    return conditions
+
+
 @machinery_display.route('/machinery/available', methods=['GET'])
+@cached_response('machinery_rentals')
+@etag_feed('machinery_rentals', per_day=True)
 def get_available_machinery():
     """
-    Get all available machinery rentals with complete details including images
+    Get available machinery rentals with complete details including images
     Returns properly formatted JSON with image URLs
+
+    Paginated: limit, cursor and sort plus the machinery filters
+    (min_rate, max_rate, machinery_type_id, available_from, available_to, ...).
+    Pass next_cursor back as ?cursor= for the following page.
+
+    Date-window search: from, to and days (see availability_conditions), e.g.
+    ?from=2025-11-01&to=2025-11-30&days=5 lists machinery that can be rented
+    for 5 days in November, cheapest first (sort defaults to rate_asc then).
+    Listings whose window has ended are never returned.
     """
     try:
+        conditions = availability_conditions(request.args, date.today())
+        args = request.args
+        if any(args.get(name) for name in AVAILABILITY_ARGS) and not args.get('sort'):
+            args = args.copy()
+            args['sort'] = 'rate_asc'
+
         conn = get_db_connection()
         cursor = conn.cursor()  # DictCursor already set in get_db_connection()
-        
-        cursor.execute("""
-            SELECT 
-                mr.id,
-                mr.user_id,
-                mr.machinery_type_id,
-                mr.name,
-                mr.description,
-                mr.daily_rate,
-                mr.min_days,
-                mr.start_date,
-                mr.end_date,
-                mr.image_path,
-                mr.created_at
-            FROM machinery_rentals mr
-            ORDER BY mr.created_at DESC
-        """)
-        
-        listings = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        try:
+            listings, next_cursor = fetch_feed_page(cursor, AVAILABLE_FEED, args, extra_conditions=conditions)
+        finally:
+            cursor.close()
+            conn.close()
         
         # Format the response with proper image URLs
         formatted_listings = []
         for listing in listings:
-            # image_path now contains the full Cloudinary URL (not a local path)
-            image_url = listing['image_path'] if listing.get('image_path') else None
+            # image_url is set by the upload worker; older listings only have image_path
+            image_url = listing['image_url'] or None
             
             formatted_listing = {
                 'id': listing['id'],
@@ -52,6 +124,7 @@ def get_available_machinery():
                 'start_date': str(listing['start_date']),
                 'end_date': str(listing['end_date']),
                 'image_url': image_url,
+                'images': listing['images'],
                 'created_at': str(listing.get('created_at', ''))
             }
             formatted_listings.append(formatted_listing)
@@ -59,9 +132,15 @@ def get_available_machinery():
         return jsonify({
             'success': True,
             'count': len(formatted_listings),
-            'machinery': formatted_listings
+            'machinery': formatted_listings,
+            'next_cursor': next_cursor
         }), 200
         
+    except FeedQueryError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -70,6 +149,7 @@ def get_available_machinery():
 
 
 @machinery_display.route('/machinery/details/<int:machinery_id>', methods=['GET'])
+@etag_row('machinery_rentals', 'machinery_id')
 def get_machinery_details(machinery_id):
     """
     Get detailed information for a specific machinery rental
@@ -77,27 +157,28 @@ def get_machinery_details(machinery_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()  # DictCursor already set in get_db_connection()
-        
-        cursor.execute("""
-            SELECT 
-                mr.id,
-                mr.user_id,
-                mr.machinery_type_id,
-                mr.name,
-                mr.description,
-                mr.daily_rate,
-                mr.min_days,
-                mr.start_date,
-                mr.end_date,
-                mr.image_path,
-                mr.created_at
-            FROM machinery_rentals mr
-            WHERE mr.id = %s
-        """, (machinery_id,))
-        
-        listing = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        try:
+            cursor.execute("""
+                SELECT 
+                    mr.id,
+                    mr.user_id,
+                    mr.machinery_type_id,
+                    mr.name,
+                    mr.description,
+                    mr.daily_rate,
+                    mr.min_days,
+                    mr.start_date,
+                    mr.end_date,
+                    COALESCE(mr.image_url, mr.image_path) AS image_url,
+                    mr.images,
+                    mr.created_at
+                FROM machinery_rentals mr
+                WHERE mr.id = %s
+            """, (machinery_id,))
+            listing = cursor.fetchone()
+        finally:
+            cursor.close()
+            conn.close()
         
         if not listing:
             return jsonify({
@@ -106,8 +187,8 @@ def get_machinery_details(machinery_id):
             }), 404
         
         # Format the response
-        # image_path now contains the full Cloudinary URL (not a local path)
-        image_url = listing['image_path'] if listing.get('image_path') else None
+        # image_url is set by the upload worker; older listings only have image_path
+        image_url = listing['image_url'] or None
         
         formatted_listing = {
             'id': listing['id'],
@@ -120,6 +201,7 @@ def get_machinery_details(machinery_id):
             'start_date': str(listing['start_date']),
             'end_date': str(listing['end_date']),
             'image_url': image_url,
+            'images': listing['images'],
             'created_at': str(listing.get('created_at', ''))
         }
         
@@ -0,0 +1,237 @@
+"""
+Request, DB and upload metrics in Prometheus text format on GET /metrics.
+
+init_metrics(app) (called from create_app) adds before/after_request
+hooks and registers db.py's query/checkout hooks. Per route (the URL rule,
+e.g. /chat/rooms/<int:room_id>/messages) it records:
+
+- http_request_duration_seconds      total latency
+- http_request_db_seconds            time inside cursor.execute
+- http_request_db_queries            queries per request  (N+1 shows up here)
+- http_request_db_checkouts          pool checkouts per request
+- http_request_json_seconds          JSON serialization time
+
+plus image_upload_seconds for the background uploader and db_pool_* from
+the pool stats. Numbers are per process: with several gunicorn workers,
+scrape each one or aggregate in Prometheus.
+
+Set METRICS_TOKEN to require "Authorization: Bearer <token>" on /metrics.
+"""
+from flask import Response, g, has_request_context, request
+import hmac
+import os
+import threading
+import time
+
+import db
+from json_provider import FastJSONProvider
+
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+UPLOAD_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (list(extra) if extra else [])
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for label_values, series in items:
+            for bound, count in zip(self.buckets, series):
+                le = _format_labels(self.labels, label_values, [('le', f'{bound:g}')])
+                lines.append(f"{self.name}_bucket{le} {count}")
+            inf = _format_labels(self.labels, label_values, [('le', '+Inf')])
+            lines.append(f"{self.name}_bucket{inf} {series[-1]}")
+            plain = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{plain} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{plain} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value:g}")
+        return lines
+
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Request latency',
+                             ('method', 'route', 'status'))
+REQUEST_DB_TIME = Histogram('http_request_db_seconds', 'Time spent executing SQL per request',
+                            ('method', 'route'))
+REQUEST_DB_QUERIES = Histogram('http_request_db_queries', 'SQL statements per request',
+                               ('method', 'route'), COUNT_BUCKETS)
+REQUEST_DB_CHECKOUTS = Histogram('http_request_db_checkouts', 'Pool connection checkouts per request',
+                                 ('method', 'route'), COUNT_BUCKETS)
+REQUEST_JSON_TIME = Histogram('http_request_json_seconds', 'JSON serialization time per request',
+                              ('method', 'route'))
+DB_QUERIES = Counter('db_queries_total', 'SQL statements, including background work')
+DB_QUERY_TIME = Counter('db_query_seconds_total', 'Time spent executing SQL, including background work')
+IMAGE_UPLOAD_TIME = Histogram('image_upload_seconds', 'Storage upload time per file',
+                              ('backend', 'outcome'), UPLOAD_BUCKETS)
+
+REGISTRY = [REQUEST_DURATION, REQUEST_DB_TIME, REQUEST_DB_QUERIES, REQUEST_DB_CHECKOUTS,
+            REQUEST_JSON_TIME, DB_QUERIES, DB_QUERY_TIME, IMAGE_UPLOAD_TIME]
+
+# db.ConnectionPool.stats() key -> (metric name, type)
+POOL_STATS = {
+    'size': ('db_pool_connections', 'gauge'),
+    'in_use': ('db_pool_connections_in_use', 'gauge'),
+    'idle': ('db_pool_connections_idle', 'gauge'),
+    'checkouts': ('db_pool_checkouts_total', 'counter'),
+    'waits': ('db_pool_waits_total', 'counter'),
+    'wait_time_total': ('db_pool_wait_seconds_total', 'counter'),
+    'timeouts': ('db_pool_timeouts_total', 'counter'),
+    'connections_opened': ('db_pool_connections_opened_total', 'counter'),
+    'connections_closed': ('db_pool_connections_closed_total', 'counter'),
+    'connect_errors': ('db_pool_connect_errors_total', 'counter'),
+}
+
+
+class RequestStats:
+    __slots__ = ('db_time', 'queries', 'checkouts', 'json_time')
+
+    def __init__(self):
+        self.db_time = 0.0
+        self.queries = 0
+        self.checkouts = 0
+        self.json_time = 0.0
+
+
+def current_stats():
+    """This request's RequestStats, or None outside a request (background threads)."""
+    if has_request_context():
+        return g.get('_request_stats')
+    return None
+
+
+# ---------- hooks ----------
+
+def record_query(duration, query, params):
+    DB_QUERIES.inc()
+    DB_QUERY_TIME.inc(amount=duration)
+    stats = current_stats()
+    if stats is not None:
+        stats.db_time += duration
+        stats.queries += 1
+
+
+def record_checkout(wait_time):
+    stats = current_stats()
+    if stats is not None:
+        stats.checkouts += 1
+
+
+def observe_upload(duration, backend, outcome):
+    IMAGE_UPLOAD_TIME.observe(duration, backend, outcome)
+
+
+class TimedJSONProvider(FastJSONProvider):
+    """The app's JSON provider, adding serialization time to the request's stats."""
+
+    def dumps_bytes(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps_bytes(obj, **kwargs)
+        finally:
+            stats = current_stats()
+            if stats is not None:
+                stats.json_time += time.perf_counter() - started
+
+
+# ---------- app wiring ----------
+
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    try:
+        pool_stats = db.get_pool_stats()
+    except Exception:
+        pool_stats = {}
+    for key, (name, kind) in POOL_STATS.items():
+        if key in pool_stats:
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {pool_stats[key]:g}")
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    if record_query not in db.QUERY_HOOKS:
+        db.QUERY_HOOKS.append(record_query)
+    if record_checkout not in db.CHECKOUT_HOOKS:
+        db.CHECKOUT_HOOKS.append(record_checkout)
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_request_stats():
+        g._request_started = time.perf_counter()
+        g._request_stats = RequestStats()
+
+    @app.after_request
+    def record_request_stats(response):
+        started = g.get('_request_started')
+        stats = g.get('_request_stats')
+        if started is None or stats is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        if route == '/metrics':
+            return response
+        method = request.method
+        REQUEST_DURATION.observe(time.perf_counter() - started, method, route, response.status_code)
+        REQUEST_DB_TIME.observe(stats.db_time, method, route)
+        REQUEST_DB_QUERIES.observe(stats.queries, method, route)
+        REQUEST_DB_CHECKOUTS.observe(stats.checkouts, method, route)
+        REQUEST_JSON_TIME.observe(stats.json_time, method, route)
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        if METRICS_TOKEN:
+            supplied = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(supplied, f'Bearer {METRICS_TOKEN}'):
+                return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
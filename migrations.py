@@ -0,0 +1,441 @@
+"""
+Schema migrations for the Supabase Postgres database.
+
+Run with:  python migrations.py
+           python migrations.py --backfill-crop-tasks   (re-copy legacy crop_reminders task columns)
+
+Migrations run once, in order, each inside its own transaction, and are
+recorded in the schema_migrations table. An entry is either a SQL string
+or a function taking a cursor (for data backfills).
+"""
+from db import get_db_connection
+from chat_unread import rebuild_counters
+from crop_schedules import LEGACY_TASKS
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def create_chat_unread_counters(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chat_unread_counters (
+            user_id INT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            room_id INT NOT NULL REFERENCES chat_rooms (id) ON DELETE CASCADE,
+            unread_count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, room_id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chat_unread_counters_room ON chat_unread_counters (room_id)")
+    rebuild_counters(cursor)
+
+
+def backfill_crop_tasks(cursor):
+    """
+    Copy the five legacy <task>_date/<task>_done pairs of crop_reminders into
+    crop_tasks. Idempotent: rows that already exist are left alone.
+    """
+    pairs = ", ".join(
+        f"('{task}', {position}, c.{task}_date, COALESCE(c.{task}_done, FALSE))"
+        for position, task in enumerate(LEGACY_TASKS)
+    )
+    cursor.execute(f"""
+        INSERT INTO crop_tasks (reminder_id, task, position, due_date, done)
+        SELECT c.id, t.task, t.position, t.due_date, t.done
+        FROM crop_reminders c
+        CROSS JOIN LATERAL (VALUES {pairs}) AS t (task, position, due_date, done)
+        WHERE t.due_date IS NOT NULL
+        ON CONFLICT (reminder_id, task) DO NOTHING
+    """)
+    return cursor.rowcount
+
+
+def create_crop_tasks(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS crop_tasks (
+            reminder_id INT NOT NULL REFERENCES crop_reminders (id) ON DELETE CASCADE,
+            task VARCHAR(50) NOT NULL,
+            position SMALLINT NOT NULL DEFAULT 0,
+            due_date DATE NOT NULL,
+            done BOOLEAN NOT NULL DEFAULT FALSE,
+            done_at TIMESTAMP,
+            PRIMARY KEY (reminder_id, task)
+        )
+    """)
+    # The daily job's whole predicate: one range scan over not-done tasks
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_crop_tasks_due ON crop_tasks (due_date) WHERE NOT done")
+    copied = backfill_crop_tasks(cursor)
+    logger.info("Backfilled %s crop task(s)", copied)
+    # Legacy columns are no longer written: give them defaults and drop the
+    # per-column partial indexes from 0008 (crop_tasks replaces them)
+    for task in LEGACY_TASKS:
+        cursor.execute(f"ALTER TABLE crop_reminders ALTER COLUMN {task}_date DROP NOT NULL")
+        cursor.execute(f"ALTER TABLE crop_reminders ALTER COLUMN {task}_done SET DEFAULT FALSE")
+    cursor.execute("""
+        DROP INDEX IF EXISTS idx_crop_reminders_land_prep_due;
+        DROP INDEX IF EXISTS idx_crop_reminders_seed_sowing_due;
+        DROP INDEX IF EXISTS idx_crop_reminders_first_irrigation_due;
+        DROP INDEX IF EXISTS idx_crop_reminders_second_irrigation_due;
+        DROP INDEX IF EXISTS idx_crop_reminders_urea_due;
+    """)
+
+
+def create_table_versions(cursor):
+    """
+    table_versions: a counter per listing table, bumped by a statement-level
+    trigger on every write. conditional_get.py turns it into feed ETags.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS table_versions (
+            table_name TEXT PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO table_versions (table_name, version, updated_at)
+            VALUES (TG_TABLE_NAME, 1, clock_timestamp())
+            ON CONFLICT (table_name) DO UPDATE
+            SET version = table_versions.version + 1, updated_at = clock_timestamp();
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+    """)
+    for table in ('wheat_listings', 'pesticides', 'machinery_rentals'):
+        cursor.execute(f"""
+            INSERT INTO table_versions (table_name) VALUES ('{table}') ON CONFLICT DO NOTHING;
+            DROP TRIGGER IF EXISTS {table}_version ON {table};
+            CREATE TRIGGER {table}_version
+                AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+                FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+        """)
+    # The pesticide feed shows the seller's name; other user updates (OTP etc.) don't matter
+    cursor.execute("""
+        INSERT INTO table_versions (table_name) VALUES ('users') ON CONFLICT DO NOTHING;
+        DROP TRIGGER IF EXISTS users_version ON users;
+        CREATE TRIGGER users_version
+            AFTER UPDATE OF full_name ON users
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+    """)
+
+
+def create_listing_search(cursor):
+    """
+    search_vector: a stored tsvector per listing (title/name weighted over
+    description) with a GIN index, for /search (search.py). 'simple' config:
+    no English stemming, so Roman-Urdu words are indexed as typed.
+    Trigram indexes on the title/name for the typo fallback, if pg_trgm exists.
+    """
+    documents = {
+        'wheat_listings': (('title', 'A'), ('wheat_variety', 'B'), ('description', 'C')),
+        'pesticides': (('name', 'A'), ('description', 'C')),
+        'machinery_rentals': (('name', 'A'), ('description', 'C')),
+    }
+    for table, columns in documents.items():
+        vector = " || ".join(
+            f"setweight(to_tsvector('simple', coalesce({column}, '')), '{weight}')" for column, weight in columns
+        )
+        cursor.execute(f"""
+            ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector
+                GENERATED ALWAYS AS ({vector}) STORED;
+            CREATE INDEX IF NOT EXISTS idx_{table}_search ON {table} USING gin (search_vector);
+        """)
+
+    cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    if cursor.fetchone() is None:
+        logger.warning("pg_trgm is not available: /search will run without the typo fallback")
+        return
+    cursor.execute("""
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS idx_wheat_listings_title_trgm ON wheat_listings USING gin (title gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_pesticides_name_trgm ON pesticides USING gin (name gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_machinery_rentals_name_trgm ON machinery_rentals USING gin (name gin_trgm_ops);
+    """)
+
+
+def create_machinery_availability(cursor):
+    """
+    available_during: the rental window as a daterange (both days included)
+    with a GiST index, for the date-window queries of /machinery/available.
+    NULL when a date is missing or the window is inverted, so such rows never
+    match instead of failing the insert. The built-in range GiST opclass is
+    enough: daily_rate ordering sorts the (few) matches, no btree_gist needed.
+    """
+    cursor.execute("""
+        ALTER TABLE machinery_rentals ADD COLUMN IF NOT EXISTS available_during daterange
+            GENERATED ALWAYS AS (
+                CASE WHEN start_date <= end_date THEN daterange(start_date, end_date, '[]') END
+            ) STORED;
+        CREATE INDEX IF NOT EXISTS idx_machinery_rentals_available
+            ON machinery_rentals USING gist (available_during);
+    """)
+
+
+def listing_created_at_not_null(cursor):
+    """
+    The feeds page on (created_at, id); a NULL created_at can't be placed in
+    that keyset. Backfill any NULLs with the table's oldest timestamp and
+    make the column NOT NULL.
+    """
+    for table in ('wheat_listings', 'pesticides', 'machinery_rentals'):
+        cursor.execute(f"""
+            UPDATE {table}
+            SET created_at = COALESCE((SELECT MIN(created_at) FROM {table}), NOW())
+            WHERE created_at IS NULL;
+            ALTER TABLE {table}
+                ALTER COLUMN created_at SET DEFAULT CURRENT_TIMESTAMP,
+                ALTER COLUMN created_at SET NOT NULL;
+        """)
+
+
+def create_search_terms(cursor):
+    """
+    search_terms: one row per word of a listing's search_vector with the
+    word's weight in that listing (A 1.0, B 0.4, C 0.2, D 0.1 per
+    occurrence - what ts_rank_cd gives a one-word query). Indexed by
+    (lexeme, listing_type, rank DESC, ...), so /search reads a one-word
+    query's best listings in rank order instead of ranking every match
+    (search.py).
+    Kept in sync by statement-level triggers on the listing tables.
+    """
+    listing_types = {'wheat_listings': 'wheat', 'pesticides': 'pesticide', 'machinery_rentals': 'machinery'}
+    term_rows = """
+        SELECT u.lexeme,
+               (SELECT COALESCE(SUM(CASE w WHEN 'A' THEN 1.0 WHEN 'B' THEN 0.4 WHEN 'C' THEN 0.2 ELSE 0.1 END), 0)
+                FROM unnest(u.weights) w),
+               {listing_type}, n.id
+        FROM {rows} n CROSS JOIN LATERAL unnest(n.search_vector) u
+    """
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS search_terms (
+            lexeme TEXT COLLATE "C" NOT NULL,
+            rank REAL NOT NULL,
+            listing_type VARCHAR(20) NOT NULL,
+            listing_id INT NOT NULL,
+            PRIMARY KEY (listing_type, listing_id, lexeme)
+        );
+        CREATE OR REPLACE FUNCTION sync_search_terms() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                DELETE FROM search_terms WHERE listing_type = TG_ARGV[0];
+            ELSIF TG_OP = 'DELETE' THEN
+                DELETE FROM search_terms s USING old_rows o
+                WHERE s.listing_type = TG_ARGV[0] AND s.listing_id = o.id;
+            ELSIF TG_OP = 'UPDATE' THEN
+                -- image_status / image_url updates leave search_vector alone
+                DELETE FROM search_terms s USING old_rows o JOIN new_rows n ON n.id = o.id
+                WHERE s.listing_type = TG_ARGV[0] AND s.listing_id = o.id
+                  AND n.search_vector IS DISTINCT FROM o.search_vector;
+                INSERT INTO search_terms (lexeme, rank, listing_type, listing_id)
+                {term_rows.format(listing_type='TG_ARGV[0]', rows='new_rows')}
+                JOIN old_rows o ON o.id = n.id
+                WHERE n.search_vector IS DISTINCT FROM o.search_vector;
+            ELSE
+                INSERT INTO search_terms (lexeme, rank, listing_type, listing_id)
+                {term_rows.format(listing_type='TG_ARGV[0]', rows='new_rows')};
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+    """)
+    for table, listing_type in listing_types.items():
+        cursor.execute(f"""
+            DROP TRIGGER IF EXISTS {table}_search_terms_insert ON {table};
+            DROP TRIGGER IF EXISTS {table}_search_terms_update ON {table};
+            DROP TRIGGER IF EXISTS {table}_search_terms_delete ON {table};
+            DROP TRIGGER IF EXISTS {table}_search_terms_truncate ON {table};
+            CREATE TRIGGER {table}_search_terms_insert
+                AFTER INSERT ON {table} REFERENCING NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION sync_search_terms('{listing_type}');
+            CREATE TRIGGER {table}_search_terms_update
+                AFTER UPDATE ON {table} REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION sync_search_terms('{listing_type}');
+            CREATE TRIGGER {table}_search_terms_delete
+                AFTER DELETE ON {table} REFERENCING OLD TABLE AS old_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION sync_search_terms('{listing_type}');
+            CREATE TRIGGER {table}_search_terms_truncate
+                AFTER TRUNCATE ON {table}
+                FOR EACH STATEMENT EXECUTE FUNCTION sync_search_terms('{listing_type}');
+            DELETE FROM search_terms WHERE listing_type = '{listing_type}';
+            INSERT INTO search_terms (lexeme, rank, listing_type, listing_id)
+            {term_rows.format(listing_type=f"'{listing_type}'", rows=table)};
+        """)
+    # Built after the backfill; index-only scans give a word's listings of a type best first
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_search_terms_rank
+            ON search_terms (lexeme, listing_type, rank DESC, listing_id DESC);
+    """)
+
+
+MIGRATIONS = [
+    ("0001_chat_inbox_indexes", """
+        CREATE INDEX IF NOT EXISTS idx_chat_rooms_buyer ON chat_rooms (buyer_id);
+        CREATE INDEX IF NOT EXISTS idx_chat_rooms_seller ON chat_rooms (seller_id);
+        CREATE INDEX IF NOT EXISTS idx_chat_messages_room_created
+            ON chat_messages (room_id, created_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_chat_messages_room_unread
+            ON chat_messages (room_id) WHERE is_read = FALSE;
+    """),
+    ("0002_chat_messages_keyset_index", """
+        CREATE INDEX IF NOT EXISTS idx_chat_messages_room_id_id
+            ON chat_messages (room_id, id);
+    """),
+    ("0003_chat_unread_counters", create_chat_unread_counters),
+    # Keyset indexes for the listing feeds' named sorts (see listing_query.py)
+    ("0004_listing_feed_indexes", """
+        CREATE INDEX IF NOT EXISTS idx_wheat_listings_created_id ON wheat_listings (created_at, id);
+        CREATE INDEX IF NOT EXISTS idx_wheat_listings_price_id ON wheat_listings (price_per_kg, id);
+        CREATE INDEX IF NOT EXISTS idx_wheat_listings_variety_created
+            ON wheat_listings (wheat_variety, created_at, id);
+        CREATE INDEX IF NOT EXISTS idx_wheat_listings_user ON wheat_listings (user_id);
+        CREATE INDEX IF NOT EXISTS idx_pesticides_created_id ON pesticides (created_at, id);
+        CREATE INDEX IF NOT EXISTS idx_pesticides_price_id ON pesticides (price, id);
+        CREATE INDEX IF NOT EXISTS idx_pesticides_user ON pesticides (user_id);
+        CREATE INDEX IF NOT EXISTS idx_machinery_rentals_created_id ON machinery_rentals (created_at, id);
+        CREATE INDEX IF NOT EXISTS idx_machinery_rentals_rate_id ON machinery_rentals (daily_rate, id);
+        CREATE INDEX IF NOT EXISTS idx_machinery_rentals_type_created
+            ON machinery_rentals (machinery_type_id, created_at, id);
+        CREATE INDEX IF NOT EXISTS idx_machinery_rentals_user ON machinery_rentals (user_id);
+    """),
+    # pending -> ready | failed while image_uploads.py works in the background
+    ("0005_listing_image_status", """
+        ALTER TABLE wheat_listings ADD COLUMN IF NOT EXISTS image_status VARCHAR(10);
+        ALTER TABLE pesticides ADD COLUMN IF NOT EXISTS image_status VARCHAR(10);
+        ALTER TABLE machinery_rentals ADD COLUMN IF NOT EXISTS image_status VARCHAR(10);
+    """),
+    # thumb/medium/full WebP+JPEG URLs written by the upload worker (image_variants.py)
+    ("0006_listing_image_variants", """
+        ALTER TABLE wheat_listings ADD COLUMN IF NOT EXISTS images JSONB;
+        ALTER TABLE pesticides ADD COLUMN IF NOT EXISTS images JSONB;
+        ALTER TABLE machinery_rentals ADD COLUMN IF NOT EXISTS images JSONB;
+    """),
+    # Daily reminder job queue + per-user sent state (reminder_jobs.py)
+    ("0007_reminder_jobs", """
+        CREATE TABLE IF NOT EXISTS reminder_job_runs (
+            id SERIAL PRIMARY KEY,
+            run_date DATE NOT NULL,
+            status VARCHAR(10) NOT NULL DEFAULT 'queued',
+            sent INT NOT NULL DEFAULT 0,
+            failed INT NOT NULL DEFAULT 0,
+            error TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            started_at TIMESTAMP,
+            heartbeat_at TIMESTAMP,
+            finished_at TIMESTAMP
+        );
+        -- at most one queued/running job per day
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_reminder_job_runs_active
+            ON reminder_job_runs (run_date) WHERE status IN ('queued', 'running');
+        CREATE TABLE IF NOT EXISTS reminder_deliveries (
+            run_date DATE NOT NULL,
+            user_id INT NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            status VARCHAR(10) NOT NULL,
+            job_id INT REFERENCES reminder_job_runs (id) ON DELETE SET NULL,
+            sent_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (run_date, user_id)
+        );
+    """),
+    # One partial index per OR arm of daily_reminder_job.PENDING_SCAN_SQL:
+    # only not-done tasks are indexed, so the scan is a BitmapOr of small indexes
+    ("0008_crop_reminder_due_indexes", """
+        CREATE INDEX IF NOT EXISTS idx_crop_reminders_land_prep_due
+            ON crop_reminders (land_preparation_date) WHERE land_preparation_done = FALSE;
+        CREATE INDEX IF NOT EXISTS idx_crop_reminders_seed_sowing_due
+            ON crop_reminders (seed_sowing_date) WHERE seed_sowing_done = FALSE;
+        CREATE INDEX IF NOT EXISTS idx_crop_reminders_first_irrigation_due
+            ON crop_reminders (first_irrigation_date) WHERE first_irrigation_done = FALSE;
+        CREATE INDEX IF NOT EXISTS idx_crop_reminders_second_irrigation_due
+            ON crop_reminders (second_irrigation_date) WHERE second_irrigation_done = FALSE;
+        CREATE INDEX IF NOT EXISTS idx_crop_reminders_urea_due
+            ON crop_reminders (urea_dose_date) WHERE urea_dose_done = FALSE;
+        CREATE INDEX IF NOT EXISTS idx_crop_reminders_user ON crop_reminders (user_id);
+    """),
+    # One row per task (crop_schedules.py templates) instead of five column pairs
+    ("0009_crop_tasks", create_crop_tasks),
+    # Per-table version counters for ETags (conditional_get.py)
+    ("0010_table_versions", create_table_versions),
+    # Full-text search columns + indexes (search.py)
+    ("0011_listing_search", create_listing_search),
+    ("0012_machinery_availability", create_machinery_availability),
+    ("0013_listing_created_at_not_null", listing_created_at_not_null),
+    # Per-word ranks in rank order for one-word /search queries (search.py)
+    ("0014_search_terms", create_search_terms),
+]
+
+# Session-level advisory lock so two deploys don't migrate at the same time
+MIGRATION_LOCK_ID = 804215
+
+
+def run_migrations(verbose=True):
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("Database connection failed")
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                name TEXT PRIMARY KEY,
+                applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+            )
+        """)
+        conn.commit()
+
+        cursor.execute("SELECT name FROM schema_migrations")
+        applied = {row['name'] for row in cursor.fetchall()}
+
+        ran = []
+        for name, migration in MIGRATIONS:
+            if name in applied:
+                continue
+            if verbose:
+                logger.info("Applying %s...", name)
+            try:
+                if callable(migration):
+                    migration(cursor)
+                else:
+                    cursor.execute(migration)
+                cursor.execute("INSERT INTO schema_migrations (name) VALUES (%s)", (name,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            ran.append(name)
+
+        if verbose:
+            logger.info("Done, %s migration(s) applied", len(ran))
+        return ran
+    finally:
+        try:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+            conn.commit()
+        except Exception:
+            pass
+        cursor.close()
+        conn.close()
+
+
+def run_backfill(backfill):
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("Database connection failed")
+    cursor = conn.cursor()
+    try:
+        count = backfill(cursor)
+        conn.commit()
+        logger.info("%s: %s row(s)", backfill.__name__, count)
+        return count
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    import sys
+    from logging_config import setup_logging
+    setup_logging()
+    run_migrations()
+    if '--backfill-crop-tasks' in sys.argv[1:]:
+        run_backfill(backfill_crop_tasks)
@@ -5,9 +5,11 @@ import hashlib
 from werkzeug.security import generate_password_hash
 from db import get_db_connection
 import requests
+import logging
 from config import RESEND_API_KEY, RESEND_FROM_EMAIL
 
 otp_bp = Blueprint('otp', __name__)
+logger = logging.getLogger(__name__)
 
 SECRET_KEY = "your-secure-secret-key"  # Replace with a strong, unique key
 
@@ -33,10 +35,10 @@ def send_otp_email(email, otp):
     }
     response = requests.post(url, json=payload, headers=headers)
     if response.status_code == 200:
-        print(f"OTP sent to {email}")
+        logger.info("OTP sent to %s", email)
         return True
     else:
-        print(f"Resend error: {response.text}")
+        logger.error("Resend error: %s", response.text)
         return False
 
 @otp_bp.route('/send_otp', methods=['POST'])
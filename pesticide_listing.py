@@ -1,54 +1,39 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
+import logging
 from db import get_db_connection
-from config import SECRET_KEY
-import os
-from datetime import datetime
-import base64
-from PIL import Image  # imghdr ki jagah Pillow se type detect
-import io
-import jwt
-import uuid
+from auth import token_required
 from config import BASE_URL  # Ye line add kar do
-import cloudinary.uploader  # Cloudinary upload
+from image_uploads import make_public_id, submit_listing_image, submit_image_delete, listing_image_urls
+from response_cache import cached_response, invalidate
+from conditional_get import etag_feed, USER_LIST_CACHE_CONTROL
+from upload_stream import read_listing_upload, close_upload, UploadError
+from listing_query import (FeedSpec, Sort, Filter, FeedQueryError, fetch_feed_page,
+                           parse_number, parse_int, parse_bool)
 
 pesticide_listing = Blueprint('pesticide_listing', __name__)
-
-# Local folder optional (Cloudinary use kar rahe hain)
-UPLOAD_FOLDER = 'uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-def verify_jwt_token(token):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-        return payload
-    except:
-        return None
+logger = logging.getLogger(__name__)
 
 @pesticide_listing.route('/add', methods=['POST'])
+@token_required
 def add_pesticide():
     conn = None
     cursor = None
     image_url = None
+    image = None
     try:
-        request_id = str(uuid.uuid4())[:8]
-        print(f"[PESTICIDE] Starting add_pesticide request... Request ID: {request_id}")
-        
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            print("[PESTICIDE] Error: Missing or invalid token")
-            return jsonify({'error': 'Missing or invalid token'}), 401
-        
-        token = auth_header.split(' ')[1]
-        payload = verify_jwt_token(token)
-        if not payload:
-            print("[PESTICIDE] Error: Invalid or expired token")
-            return jsonify({'error': 'Invalid or expired token'}), 401
+        logger.debug("Starting add_pesticide request")
         
-        user_id = payload.get('user_id')
-        print(f"[PESTICIDE] User ID: {user_id}")
-
-        data = request.get_json(force=True)
-        print(f"[PESTICIDE] Received data keys: {list(data.keys())}")
+        user_id = g.user_id
+        logger.debug("User ID: %s", user_id)
+
+        # multipart/form-data or raw image body is streamed to a spooled
+        # temp file; JSON with a base64 `image` still works - see upload_stream.py
+        try:
+            data, image = read_listing_upload()
+        except UploadError as e:
+            logger.info("Invalid image: %s", e)
+            return jsonify({'error': str(e)}), e.status_code
+        logger.debug("Received data keys: %s", list(data.keys()))
 
         name = data.get('name')
         price = data.get('price')
@@ -57,59 +42,15 @@ def add_pesticide():
         organic_certified = data.get('organic_certified', False)
         restricted_use = data.get('restricted_use', False)
         local_delivery_available = data.get('local_delivery_available', False)
-        image_file = data.get('image')  # Base64 string
 
         if not all([name, price, quantity, description]):
             return jsonify({'error': 'Missing required fields'}), 400
 
-        # Cloudinary Upload (imghdr ki jagah Pillow se format detect)
-        image_url = None
-        if image_file and isinstance(image_file, str):
-            try:
-                print("[PESTICIDE] Processing base64 image for Cloudinary...")
-                
-                image_data = image_file.strip()
-                if 'data:' in image_data and ',' in image_data:
-                    image_data = image_data.split(',', 1)[1]
-                
-                missing_padding = len(image_data) % 4
-                if missing_padding:
-                    image_data += '=' * (4 - missing_padding)
-                
-                image_bytes = base64.b64decode(image_data)
-                print(f"[PESTICIDE] Decoded bytes length: {len(image_bytes)}")
-                
-                if len(image_bytes) == 0:
-                    raise ValueError("Empty image data")
-
-                # Pillow se format detect
-                try:
-                    with Image.open(io.BytesIO(image_bytes)) as img:
-                        ext = img.format.lower() if img.format else 'jpeg'
-                except Exception:
-                    ext = 'jpeg'  # fallback
-
-                unique_id = str(uuid.uuid4())[:8]
-                timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-                public_id = f"pesticide_{user_id}_{timestamp}_{unique_id}"
-
-                upload_result = cloudinary.uploader.upload(
-                    image_bytes,
-                    folder="agrox/pesticide",
-                    public_id=public_id,
-                    format=ext
-                )
-                
-                image_url = upload_result['secure_url']
-                print(f"[PESTICIDE] SUCCESS: Uploaded to Cloudinary → {image_url}")
-
-            except Exception as e:
-                print(f"[PESTICIDE] Cloudinary upload failed: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                return jsonify({'error': f'Image upload failed: {str(e)}'}), 400
-        else:
-            print("[PESTICIDE] No image provided")
+        # Image is uploaded in the background after the row exists - see image_uploads.py
+        if image is None:
+            logger.debug("No image provided")
+
+        image_status = 'pending' if image is not None else None
 
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -117,65 +58,76 @@ def add_pesticide():
         sql = '''
             INSERT INTO pesticides 
             (user_id, name, price, quantity, description, organic_certified, 
-             restricted_use, local_delivery_available, image_url)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+             restricted_use, local_delivery_available, image_url, image_status)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id
         '''
         cursor.execute(sql, (user_id, name, price, quantity, description, organic_certified,
-                             restricted_use, local_delivery_available, image_url))
+                             restricted_use, local_delivery_available, image_url, image_status))
+        pesticide_id = cursor.fetchone()['id']
         conn.commit()
-        pesticide_id = cursor.lastrowid
-        print(f"[PESTICIDE] Listing created with ID: {pesticide_id}")
+        invalidate('pesticides')
+        logger.info("Listing created with ID: %s", pesticide_id)
+
+        if image is not None:
+            submit_listing_image(
+                'pesticides', pesticide_id, image,
+                folder="agrox/pesticide",
+                public_id=make_public_id('pesticide', user_id),
+                sniff_format=True
+            )
+            image = None  # the upload worker closes it now
 
         response_data = {
             'message': 'Pesticide listed successfully!',
             'pesticide_id': pesticide_id,
-            'image_url': image_url
+            'image_url': image_url,
+            'image_status': image_status
         }
         return jsonify(response_data), 201
             
     except Exception as e:
         if conn:
             conn.rollback()
-        print(f"[PESTICIDE] CRITICAL ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("add_pesticide failed: %s", e)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
     finally:
+        close_upload(image)
         if cursor:
             cursor.close()
         if conn:
             conn.close()
 
 @pesticide_listing.route('/user/<int:user_id>', methods=['GET'])
+@etag_feed('pesticides', cache_control=USER_LIST_CACHE_CONTROL)
 def get_pesticides_by_user(user_id):
     try:
-        print(f"[PESTICIDE GET] Fetching listings for user {user_id}...")
+        logger.debug("Fetching listings for user %s...", user_id)
         conn = get_db_connection()
         cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT user_id, id, name, price, quantity, description, 
-                   organic_certified, restricted_use, local_delivery_available,
-                   image_url, created_at
-            FROM pesticides
-            WHERE user_id = %s
-        """, (user_id,))
-
-        pesticides = cursor.fetchall()
+        try:
+            cursor.execute("""
+                SELECT user_id, id, name, price, quantity, description, 
+                       organic_certified, restricted_use, local_delivery_available,
+                       image_url, images, created_at
+                FROM pesticides
+                WHERE user_id = %s
+            """, (user_id,))
+            pesticides = cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
         
         formatted_pesticides = [dict(pesticide) for pesticide in pesticides]
 
-        cursor.close()
-        conn.close()
-
         if not formatted_pesticides:
             return jsonify({'message': 'No pesticides found for this user'}), 404
 
-        print(f"[PESTICIDE GET] Returning {len(formatted_pesticides)} listings for user {user_id}")
+        logger.debug("Returning %s listings for user %s", len(formatted_pesticides), user_id)
         return jsonify(formatted_pesticides), 200
 
     except Exception as e:
-        print(f"[PESTICIDE GET] Error: {str(e)}")
+        logger.exception("get_pesticides_by_user failed: %s", e)
         return jsonify({'error': str(e)}), 500
     
 
@@ -184,69 +136,94 @@ def delete_pesticide(pesticide_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-
-        # Check if pesticide exists
-        cursor.execute("SELECT * FROM pesticides WHERE id = %s", (pesticide_id,))
-        pesticide = cursor.fetchone()
-        if not pesticide:
+        try:
+            # Check if pesticide exists
+            cursor.execute("SELECT * FROM pesticides WHERE id = %s", (pesticide_id,))
+            pesticide = cursor.fetchone()
+            if not pesticide:
+                return jsonify({'error': 'Pesticide not found'}), 404
+
+            # Delete the pesticide
+            cursor.execute("DELETE FROM pesticides WHERE id = %s", (pesticide_id,))
+            conn.commit()
+        finally:
+            # close() rolls back anything left uncommitted
             cursor.close()
             conn.close()
-            return jsonify({'error': 'Pesticide not found'}), 404
-
-        # Delete associated image if exists
-        image_url = pesticide.get('image_url')
-        if image_url and os.path.exists(image_url):
-            try:
-                os.remove(image_url)
-                print(f"[PESTICIDE DELETE] Deleted image: {image_url}")
-            except Exception as e:
-                print(f"[PESTICIDE DELETE] Failed to delete image: {str(e)}")
-
-        # Delete the pesticide
-        cursor.execute("DELETE FROM pesticides WHERE id = %s", (pesticide_id,))
-        conn.commit()
+        invalidate('pesticides')
 
-        cursor.close()
-        conn.close()
+        # Image + variants are removed from storage in the background
+        submit_image_delete(listing_image_urls('pesticides', pesticide))
 
         return jsonify({'message': 'Pesticide deleted successfully'}), 200
 
     except Exception as e:
-        print(f"[PESTICIDE DELETE] Error: {str(e)}")
+        logger.exception("delete_pesticide failed: %s", e)
         return jsonify({'error': str(e)}), 500
+# Public feed: keyset pagination + filters (see listing_query.py)
+PESTICIDE_FEED = FeedSpec(
+    select="""
+        SELECT 
+            p.id,
+            p.user_id,
+            u.full_name as seller_name,
+            p.name,
+            p.price,
+            p.quantity,
+            p.description,
+            p.organic_certified,
+            p.restricted_use,
+            p.local_delivery_available,
+            p.image_url,
+            p.images,
+            p.created_at
+        FROM pesticides p
+        JOIN users u ON p.user_id = u.id
+    """,
+    id_column="p.id",
+    sorts={
+        'newest': Sort("p.created_at", 'created_at', 'DESC', 'timestamp'),
+        'oldest': Sort("p.created_at", 'created_at', 'ASC', 'timestamp'),
+        'price_asc': Sort("p.price", 'price', 'ASC', 'numeric', nullable=True),
+        'price_desc': Sort("p.price", 'price', 'DESC', 'numeric', nullable=True),
+    },
+    default_sort='newest',
+    filters={
+        'min_price': Filter("p.price >= %s", parse_number),
+        'max_price': Filter("p.price <= %s", parse_number),
+        'organic_certified': Filter("p.organic_certified = %s", parse_bool),
+        'restricted_use': Filter("p.restricted_use = %s", parse_bool),
+        'local_delivery_available': Filter("p.local_delivery_available = %s", parse_bool),
+        'user_id': Filter("p.user_id = %s", parse_int),
+    }
+)
+
 @pesticide_listing.route('/all', methods=['GET'])
+@cached_response('pesticides')
+@etag_feed('pesticides', 'users')  # seller_name comes from users
 def get_all_pesticides():
+    """
+    One page of pesticide listings, newest first by default. Supports limit,
+    cursor, sort and the PESTICIDE_FEED filters; the next page's cursor is
+    sent in X-Next-Cursor.
+    """
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT 
-                p.id,
-                p.user_id,
-                u.full_name as seller_name,
-                p.name,
-                p.price,
-                p.quantity,
-                p.description,
-                p.organic_certified,
-                p.restricted_use,
-                p.local_delivery_available,
-                p.image_url,
-                p.created_at
-            FROM pesticides p
-            JOIN users u ON p.user_id = u.id
-            ORDER BY p.created_at DESC
-        """)
-
-        pesticides = cursor.fetchall()
+        try:
+            pesticides, next_cursor = fetch_feed_page(cursor, PESTICIDE_FEED, request.args)
+        finally:
+            cursor.close()
+            conn.close()
 
         formatted = [dict(p) for p in pesticides]
 
-        cursor.close()
-        conn.close()
-
-        return jsonify(formatted), 200
+        response = jsonify(formatted)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response, 200
 
+    except FeedQueryError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -0,0 +1,89 @@
+"""
+Slow-query log and per-request query budget.
+
+Hooks into db.InstrumentedCursor (via db.QUERY_HOOKS), so every execute()
+is covered - chat.safe_db_operation and the raw cursors in the blueprints
+alike.
+
+- Statements slower than SLOW_QUERY_MS are logged at WARNING with the SQL
+  (whitespace collapsed) and the parameters redacted to their types.
+- With QUERY_COUNT_CHECK on (default: when the app runs in debug mode), a
+  request that issues more than QUERY_COUNT_WARN statements logs a warning -
+  the usual sign of an N+1 loop.
+"""
+from flask import request, has_request_context
+import logging
+import os
+import re
+
+import db
+from metrics import current_stats
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+QUERY_COUNT_WARN = int(os.getenv('QUERY_COUNT_WARN', 20))
+QUERY_COUNT_CHECK = os.getenv('QUERY_COUNT_CHECK')  # 'true'/'false'; unset = follow app.debug
+MAX_LOGGED_SQL = 2000
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def redact_param(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return f"<{type(value).__name__}[{len(value)}]>"
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact_params(params):
+    """Keep the shape (positional or named) but never the values."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: redact_param(value) for key, value in params.items()}
+    return [redact_param(value) for value in params]
+
+
+def normalize_sql(query):
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    elif not isinstance(query, str):
+        query = repr(query)  # psycopg2.sql.Composed
+    return _WHITESPACE.sub(' ', query).strip()[:MAX_LOGGED_SQL]
+
+
+def log_slow_query(duration, query, params):
+    duration_ms = duration * 1000
+    if duration_ms < SLOW_QUERY_MS:
+        return
+    extra = {
+        'duration_ms': round(duration_ms, 1),
+        'sql': normalize_sql(query),
+        'params': redact_params(params),
+    }
+    if has_request_context():
+        extra['route'] = request.url_rule.rule if request.url_rule else request.path
+    logger.warning("Slow query (%.1f ms): %s", duration_ms, extra['sql'][:200], extra=extra)
+
+
+def init_query_log(app):
+    if log_slow_query not in db.QUERY_HOOKS:
+        db.QUERY_HOOKS.append(log_slow_query)
+
+    @app.after_request
+    def warn_on_query_count(response):
+        # app.debug is read per request: app.run(debug=True) sets it after create_app()
+        check = app.debug if QUERY_COUNT_CHECK is None else QUERY_COUNT_CHECK.lower() == 'true'
+        if not check:
+            return response
+        stats = current_stats()
+        if stats is not None and stats.queries > QUERY_COUNT_WARN:
+            route = request.url_rule.rule if request.url_rule else request.path
+            logger.warning("%s %s issued %s queries (limit %s)", request.method, route,
+                           stats.queries, QUERY_COUNT_WARN,
+                           extra={'route': route, 'queries': stats.queries})
+        return response
@@ -0,0 +1,277 @@
+"""
+Background runner for the daily reminder job.
+
+GET /reminder/daily_job only enqueues a row in reminder_job_runs and returns
+its id (202); a worker claims it and runs daily_reminder_job in chunks,
+recording each user's result in reminder_deliveries. If the process dies
+halfway, the job's heartbeat goes stale, the next worker reclaims it and
+only the users without a 'sent' row for that day get an email.
+
+Workers:
+- in-process: start_worker() - a daemon thread, started by the route (or by
+  create_app when REMINDER_SCHEDULE_AT is set); REMINDER_IN_PROCESS=false
+  leaves the queue to a separate worker
+- standalone:  python reminder_jobs.py worker
+
+Both are safe to run several at once: claiming uses FOR UPDATE SKIP LOCKED
+and a day has at most one queued/running job.
+
+CLI:
+    python reminder_jobs.py run [--date YYYY-MM-DD]   enqueue and run now
+    python reminder_jobs.py enqueue [--date ...]
+    python reminder_jobs.py worker                     poll the queue (+ scheduler)
+    python reminder_jobs.py status JOB_ID
+
+REMINDER_SCHEDULE_AT="06:00" (server local time) makes workers enqueue the
+day's job themselves, so no external cron is needed.
+"""
+from datetime import date, datetime
+import argparse
+import json
+import logging
+import os
+import threading
+
+from db import get_db_connection
+from daily_reminder_job import send_daily_reminders
+
+logger = logging.getLogger(__name__)
+
+REMINDER_IN_PROCESS = os.getenv('REMINDER_IN_PROCESS', 'true').lower() == 'true'
+REMINDER_SCHEDULE_AT = os.getenv('REMINDER_SCHEDULE_AT')              # "HH:MM"; unset = no scheduler
+REMINDER_POLL_SECONDS = float(os.getenv('REMINDER_POLL_SECONDS', 30))
+REMINDER_STALE_SECONDS = int(os.getenv('REMINDER_STALE_SECONDS', 300))  # running job without heartbeat = dead
+REMINDER_HEARTBEAT_SECONDS = float(os.getenv('REMINDER_HEARTBEAT_SECONDS', REMINDER_STALE_SECONDS / 5))
+
+JOB_COLUMNS = "id, run_date, status, sent, failed, error, created_at, started_at, heartbeat_at, finished_at"
+
+
+def _job_dict(row):
+    job = dict(row)
+    for key, value in job.items():
+        if isinstance(value, (date, datetime)):
+            job[key] = value.isoformat()
+    return job
+
+
+def _execute(query, params=None, fetch=False):
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError("Database connection failed")
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        row = cursor.fetchone() if fetch else None
+        conn.commit()
+        return row
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# ---------- queue ----------
+
+def enqueue_job(run_date=None):
+    """Queue the job for run_date (default today). Returns (job, created)."""
+    run_date = run_date or date.today()
+    row = _execute(f"""
+        INSERT INTO reminder_job_runs (run_date) VALUES (%s)
+        ON CONFLICT (run_date) WHERE status IN ('queued', 'running') DO NOTHING
+        RETURNING {JOB_COLUMNS}
+    """, (run_date,), fetch=True)
+    if row is not None:
+        logger.info("Reminder job %s queued for %s", row['id'], run_date)
+        return _job_dict(row), True
+    # Already queued or running for that day
+    row = _execute(f"""
+        SELECT {JOB_COLUMNS} FROM reminder_job_runs
+        WHERE run_date = %s AND status IN ('queued', 'running')
+    """, (run_date,), fetch=True)
+    return _job_dict(row), False
+
+
+def get_job(job_id):
+    row = _execute(f"SELECT {JOB_COLUMNS} FROM reminder_job_runs WHERE id = %s", (job_id,), fetch=True)
+    return _job_dict(row) if row else None
+
+
+def claim_job():
+    """Take the oldest queued (or stale running) job. Returns (id, run_date) or None."""
+    row = _execute("""
+        UPDATE reminder_job_runs
+        SET status = 'running', started_at = COALESCE(started_at, NOW()), heartbeat_at = NOW()
+        WHERE id = (
+            SELECT id FROM reminder_job_runs
+            WHERE status = 'queued'
+               OR (status = 'running' AND heartbeat_at < NOW() - make_interval(secs => %s))
+            ORDER BY id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, run_date
+    """, (REMINDER_STALE_SECONDS,), fetch=True)
+    return (row['id'], row['run_date']) if row else None
+
+
+def _keep_alive(job_id, stop_event):
+    """
+    Heartbeat every REMINDER_HEARTBEAT_SECONDS while the job runs. One chunk
+    can take longer than REMINDER_STALE_SECONDS (a 429 waits up to
+    EMAIL_RATE_LIMIT_WAIT per batch), and a job that only heartbeats between
+    chunks would be reclaimed - and its users emailed twice - while still
+    running. This thread dies with the process, so a dead job still goes stale.
+    """
+    while not stop_event.wait(REMINDER_HEARTBEAT_SECONDS):
+        try:
+            _execute("""
+                UPDATE reminder_job_runs SET heartbeat_at = NOW()
+                WHERE id = %s AND status = 'running'
+            """, (job_id,))
+        except Exception as e:
+            logger.warning("Reminder job %s heartbeat failed: %s", job_id, e)
+
+
+def run_job(job_id, run_date):
+    """Run a claimed job to completion, heartbeating while it runs."""
+    logger.info("Reminder job %s running for %s", job_id, run_date)
+
+    def record_chunk(sent, failed):
+        _execute("""
+            UPDATE reminder_job_runs
+            SET sent = sent + %s, failed = failed + %s, heartbeat_at = NOW()
+            WHERE id = %s
+        """, (sent, failed, job_id))
+
+    stop_event = threading.Event()
+    keep_alive = threading.Thread(target=_keep_alive, args=(job_id, stop_event),
+                                  name=f'reminder-heartbeat-{job_id}', daemon=True)
+    keep_alive.start()
+    try:
+        send_daily_reminders(run_date, job_id=job_id, on_chunk=record_chunk)
+    except Exception as e:
+        logger.exception("Reminder job %s failed", job_id)
+        _execute("""
+            UPDATE reminder_job_runs SET status = 'failed', error = %s, finished_at = NOW()
+            WHERE id = %s
+        """, (str(e)[:1000], job_id))
+        return False
+    finally:
+        stop_event.set()
+        keep_alive.join()
+    _execute("UPDATE reminder_job_runs SET status = 'done', finished_at = NOW() WHERE id = %s", (job_id,))
+    logger.info("Reminder job %s done", job_id)
+    return True
+
+
+def run_pending():
+    """Run claimable jobs until the queue is empty. Returns how many ran."""
+    count = 0
+    while True:
+        claimed = claim_job()
+        if claimed is None:
+            return count
+        run_job(*claimed)
+        count += 1
+
+
+# ---------- worker / scheduler ----------
+
+def _parse_schedule(value):
+    if not value:
+        return None
+    hour, minute = value.split(':')
+    return int(hour), int(minute)
+
+
+class ReminderWorker(threading.Thread):
+    """Drains the queue when woken or every poll_seconds; enqueues daily at schedule_at."""
+
+    def __init__(self, schedule_at=REMINDER_SCHEDULE_AT, poll_seconds=REMINDER_POLL_SECONDS):
+        super().__init__(name='reminder-worker', daemon=True)
+        self.schedule = _parse_schedule(schedule_at)
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        # not _stop: that would shadow threading.Thread._stop(), used by join()/is_alive()
+        self._stop_event = threading.Event()
+        self._scheduled_for = None  # last day the scheduler enqueued
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+
+    def _maybe_schedule(self):
+        if self.schedule is None:
+            return
+        now = datetime.now()
+        if (now.hour, now.minute) >= self.schedule and self._scheduled_for != now.date():
+            self._scheduled_for = now.date()
+            enqueue_job(now.date())
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self._maybe_schedule()
+                run_pending()
+            except Exception as e:
+                logger.warning("Reminder worker error: %s", e)
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def start_worker(**options):
+    """Start (once per process) the in-process worker and wake it."""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = ReminderWorker(**options)
+            _worker.start()
+    _worker.wake()
+    return _worker
+
+
+# ---------- CLI ----------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Daily reminder job runner")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name in ('run', 'enqueue'):
+        command = sub.add_parser(name)
+        command.add_argument('--date', type=date.fromisoformat, default=None)
+    sub.add_parser('worker')
+    status = sub.add_parser('status')
+    status.add_argument('job_id', type=int)
+    args = parser.parse_args(argv)
+
+    if args.command == 'enqueue':
+        job, _ = enqueue_job(args.date)
+        print(json.dumps(job))
+    elif args.command == 'run':
+        job, _ = enqueue_job(args.date)
+        run_pending()
+        print(json.dumps(get_job(job['id'])))
+    elif args.command == 'status':
+        print(json.dumps(get_job(args.job_id)))
+    elif args.command == 'worker':
+        worker = ReminderWorker()
+        worker.start()
+        try:
+            while worker.is_alive():
+                worker.join(1)
+        except KeyboardInterrupt:
+            worker.stop()
+
+
+if __name__ == '__main__':
+    from logging_config import setup_logging
+    setup_logging()
+    main()
@@ -1,92 +1,158 @@
 # reminder_views.py - FINAL LIVE READY VERSION (lowercase columns)
 
-from flask import Blueprint, request, jsonify
-from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify, g
+from datetime import datetime
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+from psycopg2.extras import execute_values
 from db import get_db_connection
-import jwt
-from functools import wraps
-from config import SECRET_KEY
+from auth import token_required
+from crop_schedules import build_tasks, TASK_LABELS
+import logging
 
 reminder_bp = Blueprint("reminder", __name__, url_prefix="/reminder")
+logger = logging.getLogger(__name__)
 
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        auth_header = request.headers.get("Authorization")
-        if not auth_header or not auth_header.startswith("Bearer "):
-            return jsonify({"error": "Token missing or invalid format"}), 401
+BULK_MAX_ITEMS = 200  # per bulk request
 
-        try:
-            token = auth_header.split(" ")[1]
-            payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-            current_user_id = payload["user_id"]
-        except jwt.ExpiredSignatureError:
-            return jsonify({"error": "Token expired"}), 401
-        except Exception:
-            return jsonify({"error": "Invalid token"}), 401
 
-        return f(current_user_id, *args, **kwargs)
-    return decorated
+def parse_reminder(data):
+    """(crop_name, planting_date, field_name) from a request item; ValueError with the API message."""
+    if not isinstance(data, dict):
+        raise ValueError("Missing required fields")
+    crop_name = data.get("crop_name")
+    planting_date_str = data.get("planting_date")
+    field_name = data.get("field_name")
+
+    if not all([crop_name, planting_date_str, field_name]):
+        raise ValueError("Missing required fields")
+
+    try:
+        planting_date = datetime.strptime(planting_date_str, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise ValueError("Invalid date format. Use YYYY-MM-DD")
+    return crop_name, planting_date, field_name
+
+
+def insert_reminders(cursor, user_id, reminders):
+    """
+    Insert reminders [(crop_name, planting_date, field_name)] and their
+    template tasks: two statements however many reminders. Returns the ids,
+    in the order of reminders.
+    """
+    # RETURNING order is not guaranteed to follow VALUES: tasks are built
+    # from each returned row, and ids matched back to items by their values
+    rows = execute_values(cursor, """
+        INSERT INTO crop_reminders (user_id, crop_name, planting_date, field_name, created_at)
+        VALUES %s
+        RETURNING id, crop_name, planting_date, field_name
+    """, [(user_id, crop_name, planting_date, field_name)
+          for crop_name, planting_date, field_name in reminders],
+        template="(%s, %s, %s, %s, NOW())", page_size=len(reminders), fetch=True)
+
+    ids_by_item = defaultdict(list)
+    for row in sorted(rows, key=itemgetter("id"), reverse=True):
+        ids_by_item[(row["crop_name"], row["planting_date"], row["field_name"])].append(row["id"])
+    reminder_ids = [ids_by_item[tuple(item)].pop() for item in reminders]
+
+    # Task dates crop ke template se (crop_schedules.py)
+    tasks = [(row["id"], position, task, due_date)
+             for row in rows
+             for position, task, due_date in build_tasks(row["crop_name"], row["planting_date"])]
+    execute_values(cursor, """
+        INSERT INTO crop_tasks (reminder_id, position, task, due_date) VALUES %s
+    """, tasks, page_size=len(tasks))
+    return reminder_ids
+
+
+def mark_tasks(cursor, user_id, items):
+    """
+    Mark [(reminder_id, task)] done with one UPDATE ... FROM (VALUES ...);
+    the ownership check is part of the same statement. Returns the
+    (reminder_id, task) pairs that were updated.
+    """
+    rows = execute_values(cursor, """
+        UPDATE crop_tasks t
+        SET done = TRUE, done_at = COALESCE(t.done_at, NOW())
+        FROM (VALUES %s) AS v (reminder_id, task, user_id), crop_reminders r
+        WHERE t.reminder_id = v.reminder_id AND t.task = v.task
+          AND r.id = t.reminder_id AND r.user_id = v.user_id
+        RETURNING t.reminder_id, t.task
+    """, [(reminder_id, task, user_id) for reminder_id, task in items],
+        template="(%s::int, %s, %s::int)", page_size=len(items), fetch=True)
+    return {(row["reminder_id"], row["task"]) for row in rows}
+
+
+def bulk_items(data, key):
+    """The list under data[key], or an error response tuple."""
+    items = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return None, (jsonify({"error": f"'{key}' must be a non-empty list"}), 400)
+    if len(items) > BULK_MAX_ITEMS:
+        return None, (jsonify({"error": f"At most {BULK_MAX_ITEMS} items per request"}), 400)
+    return items, None
+
 
 # ADD CROP REMINDER
 @reminder_bp.route("/add", methods=["POST"])
 @token_required
-def add_crop_reminder(current_user_id):
+def add_crop_reminder():
+    current_user_id = g.user_id
     data = request.get_json()
     if not data:
         return jsonify({"error": "No data provided"}), 400
 
-    crop_name = data.get("crop_name")
-    planting_date_str = data.get("planting_date")
-    field_name = data.get("field_name")
+    try:
+        reminder = parse_reminder(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    if not all([crop_name, planting_date_str, field_name]):
-        return jsonify({"error": "Missing required fields"}), 400
+    conn = get_db_connection()
+    cursor = conn.cursor()
 
     try:
-        planting_date = datetime.strptime(planting_date_str, "%Y-%m-%d").date()
-    except ValueError:
-        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+        insert_reminders(cursor, current_user_id, [reminder])
+        conn.commit()
+        return jsonify({"message": "Crop reminder added successfully!"}), 201
+
+    except Exception as e:
+        conn.rollback()
+        logger.exception("add_crop_reminder failed: %s", e)
+        return jsonify({"error": "Failed to add reminder"}), 500
+    finally:
+        cursor.close()
+        conn.close()
 
-    land_preparation_date = planting_date
-    seed_sowing_date = planting_date + timedelta(days=14)
-    first_irrigation_date = planting_date + timedelta(days=20)
-    second_irrigation_date = planting_date + timedelta(days=28)
-    urea_dose_date = planting_date + timedelta(days=35)
+# ADD MANY CROP REMINDERS - {"reminders": [{crop_name, planting_date, field_name}, ...]}
+@reminder_bp.route("/add-bulk", methods=["POST"])
+@token_required
+def add_crop_reminders_bulk():
+    current_user_id = g.user_id
+    items, error = bulk_items(request.get_json(silent=True), "reminders")
+    if error:
+        return error
+
+    reminders = []
+    for index, item in enumerate(items):
+        try:
+            reminders.append(parse_reminder(item))
+        except ValueError as e:
+            return jsonify({"error": str(e), "index": index}), 400
 
     conn = get_db_connection()
     cursor = conn.cursor()
 
     try:
-        cursor.execute("""
-            INSERT INTO crop_reminders (
-                user_id, crop_name, planting_date, field_name,
-                land_preparation_date, seed_sowing_date,
-                first_irrigation_date, second_irrigation_date, urea_dose_date,
-                land_preparation_done, seed_sowing_done,
-                first_irrigation_done, second_irrigation_done, urea_dose_done,
-                created_at
-            ) VALUES (
-                %s, %s, %s, %s,
-                %s, %s,
-                %s, %s, %s,
-                FALSE, FALSE,
-                FALSE, FALSE, FALSE,
-                NOW()
-            )
-        """, (
-            current_user_id, crop_name, planting_date, field_name,
-            land_preparation_date, seed_sowing_date,
-            first_irrigation_date, second_irrigation_date, urea_dose_date
-        ))
-
+        reminder_ids = insert_reminders(cursor, current_user_id, reminders)
         conn.commit()
-        return jsonify({"message": "Crop reminder added successfully!"}), 201
+        return jsonify({"message": f"{len(reminder_ids)} crop reminders added successfully!",
+                        "ids": reminder_ids}), 201
 
     except Exception as e:
         conn.rollback()
-        print(f"[REMINDER ERROR] add_crop_reminder: {str(e)}")
-        return jsonify({"error": "Failed to add reminder"}), 500
+        logger.exception("add_crop_reminders_bulk failed: %s", e)
+        return jsonify({"error": "Failed to add reminders"}), 500
     finally:
         cursor.close()
         conn.close()
@@ -94,69 +160,46 @@ def add_crop_reminder(current_user_id):
 # GET MY CROPS
 @reminder_bp.route("/my_crops", methods=["GET"])
 @token_required
-def get_my_reminders(current_user_id):
+def get_my_reminders():
+    current_user_id = g.user_id
     conn = get_db_connection()
     cursor = conn.cursor()
 
     try:
         cursor.execute("""
-            SELECT 
-                id, crop_name, field_name, planting_date,
-                land_preparation_date, seed_sowing_date,
-                first_irrigation_date, second_irrigation_date, urea_dose_date,
-                land_preparation_done, seed_sowing_done,
-                first_irrigation_done, second_irrigation_done, urea_dose_done
-            FROM crop_reminders 
-            WHERE user_id = %s
-            ORDER BY id DESC
+            SELECT
+                r.id, r.crop_name, r.field_name, r.planting_date,
+                t.task, t.due_date, t.done
+            FROM crop_reminders r
+            LEFT JOIN crop_tasks t ON t.reminder_id = r.id
+            WHERE r.user_id = %s
+            ORDER BY r.id DESC, t.position
         """, (current_user_id,))
 
-        rows = cursor.fetchall()
         reminders = []
-
-        for row in rows:
-            all_tasks_done = (
-                row["land_preparation_done"] and 
-                row["seed_sowing_done"] and 
-                row["first_irrigation_done"] and 
-                row["second_irrigation_done"] and 
-                row["urea_dose_done"]
-            )
-            crop_status = "completed" if all_tasks_done else "pending"
-            
-            reminders.append({
-                "id": row["id"],
-                "crop_name": row["crop_name"],
-                "field_name": row["field_name"],
-                "planting_date": row["planting_date"].strftime("%Y-%m-%d"),
-                "crop_status": crop_status,
-
-                "land_preparation": {                                
-                    "date": row["land_preparation_date"].strftime("%Y-%m-%d") if row["land_preparation_date"] else None,
-                    "done": bool(row["land_preparation_done"])
-                },
-                "seed_sowing": {
-                    "date": row["seed_sowing_date"].strftime("%Y-%m-%d") if row["seed_sowing_date"] else None,
-                    "done": bool(row["seed_sowing_done"])
-                },
-                "first_irrigation": {
-                    "date": row["first_irrigation_date"].strftime("%Y-%m-%d") if row["first_irrigation_date"] else None,
-                    "done": bool(row["first_irrigation_done"])
-                },
-                "second_irrigation": {
-                    "date": row["second_irrigation_date"].strftime("%Y-%m-%d") if row["second_irrigation_date"] else None,
-                    "done": bool(row["second_irrigation_done"])
-                },
-                "urea_dose": {
-                    "date": row["urea_dose_date"].strftime("%Y-%m-%d") if row["urea_dose_date"] else None,
-                    "done": bool(row["urea_dose_done"])
+        for reminder_id, rows in groupby(cursor.fetchall(), key=itemgetter("id")):
+            rows = list(rows)
+            first = rows[0]
+            reminder = {
+                "id": reminder_id,
+                "crop_name": first["crop_name"],
+                "field_name": first["field_name"],
+                "planting_date": first["planting_date"].strftime("%Y-%m-%d"),
+            }
+            tasks = [row for row in rows if row["task"] is not None]
+            # A reminder with no tasks has nothing done yet - all([]) would say "completed"
+            reminder["crop_status"] = "completed" if tasks and all(row["done"] for row in tasks) else "pending"
+            for row in tasks:
+                reminder[row["task"]] = {
+                    "date": row["due_date"].strftime("%Y-%m-%d"),
+                    "done": bool(row["done"])
                 }
-            })
+            reminders.append(reminder)
 
         return jsonify({"reminders": reminders}), 200
 
     except Exception as e:
-        print(f"[REMINDER ERROR] get_my_reminders: {str(e)}")
+        logger.exception("get_my_reminders failed: %s", e)
         return jsonify({"error": f"Failed to fetch reminders: {str(e)}"}), 500
     finally:
         cursor.close()
@@ -165,7 +208,8 @@ def get_my_reminders(current_user_id):
 # MARK TASK DONE
 @reminder_bp.route("/mark-task-done", methods=["POST"])
 @token_required
-def mark_task_done(current_user_id):
+def mark_task_done():
+    current_user_id = g.user_id
     data = request.get_json()
     if not data:
         return jsonify({"error": "No data provided"}), 400
@@ -176,37 +220,75 @@ def mark_task_done(current_user_id):
     if not reminder_id or not task_type:
         return jsonify({"error": "Missing reminder_id or task_type"}), 400
 
-    valid_tasks = ["land_preparation", "seed_sowing", "first_irrigation", "second_irrigation", "urea_dose"]
-    if task_type not in valid_tasks:
+    if task_type not in TASK_LABELS:
         return jsonify({"error": "Invalid task_type"}), 400
 
     conn = get_db_connection()
     cursor = conn.cursor()
 
     try:
-        cursor.execute("SELECT user_id FROM crop_reminders WHERE id = %s", (reminder_id,))
-        row = cursor.fetchone()
-        if not row or row["user_id"] != current_user_id:
+        # Ownership check and the update in one statement (PK lookup on crop_tasks)
+        if not mark_tasks(cursor, current_user_id, [(reminder_id, task_type)]):
+            conn.rollback()
             return jsonify({"error": "Not authorized or reminder not found"}), 404
-
-        column_map = {
-            "land_preparation": "land_preparation_done",
-            "seed_sowing": "seed_sowing_done",
-            "first_irrigation": "first_irrigation_done",
-            "second_irrigation": "second_irrigation_done",
-            "urea_dose": "urea_dose_done"
-        }
-        column = column_map[task_type]
-
-        cursor.execute(f"UPDATE crop_reminders SET {column} = TRUE WHERE id = %s", (reminder_id,))
         conn.commit()
 
         return jsonify({"success": True, "message": f"{task_type.replace('_', ' ').title()} marked as done!"}), 200
 
     except Exception as e:
         conn.rollback()
-        print(f"[REMINDER ERROR] mark_task_done: {str(e)}")
+        logger.exception("mark_task_done failed: %s", e)
         return jsonify({"error": "Failed to mark task"}), 500
     finally:
         cursor.close()
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+# MARK MANY TASKS DONE - {"tasks": [{"reminder_id": 1, "task_type": "seed_sowing"}, ...]}
+# All or nothing: if any task is missing or not the caller's, nothing is marked.
+@reminder_bp.route("/mark-tasks-done", methods=["POST"])
+@token_required
+def mark_tasks_done_bulk():
+    current_user_id = g.user_id
+    items, error = bulk_items(request.get_json(silent=True), "tasks")
+    if error:
+        return error
+
+    requested = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            return jsonify({"error": "Missing reminder_id or task_type", "index": index}), 400
+        task_type = item.get("task_type")
+        try:
+            reminder_id = int(item.get("reminder_id"))
+        except (TypeError, ValueError):
+            reminder_id = None
+        if not reminder_id or not task_type:
+            return jsonify({"error": "Missing reminder_id or task_type", "index": index}), 400
+        if task_type not in TASK_LABELS:
+            return jsonify({"error": "Invalid task_type", "index": index}), 400
+        requested.append((reminder_id, task_type))
+    requested = list(dict.fromkeys(requested))  # duplicates would match the same row
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        updated = mark_tasks(cursor, current_user_id, requested)
+        missing = [pair for pair in requested if pair not in updated]
+        if missing:
+            conn.rollback()
+            return jsonify({
+                "error": "Not authorized or reminder not found",
+                "not_found": [{"reminder_id": r, "task_type": t} for r, t in missing]
+            }), 404
+        conn.commit()
+        return jsonify({"success": True, "updated": len(updated),
+                        "message": f"{len(updated)} tasks marked as done!"}), 200
+
+    except Exception as e:
+        conn.rollback()
+        logger.exception("mark_tasks_done_bulk failed: %s", e)
+        return jsonify({"error": "Failed to mark tasks"}), 500
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,269 @@
+"""
+Response cache for the public listing feeds.
+
+    @cached_response('wheat_listings')
+    def get_wheat_listings(): ...
+
+caches the finished response (body bytes, status, headers) under
+namespace + path + normalized query string, so a hit skips Postgres and
+JSON serialization. X-Cache: HIT | MISS | COALESCED says which one happened.
+
+- Bounded: RESPONSE_CACHE_SIZE entries / RESPONSE_CACHE_MAX_BYTES, LRU eviction
+- TTL: RESPONSE_CACHE_TTL seconds (default 30)
+- Stampede protection: concurrent misses on one key wait for the first
+  request's result instead of all running the same query
+- invalidate(namespace) after a write drops every cached page of that
+  namespace (a generation bump, O(1)); namespaces are the table names
+- ETag / Last-Modified / Cache-Control from conditional_get.py are stored
+  with the entry, so a hit answers a matching If-None-Match with 304
+- Entries hold their gzip/brotli bodies (compression.py), compressed once on
+  the miss; hits pick one per Accept-Encoding
+
+The backend is pluggable (set_backend): MemoryBackend is per process, so
+with several gunicorn workers another worker can serve a page up to TTL
+seconds old after a write. A shared backend (Redis etc.) implements the
+same get/set/generation/bump methods. RESPONSE_CACHE_BACKEND=none disables
+caching.
+"""
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, current_app, request
+from urllib.parse import urlencode
+import os
+import threading
+import time
+
+from compression import compressed_variants, is_compressible, mark_encoded, negotiate
+
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')   # memory | none
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 1000))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 30))
+COALESCE_TIMEOUT = 10.0  # seconds a waiting request gives the leader before querying itself
+
+# Response headers worth replaying on a hit (X-Request-ID etc. are per request)
+CACHED_HEADERS = ('Content-Type', 'X-Next-Cursor', 'ETag', 'Last-Modified', 'Cache-Control')
+
+
+class CachedResponse:
+    __slots__ = ('body', 'status', 'headers', 'variants')
+
+    def __init__(self, body, status, headers, variants=None):
+        self.body = body
+        self.status = status
+        self.headers = headers
+        self.variants = variants  # {encoding: compressed body}, None if too small
+
+    def size(self):
+        return len(self.body) + sum(map(len, (self.variants or {}).values())) + 64
+
+    def to_response(self, cache_status):
+        encoding = negotiate() if self.variants else None
+        response = Response(self.variants[encoding] if encoding else self.body, status=self.status)
+        for name, value in self.headers:
+            response.headers[name] = value
+        if self.variants:
+            response.vary.add('Accept-Encoding')
+        if encoding:
+            mark_encoded(response, encoding)
+        response.headers['X-Cache'] = cache_status
+        # a replayed ETag (conditional_get.py) still answers If-None-Match with 304
+        return response.make_conditional(request)
+
+
+# ---------- backends ----------
+
+class CacheBackend:
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError
+
+    def generation(self, namespace):
+        """Current generation of a namespace (part of every key in it)."""
+        raise NotImplementedError
+
+    def bump(self, namespace):
+        """Invalidate a namespace by moving it to a new generation."""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryBackend(CacheBackend):
+    """Thread-safe in-process LRU with per-entry expiry and a byte budget."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (value, expires_at)
+        self._generations = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl):
+        size = value.size()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        value, _ = self._entries.pop(key)
+        self._bytes -= value.size()
+
+    def generation(self, namespace):
+        with self._lock:
+            return self._generations.get(namespace, 0)
+
+    def bump(self, namespace):
+        # Old-generation keys are never read again; LRU/TTL evicts them
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_UNSET = object()
+_backend = _UNSET
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is _UNSET:
+        with _backend_lock:
+            if _backend is _UNSET:
+                _backend = MemoryBackend() if RESPONSE_CACHE_BACKEND == 'memory' else None
+    return _backend
+
+
+def set_backend(backend):
+    """Swap the backend (tests / benchmarks / a shared cache); None disables caching."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+    return backend
+
+
+# ---------- single flight ----------
+
+class _Flight:
+    __slots__ = ('done', 'value')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _single_flight(key, compute):
+    """
+    Run compute() once per key at a time; concurrent callers get the same
+    result. Returns (value, leader).
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+    if not leader:
+        # Only a cacheable result is shared; an error response belongs to its request
+        if flight.done.wait(COALESCE_TIMEOUT) and isinstance(flight.value, CachedResponse):
+            return flight.value, False
+        return compute(), False  # leader too slow or failed: do it ourselves
+    try:
+        flight.value = compute()
+        return flight.value, True
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+
+# ---------- public API ----------
+
+def normalized_query():
+    """The request's query string with params sorted, so their order does not matter."""
+    return urlencode(sorted((name, value) for name, values in request.args.lists() for value in values))
+
+
+def cache_key(namespace, generation):
+    return f"{namespace}:{generation}:{request.path}?{normalized_query()}"
+
+
+def invalidate(*namespaces):
+    """Drop every cached page of the given namespaces (call after commit)."""
+    backend = get_backend()
+    if backend is None:
+        return
+    for namespace in namespaces:
+        backend.bump(namespace)
+
+
+def cached_response(namespace, ttl=None):
+    """Cache a GET view's 200 responses under `namespace` (see module docstring)."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            backend = get_backend()
+            if backend is None:
+                return view(*args, **kwargs)
+            key = cache_key(namespace, backend.generation(namespace))
+            cached = backend.get(key)
+            if cached is not None:
+                return cached.to_response('HIT')
+
+            def compute():
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                body = response.get_data()
+                # compressed once here, not on every hit
+                variants = compressed_variants(body) if is_compressible(response.mimetype, len(body)) else None
+                entry = CachedResponse(
+                    body, response.status_code,
+                    [(name, response.headers[name]) for name in CACHED_HEADERS if name in response.headers],
+                    variants)
+                backend.set(key, entry, RESPONSE_CACHE_TTL if ttl is None else ttl)
+                return entry
+
+            result, leader = _single_flight(key, compute)
+            if isinstance(result, CachedResponse):
+                return result.to_response('MISS' if leader else 'COALESCED')
+            return result
+        return wrapper
+    return decorator
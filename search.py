@@ -0,0 +1,273 @@
+"""
+Listing search across wheat, pesticides and machinery.
+
+    GET /search?q=gandum seed&type=wheat,machinery&limit=20&cursor=...
+
+- Full text: every word of q must match (words of 3+ characters as a
+  prefix, so "tract" finds "tractors") against the listing's search_vector
+  (migration 0011: title/name weighted A, wheat variety B, description C;
+  GIN index). Ranked with ts_rank_cd, best first.
+- One-word queries are answered from search_terms (migration 0014): each
+  word of each listing with its ts_rank_cd weight, indexed in rank order.
+  The word's forms ("tract" -> tractor, tractors) are read best first,
+  limit + 1 each, so the cost doesn't grow with how many listings match.
+  A listing ranks by its best form.
+- Typo / spelling fallback: when full text finds nothing on the first page
+  and pg_trgm is installed, listings whose title/name is similar to q
+  (word_similarity >= SEARCH_FUZZY_THRESHOLD, trigram GIN index) are returned
+  instead, so "gundum" still finds "Gandum". The response says which one
+  ran in "match" (fulltext | fuzzy).
+- Keyset pagination on (rank, type, id): pass next_cursor back as ?cursor=.
+  For several words each type's query takes its matches from the GIN
+  index, drops those at or before the cursor and keeps its best limit + 1
+  by (rank, id) - a top-N sort - and the page is the best of those.
+  Every match is ranked, so an old listing that matches better still
+  comes first.
+
+type values are the chat listing types: wheat, pesticide, machinery.
+"""
+from collections import namedtuple
+from flask import Blueprint, request, jsonify
+import logging
+import os
+import re
+
+from db import get_db_connection
+from conditional_get import etag_feed
+from image_uploads import IMAGE_COLUMNS
+from listing_query import (FeedQueryError, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, decode_cursor,
+                           parse_int)
+
+logger = logging.getLogger(__name__)
+
+search_bp = Blueprint('search', __name__)
+
+SEARCH_MAX_QUERY_LENGTH = 100
+SEARCH_MAX_WORDS = 8
+SEARCH_MIN_PREFIX_LENGTH = 3  # shorter words match whole words only ("ka" is not "ka:*")
+SEARCH_FUZZY_THRESHOLD = float(os.getenv('SEARCH_FUZZY_THRESHOLD', 0.4))  # pg_trgm default is 0.6
+
+SearchSource = namedtuple('SearchSource', ['table', 'alias', 'title', 'price'])
+
+SOURCES = {
+    'wheat': SearchSource('wheat_listings', 'w', 'title', 'price_per_kg'),
+    'pesticide': SearchSource('pesticides', 'p', 'name', 'price'),
+    'machinery': SearchSource('machinery_rentals', 'mr', 'name', 'daily_rate'),
+}
+
+WORD_RE = re.compile(r'\w+')
+TERM_RE = re.compile(r'[^\W_]+')  # one lexeme of the 'simple' parser: letters / digits only
+
+_trigram_available = None
+
+
+def trigram_available(cursor):
+    global _trigram_available
+    if _trigram_available is None:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        _trigram_available = cursor.fetchone() is not None
+    return _trigram_available
+
+
+def parse_search_args(args):
+    """(q, words, types, limit, cursor or None). Raises FeedQueryError."""
+    q = (args.get('q') or '').strip()
+    if not q:
+        raise FeedQueryError("q is required")
+    if len(q) > SEARCH_MAX_QUERY_LENGTH:
+        raise FeedQueryError(f"q is too long (max {SEARCH_MAX_QUERY_LENGTH} characters)")
+    # Only word characters reach to_tsquery, so no tsquery syntax from the client
+    words = [word for word in WORD_RE.findall(q.lower()) if len(word) > 1][:SEARCH_MAX_WORDS]
+    if not words:
+        raise FeedQueryError("q needs at least one word of 2+ characters")
+
+    types = args.get('type')
+    types = [t.strip() for t in types.split(',') if t.strip()] if types else list(SOURCES)
+    unknown = [t for t in types if t not in SOURCES]
+    if unknown or not types:
+        raise FeedQueryError(f"Invalid type. Use one or more of: {', '.join(SOURCES)}")
+
+    limit = args.get('limit')
+    limit = parse_int(limit) if limit not in (None, '') else DEFAULT_PAGE_SIZE
+    if limit < 1:
+        raise FeedQueryError("limit must be positive")
+
+    cursor = args.get('cursor')
+    if cursor:
+        mode, value, last_id = decode_cursor(cursor)
+        try:
+            rank, kind = value
+            cursor = (mode, float(rank), kind, last_id)
+        except (TypeError, ValueError):
+            raise FeedQueryError("Invalid cursor")
+        if mode not in ('fulltext', 'fuzzy') or kind not in SOURCES:
+            raise FeedQueryError("Invalid cursor")
+    return q, words, types, min(limit, MAX_PAGE_SIZE), cursor or None
+
+
+def prefix_tsquery(words):
+    """Every word must match; words of SEARCH_MIN_PREFIX_LENGTH+ characters as prefixes."""
+    return ' & '.join(f"{word}:*" if len(word) >= SEARCH_MIN_PREFIX_LENGTH else word for word in words)
+
+
+def listing_columns(kind):
+    """The result columns of one listing type, from its table aliased as SOURCES[kind].alias."""
+    source = SOURCES[kind]
+    a = source.alias
+    return (f"'{kind}'::text AS type, {a}.id, {a}.user_id, {a}.{source.title} AS title, "
+            f"{a}.description, {a}.{source.price} AS price, "
+            f"{a}.{IMAGE_COLUMNS[source.table]} AS image_url, {a}.images, {a}.created_at")
+
+
+def build_search_query(mode, types, cursor):
+    """One ranked, limited UNION ALL branch per listing type; params are named (see run_search)."""
+    branches = []
+    for kind in types:
+        source = SOURCES[kind]
+        a = source.alias
+        if mode == 'fulltext':
+            rank = f"ts_rank_cd({a}.search_vector, to_tsquery('simple', %(tsquery)s))"
+            match = f"{a}.search_vector @@ to_tsquery('simple', %(tsquery)s)"
+        else:
+            rank = f"word_similarity(%(q)s, {a}.{source.title})"
+            match = f"%(q)s <%% {a}.{source.title}"
+        if cursor:
+            match += f"\n                  AND ({rank}, '{kind}'::text, {a}.id) < (%(rank)s::real, %(type)s, %(id)s)"
+        branches.append(f"""
+            (SELECT {listing_columns(kind)},
+                    {rank} AS rank
+             FROM {source.table} {a}
+             WHERE {match}
+             ORDER BY rank DESC, {a}.id DESC
+             LIMIT %(limit)s)""")
+
+    return ("SELECT * FROM (" + "\n            UNION ALL".join(branches) + "\n) hits"
+            "\nORDER BY rank DESC, type DESC, id DESC\nLIMIT %(limit)s")
+
+
+# Loose index scan: the distinct words of search_terms that match the pattern
+WORD_FORMS_SQL = """
+    WITH RECURSIVE forms (lexeme) AS (
+        SELECT min(lexeme) FROM search_terms WHERE lexeme LIKE %(pattern)s
+        UNION ALL
+        SELECT (SELECT min(t.lexeme) FROM search_terms t WHERE t.lexeme > f.lexeme AND t.lexeme LIKE %(pattern)s)
+        FROM forms f
+        WHERE f.lexeme IS NOT NULL
+    )
+    SELECT lexeme FROM forms WHERE lexeme IS NOT NULL
+"""
+
+
+def build_word_query(types, cursor):
+    """
+    One-word query over search_terms (migration 0014): the best limit + 1
+    entries of each (word form, type), read in rank order from the index,
+    then the best listings of those by each listing's best form. Params:
+    forms, types, limit (+ rank, type, id after a cursor).
+    """
+    streams = """
+            FROM unnest(%(forms)s::text[]) f (lexeme)
+            CROSS JOIN unnest(%(types)s::text[]) k (listing_type)
+            CROSS JOIN LATERAL (
+                SELECT t.listing_type, t.listing_id, t.rank
+                FROM search_terms t
+                WHERE t.lexeme = f.lexeme AND t.listing_type = k.listing_type
+                  AND {condition}
+                ORDER BY t.rank DESC, t.listing_id DESC
+                {limit}
+            ) h"""
+    shown, after = "", "TRUE"
+    if cursor:
+        # A listing with any form at or before the cursor was on an earlier page
+        shown = "shown AS (SELECT h.listing_type, h.listing_id" + streams.format(
+            condition="(t.rank, t.listing_type, t.listing_id) >= (%(rank)s::real, %(type)s, %(id)s)",
+            limit="") + "\n        ),"
+        after = """(t.rank, t.listing_type, t.listing_id) < (%(rank)s::real, %(type)s, %(id)s)
+                  AND (t.listing_type, t.listing_id) NOT IN (SELECT listing_type, listing_id FROM shown)"""
+    branches = "\n            UNION ALL".join(f"""
+            SELECT {listing_columns(kind)}, h.rank
+            FROM hits h JOIN {SOURCES[kind].table} {SOURCES[kind].alias} ON {SOURCES[kind].alias}.id = h.id
+            WHERE h.type = '{kind}'""" for kind in types)
+    return f"""
+        WITH {shown}
+        hits AS (
+            SELECT h.listing_type AS type, h.listing_id AS id, max(h.rank) AS rank{streams.format(
+                condition=after, limit="LIMIT %(limit)s")}
+            GROUP BY 1, 2
+            ORDER BY rank DESC, type DESC, id DESC
+            LIMIT %(limit)s
+        )
+        SELECT * FROM ({branches}
+        ) page
+        ORDER BY rank DESC, type DESC, id DESC
+    """
+
+
+def prepare_search(cursor, mode, q, words, types, limit, page_cursor):
+    """(sql, params) for one page, or None when a one-word query matches no word at all."""
+    params = {'q': q, 'tsquery': prefix_tsquery(words), 'limit': limit + 1}
+    if page_cursor:
+        _, params['rank'], params['type'], params['id'] = page_cursor
+    if mode == 'fulltext' and len(words) == 1 and TERM_RE.fullmatch(words[0]):
+        word = words[0]
+        params['pattern'] = word + '%' if len(word) >= SEARCH_MIN_PREFIX_LENGTH else word
+        cursor.execute(WORD_FORMS_SQL, params)
+        params['forms'] = [row['lexeme'] for row in cursor.fetchall()]
+        if not params['forms']:
+            return None
+        params['types'] = types
+        return build_word_query(types, page_cursor), params
+    return build_search_query(mode, types, page_cursor), params
+
+
+def run_search(cursor, mode, q, words, types, limit, page_cursor):
+    if mode == 'fuzzy':
+        cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)",
+                       (str(SEARCH_FUZZY_THRESHOLD),))
+    query = prepare_search(cursor, mode, q, words, types, limit, page_cursor)
+    if query is None:
+        return [], None
+    cursor.execute(*query)
+    rows = cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(mode, [last['rank'], last['type']], last['id'])
+    return rows, next_cursor
+
+
+@search_bp.route('/search', methods=['GET'])
+@etag_feed('wheat_listings', 'pesticides', 'machinery_rentals')
+def search_listings():
+    try:
+        q, words, types, limit, page_cursor = parse_search_args(request.args)
+    except FeedQueryError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({'error': 'Database connection failed'}), 500
+    cursor = conn.cursor()
+    try:
+        mode = page_cursor[0] if page_cursor else 'fulltext'
+        rows, next_cursor = run_search(cursor, mode, q, words, types, limit, page_cursor)
+        if not rows and page_cursor is None and trigram_available(cursor):
+            mode = 'fuzzy'
+            rows, next_cursor = run_search(cursor, mode, q, words, types, limit, None)
+        conn.rollback()  # ends the transaction (and the SET LOCAL-style threshold)
+    except Exception as e:
+        conn.rollback()
+        logger.exception("search failed: %s", e)
+        return jsonify({'error': str(e)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+    return jsonify({
+        'query': q,
+        'match': mode,
+        'count': len(rows),
+        'results': [dict(row) for row in rows],
+        'next_cursor': next_cursor,
+    }), 200
@@ -3,9 +3,11 @@ from flask import Blueprint, request, jsonify
 from werkzeug.security import generate_password_hash
 from db import get_db_connection
 import requests  # Resend ke liye
+import logging
 from config import RESEND_API_KEY, RESEND_FROM_EMAIL
 
 signup_bp = Blueprint('signup', __name__)
+logger = logging.getLogger(__name__)
 
 def send_email_otp(recipient_email, otp_code):
     url = "https://api.resend.com/emails"
@@ -21,10 +23,10 @@ def send_email_otp(recipient_email, otp_code):
     }
     response = requests.post(url, json=payload, headers=headers)
     if response.status_code == 200:
-        print(f"OTP sent to {recipient_email}")
+        logger.info("OTP sent to %s", recipient_email)
         return True
     else:
-        print(f"Resend error: {response.text}")
+        logger.error("Resend error: %s", response.text)
         return False
 
 @signup_bp.route('', methods=['POST'])
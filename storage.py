@@ -0,0 +1,223 @@
+"""
+Storage backends for uploaded files (listing images and their variants).
+
+STORAGE_BACKEND picks the backend (IMAGE_UPLOADER is still read as a fallback):
+- cloudinary (default): Cloudinary upload API; deletes go through the Admin
+  API in batches of up to 100 public ids
+- local: files under STORAGE_ROOT (uploads/), served by GET /uploads/<path>
+  with send_file - sendfile via wsgi.file_wrapper, ETag, Last-Modified and
+  Range requests. For self-hosted and test deployments, no network round trips.
+
+Every backend has the same interface:
+
+    put(image, folder, public_id, **options) -> url     image: bytes or file
+    get(url) -> bytes
+    delete(urls) -> number of files removed
+    url(key) -> public URL for a stored key
+
+Listing rows keep what put() returned - a Cloudinary secure_url, or
+"uploads/<folder>/<file>" for local storage.
+"""
+from flask import Blueprint, abort, send_from_directory
+from PIL import Image
+import io
+import os
+import shutil
+import threading
+import time
+
+from config import BASE_URL
+
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', os.getenv('IMAGE_UPLOADER', 'cloudinary'))
+STORAGE_ROOT = os.getenv('STORAGE_ROOT', 'uploads')
+LOCAL_URL_PREFIX = 'uploads'
+CLOUDINARY_DELETE_BATCH = 100  # Admin API limit per delete_resources call
+UPLOAD_CACHE_SECONDS = 365 * 24 * 3600  # file names are unique, never overwritten
+
+
+# ---------- file helpers ----------
+
+def detect_image_format(image):
+    """Pillow se format detect (header only, no full decode); 'jpeg' fallback."""
+    source = io.BytesIO(image) if isinstance(image, bytes) else image
+    try:
+        with Image.open(source) as img:
+            return img.format.lower() if img.format else 'jpeg'
+    except Exception:
+        return 'jpeg'
+    finally:
+        if source is image:
+            image.seek(0)
+
+
+def image_size(image):
+    """Size in bytes of image bytes or a seekable file."""
+    if isinstance(image, bytes):
+        return len(image)
+    position = image.tell()
+    image.seek(0, os.SEEK_END)
+    size = image.tell()
+    image.seek(position)
+    return size
+
+
+# ---------- backends ----------
+
+class StorageBackend:
+    def put(self, image, folder, public_id, **options):
+        raise NotImplementedError
+
+    def get(self, url):
+        raise NotImplementedError
+
+    def delete(self, urls):
+        raise NotImplementedError
+
+    def url(self, key):
+        raise NotImplementedError
+
+
+class CloudinaryStorage(StorageBackend):
+    def put(self, image, folder, public_id, **options):
+        import cloudinary.uploader
+        # cloudinary reads file objects in chunks itself
+        result = cloudinary.uploader.upload(image, folder=folder, public_id=public_id, **options)
+        return result['secure_url']
+
+    def get(self, url):
+        import requests
+        response = requests.get(url, timeout=30)
+        response.raise_for_status()
+        return response.content
+
+    def delete(self, urls):
+        import cloudinary.api
+        public_ids = [pid for pid in (self.public_id_from_url(u) for u in urls) if pid]
+        deleted = 0
+        for start in range(0, len(public_ids), CLOUDINARY_DELETE_BATCH):
+            batch = public_ids[start:start + CLOUDINARY_DELETE_BATCH]
+            result = cloudinary.api.delete_resources(batch, resource_type='image')
+            deleted += sum(1 for status in result.get('deleted', {}).values() if status == 'deleted')
+        return deleted
+
+    def url(self, key):
+        import cloudinary
+        return cloudinary.CloudinaryImage(key).build_url(secure=True)
+
+    @staticmethod
+    def public_id_from_url(url):
+        """.../image/upload/v1712345678/agrox/wheat/wheat_1_x.jpg -> agrox/wheat/wheat_1_x"""
+        if not url or 'res.cloudinary.com' not in url or '/upload/' not in url:
+            return None
+        path = url.split('/upload/', 1)[1].split('?', 1)[0]
+        parts = path.split('/')
+        if parts[0].startswith('v') and parts[0][1:].isdigit():
+            parts = parts[1:]
+        return os.path.splitext('/'.join(parts))[0] or None
+
+
+class LocalStorage(StorageBackend):
+    """
+    Files under root/<folder name>/<public_id>.<ext>, stored as
+    "uploads/<folder name>/<file>" and served by the /uploads route.
+    `delay` (seconds) plus `seconds_per_mb` simulate a network upload.
+    """
+
+    def __init__(self, root=STORAGE_ROOT, delay=0.0, seconds_per_mb=0.0):
+        self.root = os.path.abspath(root)
+        self.delay = delay
+        self.seconds_per_mb = seconds_per_mb
+        self.uploads = []
+
+    def put(self, image, folder, public_id, **options):
+        if self.delay or self.seconds_per_mb:
+            time.sleep(self.delay + self.seconds_per_mb * image_size(image) / (1024 * 1024))
+        ext = options.get('format') or detect_image_format(image)
+        key = f"{os.path.basename(folder)}/{public_id}.{ext}"
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            if isinstance(image, bytes):
+                f.write(image)
+            else:
+                shutil.copyfileobj(image, f)
+        self.uploads.append(path)
+        return f"{LOCAL_URL_PREFIX}/{key}"
+
+    def get(self, url):
+        path = self.path(self.key_from_url(url))
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def delete(self, urls):
+        deleted = 0
+        for url in urls:
+            key = self.key_from_url(url)
+            if not key:
+                continue
+            try:
+                os.remove(self.path(key))
+                deleted += 1
+            except (FileNotFoundError, ValueError):
+                pass
+        return deleted
+
+    def url(self, key):
+        return f"{BASE_URL}/{LOCAL_URL_PREFIX}/{key}"
+
+    def path(self, key):
+        """Filesystem path for a key; ValueError if it escapes the root."""
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    @staticmethod
+    def key_from_url(url):
+        """uploads/wheat/x.png or http://host/uploads/wheat/x.png -> wheat/x.png"""
+        if not url:
+            return None
+        marker = f"{LOCAL_URL_PREFIX}/"
+        if url.startswith(marker):
+            return url[len(marker):]
+        if f"/{marker}" in url:
+            return url.split(f"/{marker}", 1)[1]
+        return None
+
+
+_storage = None
+_lock = threading.Lock()
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        with _lock:
+            if _storage is None:
+                _storage = LocalStorage() if STORAGE_BACKEND == 'local' else CloudinaryStorage()
+    return _storage
+
+
+def set_storage(storage):
+    """Swap the backend (tests / benchmarks)."""
+    global _storage
+    with _lock:
+        _storage = storage
+    return storage
+
+
+# ---------- local file serving ----------
+
+uploads_bp = Blueprint('uploads', __name__)
+
+
+@uploads_bp.route(f'/{LOCAL_URL_PREFIX}/<path:filename>', methods=['GET'])
+def serve_upload(filename):
+    storage = get_storage()
+    if not isinstance(storage, LocalStorage):
+        abort(404)
+    # conditional=True: ETag / If-None-Match, Last-Modified and Range (206)
+    response = send_from_directory(storage.root, filename, conditional=True,
+                                   max_age=UPLOAD_CACHE_SECONDS)
+    response.headers['Cache-Control'] = f'public, max-age={UPLOAD_CACHE_SECONDS}, immutable'
+    return response
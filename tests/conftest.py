@@ -0,0 +1,51 @@
+"""
+pytest setup: the app modules live at the repo root and the Resend stand-in
+in benchmarks/, so both go on sys.path.
+
+Tests that need Postgres use the `database` fixture and are skipped unless
+TEST_DATABASE_URL points at a throwaway database whose name contains "test"
+(its public schema is dropped and rebuilt from benchmarks/schema.sql and
+migrations.py once per run):
+
+    createdb agrox_test
+    TEST_DATABASE_URL=postgresql://postgres@localhost:5432/agrox_test python -m pytest -q
+"""
+import os
+import sys
+from urllib.parse import urlparse
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'benchmarks')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+if TEST_DATABASE_URL:
+    # db.py reads these at import time
+    os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+    os.environ.setdefault('DB_SSLMODE', 'disable')
+
+
+@pytest.fixture(scope='session')
+def database():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    db_name = urlparse(TEST_DATABASE_URL).path.lstrip('/')
+    if 'test' not in db_name:
+        pytest.exit(f"Refusing to reset '{db_name}': test database name must contain 'test'")
+
+    import psycopg2
+    conn = psycopg2.connect(TEST_DATABASE_URL, sslmode=os.environ['DB_SSLMODE'])
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute("DROP SCHEMA public CASCADE")
+        cursor.execute("CREATE SCHEMA public")
+        with open(os.path.join(ROOT, 'benchmarks', 'schema.sql')) as f:
+            cursor.execute(f.read())
+    conn.close()
+
+    from migrations import run_migrations
+    run_migrations(verbose=False)
+    return TEST_DATABASE_URL
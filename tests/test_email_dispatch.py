@@ -0,0 +1,112 @@
+"""EmailDispatcher against the local fake Resend server (benchmarks/fake_resend_server.py)."""
+import time
+
+import pytest
+
+import email_dispatch
+from email_dispatch import EmailDispatcher
+from fake_resend_server import start_server
+
+
+@pytest.fixture(scope='module')
+def resend():
+    server, url = start_server()
+    yield server.recorder, url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch, resend):
+    monkeypatch.setattr(email_dispatch, 'BACKOFF_BASE', 0.01)
+    resend[0].reset()
+
+
+def messages(count):
+    return [{'from': 'AgroX <noreply@example.com>', 'to': [f'farmer{i}@example.com'],
+             'subject': 'Aaj ke kaam', 'html': '<p>Irrigate</p>'} for i in range(count)]
+
+
+def dispatcher(url, **options):
+    options.setdefault('concurrency', 1)  # scripted failures hit requests in order
+    return EmailDispatcher('test-key', base_url=url, **options)
+
+
+def test_sends_in_batches(resend):
+    recorder, url = resend
+    with dispatcher(url, concurrency=4) as d:
+        result = d.dispatch(messages(250))
+    stats = recorder.stats()
+    assert (result.sent, result.failed, result.batches) == (250, 0, 3)
+    assert (stats['requests'], stats['emails'], stats['max_batch']) == (3, 250, 100)
+
+
+def test_single_message_uses_send_endpoint(resend):
+    recorder, url = resend
+    with dispatcher(url) as d:
+        result = d.dispatch(messages(1))
+    assert result.sent == 1
+    assert recorder.stats()['requests'] == 1
+
+
+def test_429_waits_for_retry_after_without_counting_a_failure(resend):
+    recorder, url = resend
+    recorder.script(429, 429, 429, retry_after=0.2)
+    started = time.monotonic()
+    with dispatcher(url, max_retries=0) as d:
+        result = d.dispatch(messages(10))
+    assert time.monotonic() - started >= 0.6
+    assert (result.sent, result.failed, result.retries) == (10, 0, 3)
+    assert recorder.stats()['emails'] == 10
+
+
+def test_429_gives_up_after_rate_limit_wait(resend):
+    recorder, url = resend
+    recorder.script(*[429] * 50, retry_after=0.1)
+    with dispatcher(url, rate_limit_wait=0.25) as d:
+        result = d.dispatch(messages(3))
+    assert (result.sent, result.failed) == (0, 3)
+    assert recorder.stats()['emails'] == 0
+
+
+def test_5xx_is_retried_with_backoff(resend):
+    recorder, url = resend
+    recorder.script(503, 500)
+    with dispatcher(url, max_retries=3) as d:
+        result = d.dispatch(messages(5))
+    assert (result.sent, result.failed, result.retries) == (5, 0, 2)
+    assert len(recorder.attempt_keys) == 3
+
+
+def test_5xx_gives_up_after_max_retries(resend):
+    recorder, url = resend
+    recorder.script(503, 503, 503)
+    with dispatcher(url, max_retries=2) as d:
+        result = d.dispatch(messages(2))
+    assert (result.sent, result.failed) == (0, 2)
+    assert result.failed_recipients == ['farmer0@example.com', 'farmer1@example.com']
+    assert len(recorder.attempt_keys) == 3
+
+
+def test_4xx_is_not_retried(resend):
+    recorder, url = resend
+    recorder.script(422)
+    with dispatcher(url) as d:
+        result = d.dispatch(messages(2))
+    assert (result.failed, result.retries) == (2, 0)
+    assert len(recorder.attempt_keys) == 1
+
+
+def test_retries_reuse_the_batch_idempotency_key(resend):
+    recorder, url = resend
+    # First batch: delivered but the reply is lost (500), then retried.
+    recorder.script(500, after_record=True)
+    with dispatcher(url, batch_size=100) as d:
+        result = d.dispatch(messages(150))
+    first, retry, second = recorder.attempt_keys
+    assert first == retry
+    assert second != first
+    stats = recorder.stats()
+    assert stats['duplicates'] == 1
+    assert stats['emails'] == 150  # the retried batch was not delivered twice
+    assert result.sent == 150
@@ -0,0 +1,91 @@
+"""Background listing image uploads through LocalStorage (no Cloudinary)."""
+import io
+
+import pytest
+from PIL import Image
+
+import image_uploads
+import storage
+from db import get_db_connection
+
+
+class FailingStorage(storage.LocalStorage):
+    def put(self, image, folder, public_id, **options):
+        raise ConnectionError("storage is down")
+
+
+@pytest.fixture
+def local_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_uploads, 'IMAGE_UPLOAD_BACKOFF', 0)
+    previous = storage.get_storage() if storage._storage is not None else None
+    yield lambda cls=storage.LocalStorage: storage.set_storage(cls(root=str(tmp_path)))
+    storage.set_storage(previous)
+
+
+def png_bytes(width=640, height=480):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (90, 140, 60)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def pending_listing():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("INSERT INTO users (full_name, email) VALUES ('Seller', NULL) RETURNING id")
+        user_id = cursor.fetchone()['id']
+        cursor.execute("""
+            INSERT INTO wheat_listings (user_id, title, price_per_kg, image_status)
+            VALUES (%s, 'Gandum', 60, 'pending') RETURNING id
+        """, (user_id,))
+        listing_id = cursor.fetchone()['id']
+        conn.commit()
+        return listing_id
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def listing(listing_id):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT image_path, images, image_status FROM wheat_listings WHERE id = %s", (listing_id,))
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def test_upload_marks_listing_ready(database, local_storage):
+    backend = local_storage()
+    listing_id = pending_listing()
+    assert listing(listing_id)['image_status'] == 'pending'
+
+    future = image_uploads.submit_listing_image('wheat_listings', listing_id, png_bytes(),
+                                                folder='agrox/wheat', public_id=f'wheat_{listing_id}')
+    url = future.result(timeout=30)
+
+    row = listing(listing_id)
+    assert row['image_status'] == 'ready'
+    assert row['image_path'] == url
+    assert backend.get(url)[:8] == b'\x89PNG\r\n\x1a\n'
+    # resized variants were stored too, and recorded on the row
+    for variant in row['images'].values():
+        for key, variant_url in variant.items():
+            if key not in ('w', 'h'):
+                assert backend.get(variant_url)
+
+
+def test_upload_failure_marks_listing_failed(database, local_storage):
+    backend = local_storage(FailingStorage)
+    listing_id = pending_listing()
+
+    future = image_uploads.submit_listing_image('wheat_listings', listing_id, png_bytes(),
+                                                folder='agrox/wheat', public_id=f'wheat_{listing_id}')
+    assert future.result(timeout=30) is None
+
+    row = listing(listing_id)
+    assert row['image_status'] == 'failed'
+    assert row['image_path'] is None
+    assert backend.uploads == []
@@ -0,0 +1,77 @@
+"""/search ranking and paging against Postgres (search_terms for one-word queries)."""
+import pytest
+
+import search
+from db import get_db_connection
+from listing_query import decode_cursor
+
+
+@pytest.fixture
+def cursor(database):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    yield cursor
+    conn.rollback()
+    cursor.close()
+    conn.close()
+
+
+@pytest.fixture
+def listings(cursor):
+    """Listings whose words start with 'zarb'; each one's best form is noted."""
+    cursor.execute("INSERT INTO users (full_name, email) VALUES ('Seller', NULL) RETURNING id")
+    user_id = cursor.fetchone()['id']
+
+    def insert(table, title_column, title, description):
+        cursor.execute(f"INSERT INTO {table} (user_id, {title_column}, description) VALUES (%s, %s, %s) RETURNING id",
+                       (user_id, title, description))
+        return cursor.fetchone()['id']
+
+    return {
+        'old': ('wheat', insert('wheat_listings', 'title', 'Old zarbo', '')),                    # 1.0
+        'best': ('wheat', insert('wheat_listings', 'title', 'Zarbo seed', 'zarbo zarbo')),       # 1.4
+        'two forms': ('pesticide', insert('pesticides', 'name', 'Zarbos spray', 'zarbo')),       # 1.0 (zarbos)
+        'description': ('machinery', insert('machinery_rentals', 'name', 'Tractor', 'zarboo')),  # 0.2
+    }
+
+
+def all_pages(cursor, q, types=tuple(search.SOURCES), limit=1):
+    _, words, _, _, _ = search.parse_search_args({'q': q})
+    results, page_cursor = [], None
+    while True:
+        rows, next_cursor = search.run_search(cursor, 'fulltext', q, words, list(types), limit, page_cursor)
+        results.extend((row['type'], row['id'], round(row['rank'], 2)) for row in rows)
+        if not next_cursor:
+            return results
+        mode, (rank, kind), last_id = decode_cursor(next_cursor)
+        page_cursor = (mode, rank, kind, last_id)
+
+
+def test_one_word_ranks_every_match_by_best_form(cursor, listings):
+    assert all_pages(cursor, 'zarb') == [
+        (*listings['best'], 1.4),
+        (*listings['old'], 1.0),        # ties on rank: wheat before pesticide (type DESC)
+        (*listings['two forms'], 1.0),  # zarbos and zarbo, shown once
+        (*listings['description'], 0.2),
+    ]
+    assert all_pages(cursor, 'zarb', types=('pesticide', 'machinery'), limit=20) == [
+        (*listings['two forms'], 1.0),
+        (*listings['description'], 0.2),
+    ]
+
+
+def test_whole_word_and_several_words(cursor, listings):
+    assert [row[:2] for row in all_pages(cursor, 'zarbos')] == [listings['two forms']]
+    assert [row[:2] for row in all_pages(cursor, 'zarbo seed')] == [listings['best']]
+    assert all_pages(cursor, 'za') == []  # too short to be a prefix
+
+
+def test_search_terms_follow_listing_writes(cursor, listings):
+    _, machinery_id = listings['description']
+    cursor.execute("UPDATE machinery_rentals SET name = 'Zarboo tractor' WHERE id = %s", (machinery_id,))
+    cursor.execute("DELETE FROM wheat_listings WHERE id = %s", (listings['best'][1],))
+    assert all_pages(cursor, 'zarb') == [
+        (*listings['description'], 1.2),
+        (*listings['old'], 1.0),
+        (*listings['two forms'], 1.0),
+    ]
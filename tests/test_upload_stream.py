@@ -0,0 +1,100 @@
+"""Multipart listing uploads are checked while the body streams in."""
+import io
+
+import jwt
+import pytest
+from flask import Flask
+
+import wheat_listing
+from config import SECRET_KEY
+from upload_stream import UploadError, read_listing_upload
+
+PNG_HEADER = b'\x89PNG\r\n\x1a\n' + b'\0' * 8
+MAX_BYTES = 1024 * 1024
+
+app = Flask(__name__)
+
+
+class CountingStream(io.BytesIO):
+    """Request body that records how much of it was read."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def readinto(self, buffer):
+        count = super().readinto(buffer)
+        self.bytes_read += count
+        return count
+
+
+def multipart(image, filename='photo.png'):
+    return (b'--XX\r\nContent-Disposition: form-data; name="title"\r\n\r\nGandum\r\n'
+            b'--XX\r\nContent-Disposition: form-data; name="image"; filename="' + filename.encode() + b'"\r\n'
+            b'Content-Type: image/png\r\n\r\n' + image + b'\r\n--XX--\r\n')
+
+
+def upload(stream, content_length=True):
+    """read_listing_upload() on a multipart request whose body is `stream`."""
+    size = len(stream.getvalue()) if content_length else None
+    with app.test_request_context('/', method='POST', input_stream=stream,
+                                  content_type='multipart/form-data; boundary=XX', content_length=size):
+        return read_listing_upload(MAX_BYTES)
+
+
+def test_image_is_spooled_with_the_fields():
+    fields, image = upload(CountingStream(multipart(PNG_HEADER + b'x' * 200000)))
+    assert fields == {'title': 'Gandum'}
+    assert image.read() == PNG_HEADER + b'x' * 200000
+
+
+def test_no_file_selected_means_no_image():
+    fields, image = upload(CountingStream(multipart(b'', filename='')))
+    assert fields == {'title': 'Gandum'} and image is None
+
+
+def test_bad_header_is_rejected_before_the_body_is_read():
+    stream = CountingStream(multipart(b'NOT AN IMAGE' * 80000))
+    with pytest.raises(UploadError) as error:
+        upload(stream)
+    assert error.value.status_code == 400
+    assert stream.bytes_read < len(stream.getvalue()) // 4
+
+
+def test_oversized_image_stops_at_the_limit():
+    stream = CountingStream(multipart(PNG_HEADER + b'x' * (4 * MAX_BYTES)))
+    # no Content-Length (chunked upload): the limit is enforced while parsing
+    with pytest.raises(UploadError) as error:
+        upload(stream, content_length=False)
+    assert error.value.status_code == 413
+    assert stream.bytes_read < 2 * MAX_BYTES
+
+
+def test_empty_image_is_rejected():
+    with pytest.raises(UploadError, match="Empty image data"):
+        upload(CountingStream(multipart(b'')))
+
+
+def test_rejected_listing_closes_its_image(monkeypatch):
+    listing_app = Flask(__name__)
+    listing_app.register_blueprint(wheat_listing.wheat_listing)
+    token = jwt.encode({'user_id': 1}, SECRET_KEY, algorithm='HS256')
+    body = multipart(PNG_HEADER + b'x' * 200000)  # no price/quantity/description
+    spooled = []
+
+    def read_upload():
+        fields, image = read_listing_upload(MAX_BYTES)
+        spooled.append(image)
+        return fields, image
+
+    monkeypatch.setattr(wheat_listing, 'read_listing_upload', read_upload)
+    response = listing_app.test_client().post(
+        '/wheat-listings', data=body, headers={'Authorization': f'Bearer {token}'},
+        content_type='multipart/form-data; boundary=XX')
+    assert response.status_code == 400
+    assert spooled[0].closed
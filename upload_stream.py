@@ -0,0 +1,220 @@
+"""
+Streaming image uploads for the listing create endpoints.
+
+Three request shapes are accepted:
+- multipart/form-data: listing fields as form fields, the file in `image`
+- raw body: Content-Type image/* (or application/octet-stream), listing
+  fields in the query string
+- JSON with a base64 `image` string (old clients, kept as a fallback)
+
+For the first two the file is written as it arrives into an ImageSink: a
+SpooledTemporaryFile (memory up to SPOOL_MEMORY_BYTES, then disk) that
+checks the magic bytes of the first 16 bytes and MAX_IMAGE_UPLOAD_BYTES on
+every write. Multipart bodies are parsed with an ImageSink as Werkzeug's
+stream_factory, so the file is never buffered whole first: a bad header or
+an oversized file stops the parse where it is. Content-Length is checked
+before anything is read.
+"""
+from flask import request
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import FormDataParser
+from tempfile import SpooledTemporaryFile
+import binascii
+import os
+
+from image_uploads import decode_base64_image
+
+MAX_IMAGE_UPLOAD_BYTES = int(os.getenv('MAX_IMAGE_UPLOAD_BYTES', 10 * 1024 * 1024))
+SPOOL_MEMORY_BYTES = 512 * 1024
+CHUNK_SIZE = 64 * 1024
+FORM_OVERHEAD_BYTES = 64 * 1024  # room for the other form fields / JSON keys
+
+# (offset, magic bytes, format)
+IMAGE_SIGNATURES = [
+    (0, b'\xff\xd8\xff', 'jpeg'),
+    (0, b'\x89PNG\r\n\x1a\n', 'png'),
+    (0, b'GIF87a', 'gif'),
+    (0, b'GIF89a', 'gif'),
+    (8, b'WEBP', 'webp'),
+    (4, b'ftypheic', 'heic'),
+    (4, b'ftypheix', 'heic'),
+    (4, b'ftypmif1', 'heic'),
+]
+
+
+class UploadError(ValueError):
+    """Rejected upload; status_code is 400 (bad image) or 413 (too large)."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def too_large(max_bytes):
+    return UploadError(f"Image too large (max {round(max_bytes / (1024 * 1024), 1):g} MB)", 413)
+
+
+def sniff_image_format(header):
+    """Image format from the first bytes of the file, or None if not an image."""
+    for offset, magic, fmt in IMAGE_SIGNATURES:
+        if header[offset:offset + len(magic)] == magic:
+            if fmt == 'webp' and header[:4] != b'RIFF':
+                continue
+            return fmt
+    return None
+
+
+class ImageSink:
+    """
+    Write target for an incoming image: spools it, sniffs the format from
+    the first 16 bytes and enforces max_bytes while it is being written.
+    Raises UploadError from write() as soon as either check fails.
+    """
+
+    def __init__(self, max_bytes=MAX_IMAGE_UPLOAD_BYTES):
+        self.file = SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.format = None
+        self._header = b''
+
+    def write(self, data):
+        if self.format is None and len(self._header) < 16:
+            self._header += data[:16 - len(self._header)]
+            if len(self._header) == 16:
+                self._check_header()
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise too_large(self.max_bytes)
+        return self.file.write(data)
+
+    def _check_header(self):
+        self.format = sniff_image_format(self._header)
+        if self.format is None:
+            raise UploadError("Unsupported image type (use JPEG, PNG, GIF, WebP or HEIC)")
+
+    def finish(self):
+        """(file positioned at 0, format) once everything is written."""
+        if self.size == 0:
+            raise UploadError("Empty image data")
+        if self.format is None:  # shorter than 16 bytes
+            self._check_header()
+        self.file.seek(0)
+        return self.file, self.format
+
+    # the multipart parser seeks the finished part and FileStorage reads it
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def read(self, *args):
+        return self.file.read(*args)
+
+    def close(self):
+        self.file.close()
+
+
+def spool_image(stream, max_bytes=MAX_IMAGE_UPLOAD_BYTES):
+    """
+    Copy an image stream into a spooled temp file, chunk by chunk.
+
+    Returns (file positioned at 0, detected format). Raises UploadError if
+    the header is not a known image format or the size limit is exceeded.
+    """
+    sink = ImageSink(max_bytes)
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            sink.write(chunk)
+        return sink.finish()
+    except RequestEntityTooLarge:
+        sink.close()
+        raise too_large(max_bytes)
+    except Exception:
+        sink.close()
+        raise
+
+
+def parse_multipart_upload(max_bytes=MAX_IMAGE_UPLOAD_BYTES):
+    """
+    Stream-parse the multipart body. Returns (fields, image file or None).
+    Every file part goes into an ImageSink, so a bad or oversized image
+    raises UploadError while the body is being read.
+    """
+    sinks = []
+
+    def stream_factory(total_content_length=None, content_type=None, filename=None, content_length=None):
+        sink = ImageSink(max_bytes)
+        sinks.append(sink)
+        return sink
+
+    # silent=False: the default swallows ValueErrors, UploadError included
+    parser = FormDataParser(stream_factory=stream_factory, max_form_memory_size=request.max_form_memory_size,
+                            max_content_length=request.max_content_length, silent=False)
+    try:
+        _, form, files = parser.parse(request.stream, request.mimetype, request.content_length,
+                                      request.mimetype_params)
+        upload = files.get('image')
+        image = upload.stream.finish()[0] if upload and upload.filename != '' else None
+    except Exception as e:
+        for sink in sinks:
+            sink.close()
+        if isinstance(e, UploadError):
+            raise
+        if isinstance(e, RequestEntityTooLarge):
+            raise too_large(max_bytes)
+        if isinstance(e, ValueError):
+            raise UploadError("Invalid multipart body")
+        raise
+    for sink in sinks:
+        if image is None or sink.file is not image:
+            sink.close()  # file parts other than `image`
+    return form.to_dict(), image
+
+
+def read_listing_upload(max_bytes=MAX_IMAGE_UPLOAD_BYTES):
+    """
+    Parse the current create-listing request.
+
+    Returns (fields, image) where fields is a dict of listing fields and
+    image is None, a spooled file (streaming paths) or bytes (JSON path).
+    """
+    mimetype = request.mimetype or ''
+
+    if mimetype == 'multipart/form-data':
+        # Werkzeug checks this against Content-Length before reading the body
+        request.max_content_length = max_bytes + FORM_OVERHEAD_BYTES
+        return parse_multipart_upload(max_bytes)
+
+    if mimetype.startswith('image/') or mimetype == 'application/octet-stream':
+        if request.content_length is not None and request.content_length > max_bytes:
+            raise too_large(max_bytes)
+        request.max_content_length = max_bytes
+        return request.args.to_dict(), spool_image(request.stream, max_bytes)[0]
+
+    # JSON fallback - base64 string in `image`
+    request.max_content_length = max_bytes * 4 // 3 + FORM_OVERHEAD_BYTES
+    try:
+        data = request.get_json(force=True)
+    except RequestEntityTooLarge:
+        raise too_large(max_bytes)
+    if not isinstance(data, dict):
+        raise UploadError("Invalid JSON body")
+
+    image_file = data.pop('image', None)
+    image = None
+    if image_file and isinstance(image_file, str):
+        try:
+            image = decode_base64_image(image_file)
+        except binascii.Error:
+            raise UploadError("Invalid base64 encoding in image")
+        except ValueError as e:
+            raise UploadError(f"Image upload failed: {str(e)}")
+    return data, image
+
+
+def close_upload(image):
+    """Close a spooled image from read_listing_upload that was not handed to the upload worker."""
+    if image is not None and hasattr(image, 'close'):
+        image.close()
@@ -1,54 +1,40 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
+import logging
 from db import get_db_connection
-from config import SECRET_KEY, BASE_URL
-import os
+from auth import token_required
+from config import BASE_URL
 from werkzeug.utils import secure_filename
-from datetime import datetime
-import base64
-from PIL import Image  # imghdr ki jagah Pillow se type detect
-import io
-import jwt
-import uuid
-import cloudinary.uploader  # Cloudinary upload
+from image_uploads import make_public_id, submit_listing_image, submit_image_delete, listing_image_urls
+from response_cache import cached_response, invalidate
+from conditional_get import etag_feed, etag_row, USER_LIST_CACHE_CONTROL
+from upload_stream import read_listing_upload, close_upload, UploadError
+from listing_query import (FeedSpec, Sort, Filter, FeedQueryError, fetch_feed_page, public_row,
+                           parse_number, parse_int, parse_bool, parse_text)
 
 wheat_listing = Blueprint('wheat_listing', __name__)
-
-# Cloudinary use kar rahe hain, local uploads folder optional
-UPLOAD_FOLDER = 'uploads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-def verify_jwt_token(token):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-        return payload
-    except:
-        return None
+logger = logging.getLogger(__name__)
 
 @wheat_listing.route('/wheat-listings', methods=['POST'])
+@token_required
 def create_wheat_listing():
     conn = None
     cursor = None
     image_path = None
+    image = None
     try:
-        request_id = str(uuid.uuid4())[:8]
-        print(f"[WHEAT] Starting create_wheat_listing request... Request ID: {request_id}")
-        
-        auth_header = request.headers.get('Authorization')
-        if not auth_header or not auth_header.startswith('Bearer '):
-            print("[WHEAT] Error: Missing or invalid token")
-            return jsonify({'error': 'Missing or invalid token'}), 401
+        logger.debug("Starting create_wheat_listing request")
         
-        token = auth_header.split(' ')[1]
-        payload = verify_jwt_token(token)
-        if not payload:
-            print("[WHEAT] Error: Invalid or expired token")
-            return jsonify({'error': 'Invalid or expired token'}), 401
-        
-        user_id = payload.get('user_id')
-        print(f"[WHEAT] User ID: {user_id}")
-
-        data = request.get_json(force=True)
-        print(f"[WHEAT] Received data keys: {list(data.keys())}")
+        user_id = g.user_id
+        logger.debug("User ID: %s", user_id)
+
+        # multipart/form-data or raw image body is streamed to a spooled
+        # temp file; JSON with a base64 `image` still works - see upload_stream.py
+        try:
+            data, image = read_listing_upload()
+        except UploadError as e:
+            logger.info("Invalid image: %s", e)
+            return jsonify({'error': str(e)}), e.status_code
+        logger.debug("Received data keys: %s", list(data.keys()))
 
         title = data.get('title')
         price_per_kg = data.get('price_per_kg')
@@ -62,59 +48,15 @@ def create_wheat_listing():
         organic_certified = data.get('organic_certified', False)
         pesticides_used = data.get('pesticides_used', False)
         local_delivery_available = data.get('local_delivery_available', False)
-        image_file = data.get('image')  # Base64 string
 
         if not all([title, price_per_kg, quantity_kg, description]):
             return jsonify({'error': 'Missing required fields'}), 400
 
-        # Cloudinary Upload (imghdr ki jagah Pillow se format detect)
-        image_path = None
-        if image_file and isinstance(image_file, str):
-            try:
-                print("[WHEAT] Processing base64 image for Cloudinary...")
-                
-                image_data = image_file.strip()
-                if 'data:' in image_data and ',' in image_data:
-                    image_data = image_data.split(',', 1)[1]
-                
-                missing_padding = len(image_data) % 4
-                if missing_padding:
-                    image_data += '=' * (4 - missing_padding)
-                
-                image_bytes = base64.b64decode(image_data)
-                print(f"[WHEAT] Decoded bytes length: {len(image_bytes)}")
-                
-                if len(image_bytes) == 0:
-                    raise ValueError("Empty image data")
-
-                # Pillow se format detect
-                try:
-                    with Image.open(io.BytesIO(image_bytes)) as img:
-                        ext = img.format.lower() if img.format else 'jpeg'
-                except Exception:
-                    ext = 'jpeg'  # fallback
+        # Image is uploaded in the background after the row exists - see image_uploads.py
+        if image is None:
+            logger.debug("No image provided")
 
-                unique_id = str(uuid.uuid4())[:8]
-                timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-                public_id = f"wheat_{user_id}_{timestamp}_{unique_id}"
-
-                upload_result = cloudinary.uploader.upload(
-                    image_bytes,
-                    folder="agrox/wheat",
-                    public_id=public_id,
-                    format=ext
-                )
-                
-                image_path = upload_result['secure_url']
-                print(f"[WHEAT] SUCCESS: Uploaded to Cloudinary → {image_path}")
-
-            except Exception as e:
-                print(f"[WHEAT] Cloudinary upload failed: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                return jsonify({'error': f'Image upload failed: {str(e)}'}), 400
-        else:
-            print("[WHEAT] No image provided")
+        image_status = 'pending' if image is not None else None
 
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -123,75 +65,124 @@ def create_wheat_listing():
             INSERT INTO wheat_listings 
             (user_id, title, price_per_kg, quantity_kg, description, wheat_variety, grade_quality, 
              harvest_season, protein_content, moisture_level, organic_certified, pesticides_used, 
-             local_delivery_available, image_path)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+             local_delivery_available, image_path, image_status)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id
         '''
         cursor.execute(sql, (user_id, title, price_per_kg, quantity_kg, description, wheat_variety, grade_quality,
                              harvest_season, protein_content, moisture_level, organic_certified, pesticides_used,
-                             local_delivery_available, image_path))
+                             local_delivery_available, image_path, image_status))
+        listing_id = cursor.fetchone()['id']
         conn.commit()
-        listing_id = cursor.lastrowid
-        print(f"[WHEAT] Listing created with ID: {listing_id}")
+        invalidate('wheat_listings')
+        logger.info("Listing created with ID: %s", listing_id)
+
+        if image is not None:
+            submit_listing_image(
+                'wheat_listings', listing_id, image,
+                folder="agrox/wheat",
+                public_id=make_public_id('wheat', user_id),
+                sniff_format=True
+            )
+            image = None  # the upload worker closes it now
 
         response_data = {
             'message': 'Wheat listed successfully!',
             'listing_id': listing_id,
-            'image_path': image_path
+            'image_path': image_path,
+            'image_status': image_status
         }
         return jsonify(response_data), 201
             
     except Exception as e:
         if conn:
             conn.rollback()
-        print(f"[WHEAT] CRITICAL ERROR: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("create_wheat_listing failed: %s", e)
         return jsonify({'error': f'Server error: {str(e)}'}), 500
     finally:
+        close_upload(image)
         if cursor:
             cursor.close()
         if conn:
             conn.close()
 
 
+# Public feed: keyset pagination + filters (see listing_query.py)
+WHEAT_FEED = FeedSpec(
+    select="SELECT * FROM wheat_listings w",
+    id_column="w.id",
+    sorts={
+        'newest': Sort("w.created_at", 'created_at', 'DESC', 'timestamp'),
+        'oldest': Sort("w.created_at", 'created_at', 'ASC', 'timestamp'),
+        'price_asc': Sort("w.price_per_kg", 'price_per_kg', 'ASC', 'numeric', nullable=True),
+        'price_desc': Sort("w.price_per_kg", 'price_per_kg', 'DESC', 'numeric', nullable=True),
+    },
+    default_sort='newest',
+    filters={
+        'min_price': Filter("w.price_per_kg >= %s", parse_number),
+        'max_price': Filter("w.price_per_kg <= %s", parse_number),
+        'min_quantity': Filter("w.quantity_kg >= %s", parse_number),
+        'wheat_variety': Filter("w.wheat_variety = %s", parse_text),
+        'grade_quality': Filter("w.grade_quality = %s", parse_text),
+        'harvest_season': Filter("w.harvest_season = %s", parse_text),
+        'organic_certified': Filter("w.organic_certified = %s", parse_bool),
+        'pesticides_used': Filter("w.pesticides_used = %s", parse_bool),
+        'local_delivery_available': Filter("w.local_delivery_available = %s", parse_bool),
+        'user_id': Filter("w.user_id = %s", parse_int),
+    }
+)
+
+
 @wheat_listing.route('/wheat-listings', methods=['GET'])
+@cached_response('wheat_listings')
+@etag_feed('wheat_listings')
 def get_wheat_listings():
+    """
+    One page of wheat listings. Supports limit, cursor, sort and the
+    WHEAT_FEED filters; the next page's cursor is sent in X-Next-Cursor.
+    """
     try:
-        print("[WHEAT GET] Fetching all wheat listings...")
+        logger.debug("Fetching wheat listings page...")
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM wheat_listings")
-        listings = cursor.fetchall()
-        print(f"[WHEAT GET] Found {len(listings)} listings")
+        try:
+            listings, next_cursor = fetch_feed_page(cursor, WHEAT_FEED, request.args)
+        finally:
+            cursor.close()
+            conn.close()
         
-        formatted_listings = [dict(listing) for listing in listings]
+        formatted_listings = [public_row(listing) for listing in listings]
+        logger.debug("Returning %s formatted listings", len(formatted_listings))
         
-        cursor.close()
-        conn.close()
-        print(f"[WHEAT GET] Returning {len(formatted_listings)} formatted listings")
-        return jsonify(formatted_listings), 200
+        response = jsonify(formatted_listings)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response, 200
+    except FeedQueryError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        print(f"[WHEAT GET] Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("get_wheat_listings failed: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
 @wheat_listing.route('/wheat-listings/<int:listing_id>', methods=['GET'])
+@etag_row('wheat_listings', 'listing_id')
 def get_wheat_listing(listing_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM wheat_listings WHERE id = %s", (listing_id,))
-        listing = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        try:
+            cursor.execute("SELECT * FROM wheat_listings WHERE id = %s", (listing_id,))
+            listing = cursor.fetchone()
+        finally:
+            cursor.close()
+            conn.close()
 
         if not listing:
             return jsonify({'error': 'Wheat listing not found'}), 404
 
         # Format listing with proper image URL
-        formatted_listing = dict(listing)
+        formatted_listing = public_row(listing)
         if listing.get('image_path'):
             formatted_listing['image_path'] = f"{BASE_URL}/{listing['image_path']}"
         else:
@@ -203,38 +194,40 @@ def get_wheat_listing(listing_id):
 
 
 @wheat_listing.route('/wheat-listings/user/<int:user_id>', methods=['GET'])
+@etag_feed('wheat_listings', cache_control=USER_LIST_CACHE_CONTROL)
 def get_wheat_listings_by_user(user_id):
     try:
-        print(f"[WHEAT GET] Fetching listings for user {user_id}...")
+        logger.debug("Fetching listings for user %s...", user_id)
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute("""
-            SELECT * FROM wheat_listings
-            WHERE user_id = %s
-        """, (user_id,))
-        listings = cursor.fetchall()
+        try:
+            cursor.execute("""
+                SELECT * FROM wheat_listings
+                WHERE user_id = %s
+            """, (user_id,))
+            listings = cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
         
         # Format listings with proper image URLs
         formatted_listings = []
         for listing in listings:
-            formatted_listing = dict(listing)
+            formatted_listing = public_row(listing)
             if listing.get('image_path'):
                 formatted_listing['image_path'] = f"{BASE_URL}/{listing['image_path']}"
             else:
                 formatted_listing['image_path'] = None
             formatted_listings.append(formatted_listing)
-        
-        cursor.close()
-        conn.close()
 
         if not formatted_listings:
             return jsonify({'message': 'No wheat listings found for this user'}), 404
 
-        print(f"[WHEAT GET] Returning {len(formatted_listings)} listings for user {user_id}")
+        logger.debug("Returning %s listings for user %s", len(formatted_listings), user_id)
         return jsonify(formatted_listings), 200
 
     except Exception as e:
-        print(f"[WHEAT GET] Error: {str(e)}")
+        logger.exception("get_wheat_listings_by_user failed: %s", e)
         return jsonify({'error': str(e)}), 500
     
 
@@ -243,31 +236,25 @@ def delete_wheat_listing(listing_id):
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-
-        cursor.execute("SELECT * FROM wheat_listings WHERE id = %s", (listing_id,))
-        listing = cursor.fetchone()
-        if not listing:
+        try:
+            cursor.execute("SELECT * FROM wheat_listings WHERE id = %s", (listing_id,))
+            listing = cursor.fetchone()
+            if not listing:
+                return jsonify({'error': 'Wheat listing not found'}), 404
+
+            cursor.execute("DELETE FROM wheat_listings WHERE id = %s", (listing_id,))
+            conn.commit()
+        finally:
+            # close() rolls back anything left uncommitted
             cursor.close()
             conn.close()
-            return jsonify({'error': 'Wheat listing not found'}), 404
-
-        # Delete associated image if exists
-        image_path = listing.get('image_path')
-        if image_path and os.path.exists(image_path):
-            try:
-                os.remove(image_path)
-                print(f"[WHEAT DELETE] Deleted image: {image_path}")
-            except Exception as e:
-                print(f"[WHEAT DELETE] Failed to delete image: {str(e)}")
-
-        cursor.execute("DELETE FROM wheat_listings WHERE id = %s", (listing_id,))
-        conn.commit()
+        invalidate('wheat_listings')
 
-        cursor.close()
-        conn.close()
+        # Image + variants are removed from storage in the background
+        submit_image_delete(listing_image_urls('wheat_listings', listing))
 
         return jsonify({'message': 'Wheat listing deleted successfully'}), 200
 
     except Exception as e:
-        print(f"[WHEAT DELETE] Error: {str(e)}")
+        logger.exception("delete_wheat_listing failed: %s", e)
         return jsonify({'error': str(e)}), 500